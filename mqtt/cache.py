@@ -1,3 +1,9 @@
+import time
+from threading import Event, Lock, Thread
+
+from shared.utils.partition import get_partition
+
+
 class MqttCache:
     __instance = None
 
@@ -16,6 +22,18 @@ class MqttCache:
         self.__client_mac = ''
         self.__client_connected = False
         self.__node_themes = dict()
+        # routing index (theme -> component_settings_id) for incoming measurements
+        self.__routes = dict()
+        # component_settings_id -> node (settings of old configs stay, their measurements could
+        # still wait in queue)
+        self.__settings_nodes = dict()
+        # nodes which aren't in database (so route misses don't ask database again)
+        self.__unknown_nodes = set()
+        # this client handles only nodes of its partition (other clients handle the rest)
+        self.__partition_index = 0
+        self.__partition_count = 1
+        # one subscription for all themes (None if client subscribes to each theme)
+        self.__wildcard_topic = None
 
     def set_client_mac(self, mac):
         self.__client_mac = mac
@@ -30,11 +48,57 @@ class MqttCache:
     def client_disconnected(self):
         self.__client_connected = False
 
+    def set_partition(self, index, count):
+        """
+        :param index:   partition of this client (0 to count - 1)
+        :param count:   number of clients which share nodes
+        :return:
+        """
+
+        self.__partition_index = index
+        self.__partition_count = count
+
+    @property
+    def wildcard_topic(self):
+        return self.__wildcard_topic
+
+    def set_wildcard_topic(self, wildcard_topic):
+        self.__wildcard_topic = wildcard_topic
+
+    def owns(self, node):
+        # node belongs to one client (see get_partition)
+        return get_partition(node, self.__partition_count) == self.__partition_index
+
     def append_node(self, node):
+        # if node is already in cache (config changed), its old routes aren't valid anymore
+        for theme in self.__node_themes.get(node, list()):
+            self.__routes.pop(theme, None)
+
         self.__node_themes[node] = list()
+        self.__unknown_nodes.discard(node)
 
-    def append_theme(self, node, theme):
+    def append_unknown_node(self, node):
+        self.__unknown_nodes.add(node)
+
+    def is_unknown(self, node):
+        return node in self.__unknown_nodes
+
+    def append_theme(self, node, theme, component_settings_id):
         self.__node_themes[node].append(theme)
+        self.__routes[theme] = component_settings_id
+        self.__settings_nodes[component_settings_id] = node
+
+    def get_node(self, component_settings_id):
+        # node of component settings or None if they aren't in cache
+        return self.__settings_nodes.get(component_settings_id)
+
+    def get_themes(self):
+        # all themes of nodes in cache (they're subscribed again when client reconnects)
+        return list(self.__routes.keys())
+
+    def route(self, theme):
+        # returns component_settings_id for given theme or None if theme is unknown
+        return self.__routes.get(theme)
 
     def in_cache(self, node):
         if node in self.__node_themes.keys():
@@ -44,6 +108,16 @@ class MqttCache:
 
 
 class MeasurementsCache:
+    """
+    Write-behind queue for incoming measurements. Measurements are kept in memory and
+    flushed to database in one transaction when batch is big enough or when oldest
+    measurement in queue waited long enough (whatever comes first). Flushing is done by
+    background thread so MQTT network loop never waits for database.
+
+    Failed batches stay in queue, so queue has max size (while database can't be written,
+    memory doesn't grow without limit). When it's full, oldest measurements are dropped.
+    """
+
     __instance = None
 
     @staticmethod
@@ -59,17 +133,193 @@ class MeasurementsCache:
 
     def __init__(self):
         self.__measurements = list()
+        self.__lock = Lock()
+        # only one flush at a time so batches are written in order they came
+        self.__flush_lock = Lock()
+        self.__flush_handler = None
+        self.__on_flushed = None
+        self.__max_batch_size = 100
+        self.__max_latency = 2
+        self.__max_size = 100000
+        # time when oldest measurement in queue arrived (None if queue is empty)
+        self.__oldest_at = None
+        self.__wake_up = Event()
+        # flush is requested from other thread (it doesn't wait for it)
+        self.__flush_requested = False
+        self.__stopped = Event()
+        self.__worker = None
+        # counters
+        self.__flush_count = 0
+        self.__failed_flush_count = 0
+        self.__flushed_measurements = 0
+        self.__last_flush_time = 0.0
+        self.__total_flush_time = 0.0
+        self.__dropped_measurements = 0
+
+    def setup(self, flush_handler, max_batch_size, max_latency, max_size=None):
+        """
+        :param flush_handler:   function that receives list of measurements and returns
+                                True if they are saved
+        :param max_batch_size:  number of measurements that triggers flush
+        :param max_latency:     max seconds measurement can wait in queue
+        :param max_size:        max number of measurements in queue (None for default)
+        :return:
+        """
+
+        self.__flush_handler = flush_handler
+        self.__max_batch_size = max_batch_size
+        self.__max_latency = max_latency
+
+        if max_size is not None:
+            self.__max_size = max(max_size, max_batch_size)
+
+    def start(self, on_flushed=None):
+        """
+        :param on_flushed:  function that receives list of measurements after they're saved
+                            (optional)
+        :return:
+        """
+
+        self.__on_flushed = on_flushed
+
+        if self.__worker is None:
+            self.__stopped.clear()
+            self.__worker = Thread(target=self.__run, name='measurements-cache', daemon=True)
+            self.__worker.start()
+
+    def stop(self):
+        # stop background thread and write everything that's left in queue
+        if self.__worker is not None:
+            self.__stopped.set()
+            self.__wake_up.set()
+            self.__worker.join()
+            self.__worker = None
+
+        self.flush()
 
     @property
     def size(self):
+        # queue depth
         return len(self.__measurements)
 
+    @property
+    def stats(self):
+        return {
+            'queue_depth':          self.size,
+            'flush_count':          self.__flush_count,
+            'failed_flush_count':   self.__failed_flush_count,
+            'flushed_measurements': self.__flushed_measurements,
+            'last_flush_time':      self.__last_flush_time,
+            'total_flush_time':     self.__total_flush_time,
+            'dropped_measurements': self.__dropped_measurements
+        }
+
     def append_measurement(self, measurement):
-        self.__measurements.append(measurement)
+        with self.__lock:
+            self.__measurements.append(measurement)
+            if self.__oldest_at is None:
+                self.__oldest_at = time.monotonic()
+            self.__drop_overflow()
+            is_full = len(self.__measurements) >= self.__max_batch_size
+
+        if is_full:
+            self.__wake_up.set()
 
     def append_measurements(self, measurements):
-        for measurement in measurements:
-            self.__measurements.append(measurement)
+        with self.__lock:
+            self.__measurements.extend(measurements)
+            if self.__oldest_at is None and len(self.__measurements) > 0:
+                self.__oldest_at = time.monotonic()
+            self.__drop_overflow()
+            is_full = len(self.__measurements) >= self.__max_batch_size
+
+        if is_full:
+            self.__wake_up.set()
+
+    def request_flush(self):
+        # background thread writes everything that's in queue as soon as possible (caller
+        # doesn't wait for database)
+        self.__flush_requested = True
+        self.__wake_up.set()
 
     def clear(self):
-        self.__measurements = list()
+        with self.__lock:
+            self.__measurements = list()
+            self.__oldest_at = None
+
+    def flush(self):
+        """
+        Writes all queued measurements in one batch. If writing fails, measurements are
+        returned to the front of the queue so they're retried with next flush (oldest ones
+        are dropped if queue is full).
+
+        :return:    number of flushed measurements
+        """
+
+        with self.__flush_lock:
+            with self.__lock:
+                batch = self.__measurements
+                oldest_at = self.__oldest_at
+                self.__measurements = list()
+                self.__oldest_at = None
+
+            if len(batch) == 0 or self.__flush_handler is None:
+                return 0
+
+            started_at = time.perf_counter()
+            ok = self.__flush_handler(batch)
+            self.__last_flush_time = time.perf_counter() - started_at
+            self.__total_flush_time += self.__last_flush_time
+
+            if ok:
+                self.__flush_count += 1
+                self.__flushed_measurements += len(batch)
+
+                # called while flush lock is held, so batches are reported in order they're saved
+                if self.__on_flushed is not None:
+                    self.__on_flushed(batch)
+
+                return len(batch)
+
+            self.__failed_flush_count += 1
+
+            with self.__lock:
+                self.__measurements = batch + self.__measurements
+                self.__oldest_at = oldest_at
+                self.__drop_overflow()
+
+            return 0
+
+    def __run(self):
+        while not self.__stopped.is_set():
+            with self.__lock:
+                if self.__oldest_at is None:
+                    timeout = self.__max_latency
+                else:
+                    timeout = max(0, self.__oldest_at + self.__max_latency - time.monotonic())
+
+            self.__wake_up.wait(timeout)
+            self.__wake_up.clear()
+
+            if self.__stopped.is_set():
+                break
+            if self.size >= self.__max_batch_size or self.__is_late() or self.__flush_requested:
+                self.__flush_requested = False
+
+                if self.flush() == 0 and self.size > 0:
+                    # flush failed (database is probably locked), give it some time before
+                    # next try instead of retrying immediately
+                    self.__stopped.wait(self.__max_latency)
+
+    def __drop_overflow(self):
+        # caller holds lock, oldest measurements are at the front of queue
+        overflow = len(self.__measurements) - self.__max_size
+
+        if overflow > 0:
+            del self.__measurements[:overflow]
+            self.__dropped_measurements += overflow
+
+    def __is_late(self):
+        with self.__lock:
+            return self.__oldest_at is not None and \
+                time.monotonic() - self.__oldest_at >= self.__max_latency
@@ -1,6 +1,8 @@
 import os
 import time
 
+from datetime import datetime
+
 from socket import gaierror
 
 from paho.mqtt import client as mqttc
@@ -8,7 +10,8 @@ from paho.mqtt import client as mqttc
 from shared.utils.validator import is_integer, is_double
 
 from mqtt.constant import Default, MessageType
-from mqtt.loader import load, logger, config_cache, cache, node_db_handler
+from mqtt.loader import load, logger, config_cache, cache, measurements_cache, maintenance, dispatcher,\
+    node_db_handler, latest_values, data_versions
 
 
 def start():
@@ -17,6 +20,17 @@ def start():
     if not ok:
         return
 
+    run(info)
+
+
+def run(info):
+    """
+    Runs client with already loaded config (see loader), until it's stopped.
+
+    :param info:    client_id, clean_session, broker_host, broker_port and keepalive
+    :return:
+    """
+
     # create client and setup and try to connect until connected
     if info['client_id'] == '':
         # if unique_name_source = default...
@@ -26,6 +40,39 @@ def start():
     mqtt_client.on_connect = on_connect
     mqtt_client.on_disconnect = on_disconnect
     mqtt_client.on_message = on_message
+    # measurements are written to database by cache's background thread
+    measurements_cache.start(__on_measurements_flushed)
+    # database maintenance (compaction etc.) runs in its own background thread too
+    maintenance.start()
+    # received messages are handled by dispatcher's workers (each has its own database session),
+    # messages of one node always by same worker, so they're handled in order they came
+    dispatcher.start(lambda topic, payload, received_at: __handle_message(mqtt_client, topic, payload, received_at),
+                     node_db_handler.access().remove_session, __get_node_id)
+
+    # routes of registered nodes are loaded before client connects, so nodes don't have to
+    # register again after restart
+    __warm_up()
+
+    try:
+        __connect_and_loop(mqtt_client, info)
+    finally:
+        # messages which are still in queue are handled first, so their measurements are written
+        dispatcher.stop()
+        stats = dispatcher.stats
+        logger.access().info("Dispatcher stopped, {} message/s handled, {} failed, {} dropped, {} spilled, "
+                             "max queue depth {}, max lag {:.3f}s", stats['handled'], stats['failed'],
+                             stats['dropped'], stats['total_spilled'], stats['max_queue_depth'], stats['max_lag'])
+        maintenance.stop()
+        # write everything that's left in queue before client shuts down
+        measurements_cache.stop()
+        stats = measurements_cache.stats
+        logger.access().info("Measurements cache stopped, {} measurement/s written in {} batch/es ({:.3f}s), "
+                             "{} failed batch/es, {} measurement/s dropped", stats['flushed_measurements'],
+                             stats['flush_count'], stats['total_flush_time'], stats['failed_flush_count'],
+                             stats['dropped_measurements'])
+
+
+def __connect_and_loop(mqtt_client, info):
     # flag below is used to stop printing same thing again and again, for console same as for logger
     error_already_written = False
 
@@ -33,9 +80,9 @@ def start():
         try:
             # connecting to broker can fail if broker is not up or port is invalid
             if not error_already_written:
-                logger.access().info("Trying to connect to '{}:{}' as {} with keepalive {}, {} second/s delay"
-                                     .format(info['broker_host'], info['broker_port'], mqtt_client._client_id,
-                                             info['keepalive'], Default.RECONNECT_AFTER))
+                logger.access().info("Trying to connect to '{}:{}' as {} with keepalive {}, {} second/s delay",
+                                     info['broker_host'], info['broker_port'], mqtt_client._client_id,
+                                     info['keepalive'], Default.RECONNECT_AFTER)
             else:
                 print("Trying to connect...")
             mqtt_client.connect(info['broker_host'], info['broker_port'], info['keepalive'])
@@ -70,29 +117,58 @@ def on_connect(client, userdata, flags, rc):
     # subscribe to 'start' theme each time client connects/reconnects on broker
     client.subscribe("start", qos=1)
 
+    if cache.wildcard_topic is not None:
+        # one subscription for themes of all nodes (registered or not), so reconnect doesn't
+        # depend on number of sensors
+        client.subscribe(cache.wildcard_topic)
+    else:
+        # broker could lose subscriptions (restart, clean session), so themes of nodes in cache
+        # are subscribed again
+        __subscribe_themes(client, cache.get_themes())
+
 
 def on_disconnect(client, userdata, rc):
     cache.client_disconnected()
     logger.access().info("Client disconnected from broker")
+    # don't keep measurements in memory while there's no connection (cache's thread writes
+    # them, network loop doesn't wait for database)
+    measurements_cache.request_flush()
 
 
 def on_message(client, userdata, message):
-    if message.topic == 'start':
-        logger.access().warning("Upcoming sync/registration request, data: '{}'".format(message.payload.decode()))
-        node_msg = message.payload.decode().split(';')
+    # network loop only puts message into dispatcher's queue, so it never waits for database
+    dispatcher.dispatch(message.topic, message.payload)
+
+
+def __get_node_id(topic, payload):
+    # node's id is first part of payload of registration message and first level of other topics
+    if topic == 'start':
+        return payload.split(b';', 1)[0].decode('utf-8', 'replace')
+
+    return topic.split('/', 1)[0]
+
+
+def __handle_message(client, topic, payload, received_at):
+    if topic == 'start':
+        logger.access().warning("Upcoming sync/registration request, data: '{}'", payload.decode())
+        node_msg = payload.decode().split(';')
 
         # if there's something and first parameter is not empty string...
         if len(node_msg) >= 1 and node_msg[0] != '':
             # first parameter should ALWAYS be node's id!
             if __validate_node_id(node_msg[0]):
-                logger.access().info("Node '{}' has successfully been verified".format(node_msg[0]))
+                if not cache.owns(node_msg[0]):
+                    # node belongs to other client's partition, that client answers it
+                    return
+
+                logger.access().info("Node '{}' has successfully been verified", node_msg[0])
                 if cache.in_cache(node_msg[0]):
                     # return status OK (code = 1) at node
                     client.publish(node_msg[0], MessageType.OK, qos=1)
-                    logger.access().info("Confirmation sent to node '{}'".format(node_msg[0]))
+                    logger.access().info("Confirmation sent to node '{}'", node_msg[0])
                 elif node_db_handler.access().node_exists(node_msg[0]):
                     __prepare_for_the_user(client, node_msg[0])
-                    logger.access().info("Confirmation sent to node '{}'".format(node_msg[0]))
+                    logger.access().info("Confirmation sent to node '{}'", node_msg[0])
                 else:
                     # logger.access().info("")
                     if len(node_msg) == 1:
@@ -118,38 +194,80 @@ def on_message(client, userdata, message):
                                     if parsed_conf is not None:
                                         # send data to DB
                                         node_db_handler.access().new_node_config(node_msg[0], parsed_conf)
-                                        logger.access().info("Config setup for node '{}' is completed"
-                                                             .format(node_msg[0]))
+                                        __bump_data_version(node_msg[0])
+                                        logger.access().info("Config setup for node '{}' is completed",
+                                                             node_msg[0])
                                         __prepare_for_the_user(client, node_msg[0])
-                                        logger.access().info("Confirmation sent to node '{}'".format(node_msg[0]))
+                                        logger.access().info("Confirmation sent to node '{}'", node_msg[0])
     else:
         # other topics (not initialization/registration topic)
-        topic = message.topic.split('/')
+        # topics: node-id/2/C, node-id/2/% are measurements and their component settings are found
+        # in routing index (it's built when node is registered), so topic doesn't have to be parsed
+        # and database doesn't have to be asked which component settings measurement belongs to
+        component_settings_id = __route(topic)
+
+        if component_settings_id is not None:
+            data = payload.decode()
+            integer, err_message = is_integer(data)
+            double, err_message2 = is_double(data)
+
+            # check if it's double value...
+            if integer or double:
+                value = float(data)
+                # time when message was received, not when it's handled (it could wait in queue)
+                now = datetime.fromtimestamp(received_at)
+                measured_at = now.strftime("%Y-%m-%d %H:%M:%S")
+                # queue data for DB (it's written in batches)
+                measurements_cache.append_measurement((component_settings_id, value, measured_at))
+
+                # newest value is shared with web server right away (without database), version
+                # of node's data is bumped only when measurement is written (see __on_measurements_flushed)
+                if latest_values.access() is not None:
+                    latest_values.access().set(component_settings_id, value, int(now.timestamp()))
+
+        # topics with only topic and component_id (node-id/1) should be used for controlling stuff, not
+        # reading from sensors...
+
+
+def __route(topic):
+    component_settings_id = cache.route(topic)
+
+    if component_settings_id is None:
+        # node could be registered before client was restarted (broker kept its subscriptions),
+        # so its routes are read from database once
+        node_id = topic.split('/')[0]
+
+        if not cache.in_cache(node_id) and not cache.is_unknown(node_id) and cache.owns(node_id) and \
+                __validate_node_id(node_id):
+            routes = node_db_handler.access().get_node_routes(node_id)
+
+            if len(routes) == 0:
+                cache.append_unknown_node(node_id)
+            else:
+                __append_node_routes(node_id, routes)
+                component_settings_id = cache.route(topic)
 
-        # if there are at least 2 parameters: topic and id, and if first is topic, not just anyone, then
-        # continue doing what it must be done...
-        # topics: node-id/1, node-id/2/C, node-id/2/%
-        if len(topic) >= 2 and cache.in_cache(topic[0]):
-            node_id = topic[0]
-            integer, err_message = is_integer(topic[1])
+    return component_settings_id
 
-            if integer:
-                component_id_used = int(topic[1])
 
-                if len(topic) == 3:
-                    measuring_unit = topic[2]
-                    data = message.payload.decode()
-                    integer, err_message = is_integer(data)
-                    double, err_message2 = is_double(data)
+def __bump_data_version(node_ids, ts=None):
+    if data_versions.access() is not None:
+        data_versions.access().bump(node_ids, ts)
 
-                    # check if it's double value...
-                    if integer or double:
-                        value = float(data)
-                        # send data to DB
-                        node_db_handler.access().new_data(node_id, component_id_used, measuring_unit, value)
 
-                # this part of code should be used for controlling stuff, not reading from sensors because
-                # it's enough to have topic and component_id for it...
+def __on_measurements_flushed(measurements):
+    # web server's cached pages of nodes whose measurements are now in database aren't valid
+    # anymore (pages rendered before would be cached under new version if it was bumped when
+    # measurements were queued)
+    node_ids = set()
+
+    for component_settings_id, value, measured_at in measurements:
+        node_id = cache.get_node(component_settings_id)
+
+        if node_id is not None:
+            node_ids.add(node_id)
+
+    __bump_data_version(list(node_ids))
 
 
 def __validate_node_id(node_id):
@@ -169,25 +287,58 @@ def __validate_node_id(node_id):
 
 
 def __prepare_for_the_user(client, node_id):
-    config = node_db_handler.access().get_node_config(node_id)
-    themes = __build_node_themes(node_id, config)
-    cache.append_node(node_id)
+    # routes are (re)built each time node is prepared, so config changes are picked up too
+    themes = __append_node_routes(node_id, node_db_handler.access().get_node_routes(node_id))
 
-    for theme in themes:
-        cache.append_theme(node_id, theme)
-        # subscribe to each theme with QoS = 0
-        client.subscribe(theme)
+    if cache.wildcard_topic is None:
+        # subscribe to node's themes with QoS = 0 (with wildcard, client already gets them and
+        # themes of nodes which aren't registered are ignored by routing)
+        __subscribe_themes(client, themes.keys())
 
     # return status OK
     client.publish(node_id, MessageType.OK, qos=1)
 
 
-def __build_node_themes(node_id, config):
-    themes = list()
+def __append_node_routes(node_id, routes):
+    themes = __build_node_themes(node_id, routes)
+    cache.append_node(node_id)
+
+    for theme, component_settings_id in themes.items():
+        cache.append_theme(node_id, theme, component_settings_id)
+
+    return themes
+
+
+def __subscribe_themes(client, themes):
+    # themes are subscribed in batches (one SUBSCRIBE packet for each), with QoS = 0
+    themes = list(themes)
+
+    for i in range(0, len(themes), Default.SUBSCRIBE_BATCH_SIZE):
+        client.subscribe([(theme, 0) for theme in themes[i:i + Default.SUBSCRIBE_BATCH_SIZE]])
+
+
+def __warm_up():
+    # loads routes of all nodes (of client's partition) which are registered in database, with
+    # two queries for all of them, before client connects (so first messages don't wait for it)
+    started_at = time.perf_counter()
+    nodes = 0
+    themes = 0
+
+    for node_id, routes in node_db_handler.access().get_all_node_routes().items():
+        if cache.owns(node_id):
+            themes += len(__append_node_routes(node_id, routes))
+            nodes += 1
+
+    logger.access().info("Routes of {} node/s ({} theme/s) preloaded in {:.3f}s", nodes, themes,
+                         time.perf_counter() - started_at)
+
+
+def __build_node_themes(node_id, routes):
+    # theme -> component_settings_id
+    themes = dict()
 
-    for component_id_used in config.keys():
-        for measuring_unit in config[component_id_used]:
-            themes.append('{}/{}/{}'.format(node_id, str(component_id_used), measuring_unit))
+    for (component_id_used, measuring_unit), component_settings_id in routes.items():
+        themes['{}/{}/{}'.format(node_id, str(component_id_used), measuring_unit)] = component_settings_id
 
     return themes
 
@@ -1,6 +1,7 @@
 from shared.utils.config import ConfigRestriction
 from shared.utils.validator import is_not_empty, is_boolean, is_integer, is_config, is_db,\
-    is_log, is_one_of_values, is_file_size, is_time_after, is_time_at
+    is_log, is_one_of_values, is_file_size, is_time_after, is_time_at, is_time_after_per_type,\
+    is_bin
 
 
 # name used for Logger
@@ -21,6 +22,18 @@ __clean_session = ConfigRestriction(False, is_boolean)      # optional (default
 __broker_host = ConfigRestriction(True, is_not_empty)
 __broker_port = ConfigRestriction(True, is_integer)
 __keepalive = ConfigRestriction(False, is_integer)          # optional (default exists)
+__dispatch_workers = ConfigRestriction(False, is_integer)   # optional (default exists)
+__dispatch_queue_size = ConfigRestriction(False, is_integer)    # optional (default exists)
+__dispatch_overflow = ConfigRestriction(False, is_one_of_values, 'block', 'drop_oldest', 'spill')  # optional (default is BLOCK)
+__dispatch_spill_path = ConfigRestriction(False, is_bin)\
+    .add_dependence('dispatch_overflow', 'spill')           # optional (default is next to node_data database)
+__partition_count = ConfigRestriction(False, is_integer)\
+    .add_dependence('partition_index')                      # optional (default is 1, client handles all nodes)
+__partition_index = ConfigRestriction(False, is_integer)\
+    .add_dependence('partition_count')                      # optional
+__subscription_mode = ConfigRestriction(False, is_one_of_values, 'theme', 'wildcard')  # optional (default is THEME)
+__wildcard_topic = ConfigRestriction(False, is_not_empty)\
+    .add_dependence('subscription_mode', 'wildcard')        # optional (default exists)
 # section Logger
 __file_path = ConfigRestriction(False, is_log)              # optional
 __depends_on = ConfigRestriction(False, is_one_of_values, 'nothing', 'size', 'time')\
@@ -30,20 +43,26 @@ __max_file_size = ConfigRestriction(False, is_file_size)\
     .add_exclusionary_keys('time_after', 'time_at')         # optional
 __time_after = ConfigRestriction(False, is_time_after)\
     .add_dependence('depends_on', 'time')\
-    .add_exclusionary_keys('max_file_size', 'time_at')      # optional, NOT IMPLEMENTED
+    .add_exclusionary_keys('max_file_size', 'time_at')      # optional
 __time_at = ConfigRestriction(False, is_time_at)\
     .add_dependence('depends_on', 'time')\
-    .add_exclusionary_keys('max_file_size', 'time_after')   # optional, NOT IMPLEMENTED
+    .add_exclusionary_keys('max_file_size', 'time_after')   # optional
 __rotate = ConfigRestriction(False, is_boolean)\
     .add_dependence('depends_on', 'size', 'time')\
     .add_dependence('max_files')                            # optional
 __max_files = ConfigRestriction(False, is_integer)\
     .add_dependence('rotate', 'true')                       # optional
 __print_log = ConfigRestriction(False, is_boolean)          # optional (default_exist)
-__print_level = ConfigRestriction(False, is_not_empty)\
-    .add_dependence('print_log', 'true')                    # optional (default_exist), NOT IMPLEMENTED
-__write_level = ConfigRestriction(False, is_not_empty)\
-    .add_dependence('file_path')                            # optional (default_exist), NOT IMPLEMENTED
+__print_level = ConfigRestriction(False, is_one_of_values, 'info', 'warning', 'error')\
+    .add_dependence('print_log', 'true')                    # optional (default is INFO)
+__write_level = ConfigRestriction(False, is_one_of_values, 'info', 'warning', 'error')\
+    .add_dependence('file_path')                            # optional (default is INFO)
+__has_buffer = ConfigRestriction(False, is_boolean)\
+    .add_dependence('file_path')                            # optional (default is FALSE)
+__max_buffer_size = ConfigRestriction(False, is_file_size)\
+    .add_dependence('has_buffer', 'true')                   # optional (default exists)
+__flush_interval = ConfigRestriction(False, is_integer)\
+    .add_dependence('has_buffer', 'true')                   # optional (default exists)
 # section Security
 __accept_prefix = ConfigRestriction(False, is_not_empty)    # optional
 __approval_required = ConfigRestriction(False, is_boolean)  # optional (default is FALSE)
@@ -55,6 +74,37 @@ __ca_file_path = ConfigRestriction(False, is_not_empty)     # optional
 # section Database
 __node_data_path = ConfigRestriction(True, is_db)
 __accounts_path = ConfigRestriction(True, is_db)
+__batch_size = ConfigRestriction(False, is_integer)          # optional (default exists)
+__batch_latency = ConfigRestriction(False, is_integer)       # optional (default exists)
+__batch_queue_size = ConfigRestriction(False, is_integer)    # optional (default exists)
+__journal_mode = ConfigRestriction(False, is_one_of_values,
+                                   'delete', 'truncate', 'persist', 'memory', 'wal', 'off')    # optional (default is WAL)
+__synchronous = ConfigRestriction(False, is_one_of_values,
+                                  'off', 'normal', 'full', 'extra')     # optional (default is NORMAL)
+__cache_size = ConfigRestriction(False, is_file_size)        # optional (default is SQLite's)
+__mmap_size = ConfigRestriction(False, is_file_size)         # optional (default is SQLite's)
+__busy_timeout = ConfigRestriction(False, is_integer)        # optional (default exists)
+__pool_class = ConfigRestriction(False, is_one_of_values,
+                                 'default', 'queue', 'null', 'static', 'singleton')     # optional (default exists)
+__auto_vacuum = ConfigRestriction(False, is_one_of_values,
+                                  'none', 'full', 'incremental')        # optional (default is INCREMENTAL)
+__maintenance_interval = ConfigRestriction(False, is_time_after)   # optional (default exists)
+__compact_after = ConfigRestriction(False, is_time_after)   # optional (without it there's no compaction)
+__pack_after = ConfigRestriction(False, is_time_after)\
+    .add_dependence('compact_after')                        # optional (without it there's no packing)
+__compact_unconfirmed = ConfigRestriction(False, is_boolean)\
+    .add_dependence('compact_after')                        # optional (default is FALSE)
+__raw_retention = ConfigRestriction(False, is_time_after)   # optional (without it values are kept forever)
+__rollup_retention = ConfigRestriction(False, is_time_after)                # optional
+__raw_retention_per_type = ConfigRestriction(False, is_time_after_per_type)     # optional
+__rollup_retention_per_type = ConfigRestriction(False, is_time_after_per_type)  # optional
+__prune_unconfirmed = ConfigRestriction(False, is_boolean)  # optional (default is FALSE)
+__latest_values_path = ConfigRestriction(False, is_bin)     # optional (without it newest values aren't shared)
+__latest_values_capacity = ConfigRestriction(False, is_integer)\
+    .add_dependence('latest_values_path')                   # optional (default exists)
+__data_versions_path = ConfigRestriction(False, is_bin)     # optional (without it web server doesn't cache pages)
+__data_versions_capacity = ConfigRestriction(False, is_integer)\
+    .add_dependence('data_versions_path')                   # optional (default exists)
 # endregion
 
 CONFIG_STRUCTURE = {
@@ -66,7 +116,15 @@ CONFIG_STRUCTURE = {
         'clean_session':        __clean_session,
         'broker_host':          __broker_host,
         'broker_port':          __broker_port,
-        'keepalive':            __keepalive
+        'keepalive':            __keepalive,
+        'dispatch_workers':     __dispatch_workers,
+        'dispatch_queue_size':  __dispatch_queue_size,
+        'dispatch_overflow':    __dispatch_overflow,
+        'dispatch_spill_path':  __dispatch_spill_path,
+        'partition_count':      __partition_count,
+        'partition_index':      __partition_index,
+        'subscription_mode':    __subscription_mode,
+        'wildcard_topic':       __wildcard_topic
     },
     'Logger': {
         'file_path':            __file_path,
@@ -78,7 +136,10 @@ CONFIG_STRUCTURE = {
         'max_files':            __max_files,
         'print_log':            __print_log,
         'print_level':          __print_level,
-        'write_level':          __write_level
+        'write_level':          __write_level,
+        'has_buffer':           __has_buffer,
+        'max_buffer_size':      __max_buffer_size,
+        'flush_interval':       __flush_interval
     },
     'Security': {
         'accept_prefix':        __accept_prefix,
@@ -88,24 +149,56 @@ CONFIG_STRUCTURE = {
         'ca_file_path':         __ca_file_path
     },
     'Database': {
-        'node_data_path':       __node_data_path
+        'node_data_path':       __node_data_path,
+        'batch_size':           __batch_size,
+        'batch_latency':        __batch_latency,
+        'batch_queue_size':     __batch_queue_size,
+        'journal_mode':         __journal_mode,
+        'synchronous':          __synchronous,
+        'cache_size':           __cache_size,
+        'mmap_size':            __mmap_size,
+        'busy_timeout':         __busy_timeout,
+        'pool_class':           __pool_class,
+        'auto_vacuum':          __auto_vacuum,
+        'maintenance_interval': __maintenance_interval,
+        'compact_after':        __compact_after,
+        'pack_after':           __pack_after,
+        'compact_unconfirmed':  __compact_unconfirmed,
+        'raw_retention':        __raw_retention,
+        'rollup_retention':     __rollup_retention,
+        'raw_retention_per_type':       __raw_retention_per_type,
+        'rollup_retention_per_type':    __rollup_retention_per_type,
+        'prune_unconfirmed':    __prune_unconfirmed,
+        'latest_values_path':   __latest_values_path,
+        'latest_values_capacity':   __latest_values_capacity,
+        'data_versions_path':   __data_versions_path,
+        'data_versions_capacity':   __data_versions_capacity
     }
 }
-# PS (time_after and time_at won't work because it's not implemented, same goes for print and write
-# levels too)
 
 
 class Default:
     # Info
     CLEAN_SESSION = True
     KEEPALIVE = 60
+    DISPATCH_WORKERS = 2
+    DISPATCH_QUEUE_SIZE = 10000     # messages
+    DISPATCH_OVERFLOW = 'block'
+    SUBSCRIPTION_MODE = 'theme'
+    WILDCARD_TOPIC = '+/+/+'        # node/component/measuring unit
     # Logger
     PRINT_LOG = False       # by default is False (in logger)
     # Security
     APPROVAL_REQUIRED = False
+    # Database
+    BATCH_SIZE = 100        # measurements
+    BATCH_LATENCY = 2
+    BATCH_QUEUE_SIZE = 100000       # measurements waiting for database
+    MAINTENANCE_INTERVAL = 60 * 60      # seconds
 
     # GLOBAL
     RECONNECT_AFTER = 2     # seconds
+    SUBSCRIBE_BATCH_SIZE = 100      # themes in one SUBSCRIBE packet
     EMPTY_STRING = ''
 
 
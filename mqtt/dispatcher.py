@@ -0,0 +1,329 @@
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from threading import Condition, Lock, Thread
+
+
+class Dispatcher:
+    """
+    Bounded queue of received MQTT messages between network loop and database work. Network
+    loop (on_message) only adds (topic, payload, received_at) to queue, and worker threads
+    handle messages (validation, routing, registration queries), so slow database never
+    delays keepalive and QoS acks. Each worker thread has its own database session (DBHandler
+    uses thread-local sessions).
+
+    Each worker has its own queue and messages with same key (node) always go to same worker
+    (by hash of key), so messages of one node are handled in order they came, while messages
+    of different nodes are handled at the same time. Max size is for all queues together.
+
+    When queue is full, overflow policy decides what happens with new message:
+        block           network loop waits until there's space (nothing is lost)
+        drop_oldest     oldest message in queue is dropped
+        spill           messages are appended to spill file and moved back to queue when
+                        there's space (while file isn't empty, new messages go to it too, so
+                        order is kept)
+    """
+
+    __instance = None
+    POLICIES = ('block', 'drop_oldest', 'spill')
+    # spilled message: received_at (double), topic length (uint16), payload length (uint32)
+    SPILL_RECORD = struct.Struct('<dHI')
+
+    @staticmethod
+    def init():
+        Dispatcher.__instance = Dispatcher()
+
+    @staticmethod
+    def get_instance():
+        if Dispatcher.__instance is None:
+            Dispatcher.__instance = Dispatcher()
+
+        return Dispatcher.__instance
+
+    def __init__(self):
+        # queue of each worker, number of messages in all of them, condition of each worker
+        # (there's message in its queue) and condition of dispatch (there's space in queues),
+        # all conditions share one lock
+        self.__queues = [deque()]
+        self.__size = 0
+        self.__lock = Lock()
+        self.__ready = [Condition(self.__lock)]
+        self.__space = Condition(self.__lock)
+        self.__handler = None
+        self.__on_worker_stop = None
+        self.__get_key = None
+        self.__workers_count = 2
+        self.__max_size = 10000
+        self.__policy = 'block'
+        self.__spill_path = None
+        self.__logger = None
+        self.__workers = list()
+        self.__stopped = False
+        # spill file is read from offset, it's truncated when all of it is read
+        self.__spill_file = None
+        self.__spill_offset = 0
+        self.__spilled = 0
+        # counters
+        self.__max_depth = 0
+        self.__handled = 0
+        self.__failed = 0
+        self.__dropped = 0
+        self.__total_spilled = 0
+        self.__blocked_time = 0.0
+        self.__last_lag = 0.0
+        self.__max_lag = 0.0
+
+    def setup(self, workers, max_size, policy, spill_path=None, logger=None):
+        """
+        :param workers:     number of worker threads
+        :param max_size:    max number of messages in queue
+        :param policy:      one of POLICIES
+        :param spill_path:  spill file (required for 'spill' policy)
+        :param logger:      logger for failed messages (optional)
+        :return:
+        """
+
+        self.__workers_count = workers
+        self.__max_size = max_size
+        self.__policy = policy
+        self.__spill_path = spill_path
+        self.__logger = logger
+
+    def start(self, handler, on_worker_stop=None, get_key=None):
+        """
+        :param handler:         function(topic, payload, received_at) which handles one message
+        :param on_worker_stop:  function without parameters, called by each worker thread before
+                                it stops (to close its database session etc., optional)
+        :param get_key:         function(topic, payload) which returns key (string) of messages
+                                which must be handled in order (topic is key if it's None)
+        :return:
+        """
+
+        self.__handler = handler
+        self.__on_worker_stop = on_worker_stop
+        self.__get_key = get_key
+
+        if len(self.__workers) > 0:
+            return
+
+        self.__queues = [deque() for i in range(self.__workers_count)]
+        self.__ready = [Condition(self.__lock) for i in range(self.__workers_count)]
+
+        if self.__policy == 'spill':
+            self.__open_spill_file()
+
+        self.__stopped = False
+
+        for i in range(self.__workers_count):
+            worker = Thread(target=self.__run, args=(i,), name='dispatcher-{}'.format(i), daemon=True)
+            worker.start()
+            self.__workers.append(worker)
+
+    def stop(self):
+        # workers handle everything that's left in queue (and in spill file) before they stop
+        with self.__lock:
+            self.__stopped = True
+            self.__space.notify_all()
+
+            for ready in self.__ready:
+                ready.notify_all()
+
+        for worker in self.__workers:
+            worker.join()
+
+        self.__workers = list()
+
+        if self.__spill_file is not None:
+            self.__spill_file.close()
+            self.__spill_file = None
+
+    def dispatch(self, topic, payload, received_at=None):
+        """
+        Adds message to queue (it's called from network loop).
+
+        :param topic:
+        :param payload:     bytes
+        :param received_at: seconds since epoch (now if None)
+        :return:            False if message (or oldest one) was dropped
+        """
+
+        if received_at is None:
+            received_at = time.time()
+
+        with self.__lock:
+            if self.__spilled > 0 or (self.__size >= self.__max_size and self.__policy == 'spill'):
+                self.__spill(topic, payload, received_at)
+
+                return True
+
+            dropped = False
+
+            if self.__size >= self.__max_size:
+                if self.__policy == 'drop_oldest':
+                    self.__drop_oldest()
+                    dropped = True
+                else:
+                    blocked_at = time.perf_counter()
+
+                    while self.__size >= self.__max_size and not self.__stopped:
+                        self.__space.wait()
+
+                    self.__blocked_time += time.perf_counter() - blocked_at
+
+            self.__enqueue(topic, payload, received_at)
+
+        return not dropped
+
+    @property
+    def depth(self):
+        # messages in queues and in spill file
+        return self.__size + self.__spilled
+
+    @property
+    def lag(self):
+        # seconds that oldest message in queues is waiting (spilled ones are older)
+        with self.__lock:
+            if self.__spilled > 0:
+                return time.time() - self.__peek_spilled_received_at()
+            if self.__size > 0:
+                return time.time() - min(queue[0][2] for queue in self.__queues if len(queue) > 0)
+
+        return 0.0
+
+    @property
+    def stats(self):
+        return {
+            'queue_depth':      self.__size,
+            'spilled':          self.__spilled,
+            'max_queue_depth':  self.__max_depth,
+            'lag':              self.lag,
+            'last_lag':         self.__last_lag,
+            'max_lag':          self.__max_lag,
+            'handled':          self.__handled,
+            'failed':           self.__failed,
+            'dropped':          self.__dropped,
+            'total_spilled':    self.__total_spilled,
+            'blocked_time':     self.__blocked_time
+        }
+
+    def __run(self, index):
+        queue = self.__queues[index]
+
+        while True:
+            with self.__lock:
+                while len(queue) == 0:
+                    if self.__spilled > 0 and self.__size < self.__max_size:
+                        self.__load_spilled()
+                    elif self.__stopped and self.__spilled == 0:
+                        break
+                    else:
+                        self.__ready[index].wait()
+
+                if len(queue) == 0:
+                    break
+
+                topic, payload, received_at = queue.popleft()
+                self.__size -= 1
+
+                # there's space for one more, spilled messages go first
+                if self.__spilled > 0:
+                    self.__load_spilled()
+
+                # dispatch could wait for space
+                self.__space.notify()
+
+            ok = True
+
+            try:
+                self.__handler(topic, payload, received_at)
+            except Exception as e:
+                # one bad message mustn't stop worker
+                ok = False
+
+                if self.__logger is not None:
+                    self.__logger.error("Message on '{}' failed: {}", topic, e)
+
+            with self.__lock:
+                if ok:
+                    self.__handled += 1
+                else:
+                    self.__failed += 1
+
+                self.__last_lag = time.time() - received_at
+                self.__max_lag = max(self.__max_lag, self.__last_lag)
+
+        if self.__on_worker_stop is not None:
+            self.__on_worker_stop()
+
+    def __enqueue(self, topic, payload, received_at):
+        # caller holds lock, message goes to worker of its key
+        key = topic if self.__get_key is None else self.__get_key(topic, payload)
+        index = zlib.crc32(key.encode('utf-8')) % len(self.__queues)
+        self.__queues[index].append((topic, payload, received_at))
+        self.__size += 1
+        self.__max_depth = max(self.__max_depth, self.__size)
+        self.__ready[index].notify()
+
+    def __drop_oldest(self):
+        # caller holds lock, drops message which is waiting longest (in any queue)
+        oldest = min((queue for queue in self.__queues if len(queue) > 0), key=lambda queue: queue[0][2])
+        oldest.popleft()
+        self.__size -= 1
+        self.__dropped += 1
+
+    def __open_spill_file(self):
+        # messages spilled before client stopped are handled first
+        self.__spill_file = open(self.__spill_path, 'a+b')
+        self.__spill_file.seek(0)
+        self.__spill_offset = 0
+        self.__spilled = 0
+
+        while True:
+            header = self.__spill_file.read(Dispatcher.SPILL_RECORD.size)
+
+            if len(header) < Dispatcher.SPILL_RECORD.size:
+                break
+
+            received_at, topic_size, payload_size = Dispatcher.SPILL_RECORD.unpack(header)
+            self.__spill_file.seek(topic_size + payload_size, os.SEEK_CUR)
+            self.__spilled += 1
+
+        if self.__spilled == 0:
+            self.__spill_file.truncate(0)
+
+    def __spill(self, topic, payload, received_at):
+        if self.__spill_file is None:
+            self.__open_spill_file()
+
+        encoded_topic = topic.encode('utf-8')
+        # file is opened for appending, so write always goes to the end
+        self.__spill_file.write(Dispatcher.SPILL_RECORD.pack(received_at, len(encoded_topic), len(payload)) +
+                                encoded_topic + payload)
+        self.__spill_file.flush()
+        self.__spilled += 1
+        self.__total_spilled += 1
+
+    def __load_spilled(self):
+        # moves spilled messages back to queues (as many as fit), caller holds lock
+        self.__spill_file.seek(self.__spill_offset)
+
+        while self.__spilled > 0 and self.__size < self.__max_size:
+            received_at, topic_size, payload_size = Dispatcher.SPILL_RECORD.unpack(
+                self.__spill_file.read(Dispatcher.SPILL_RECORD.size))
+            topic = self.__spill_file.read(topic_size).decode('utf-8')
+            payload = self.__spill_file.read(payload_size)
+            self.__enqueue(topic, payload, received_at)
+            self.__spilled -= 1
+
+        self.__spill_offset = self.__spill_file.tell()
+
+        if self.__spilled == 0:
+            self.__spill_file.truncate(0)
+            self.__spill_offset = 0
+
+    def __peek_spilled_received_at(self):
+        self.__spill_file.seek(self.__spill_offset)
+
+        return Dispatcher.SPILL_RECORD.unpack(self.__spill_file.read(Dispatcher.SPILL_RECORD.size))[0]
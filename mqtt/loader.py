@@ -1,13 +1,22 @@
+import os
+
 from shared import constant as shared_constant
 from shared.utils.log import Logger
 from shared.utils.object_holder import ObjectHolder
 from shared.utils.config import ConfigManager, ConfigCache
 from shared.utils.info_provider import get_mac
+from shared.utils.converter import to_seconds, to_seconds_per_type
+from shared.utils.partition import get_partition_path
+from shared.data.engine import StorageProfile
+from shared.data.latest_values import LatestValues
+from shared.data.data_versions import DataVersions
 from shared.data.models.node_data import Base as NodeBase
 from shared.data.handlers.node_data import DBHandler as NodeHandler
 
 from mqtt.constant import CLIENT_NAME, CONFIG_STRUCTURE, Default
 from mqtt.cache import MqttCache, MeasurementsCache
+from mqtt.maintenance import Maintenance
+from mqtt.dispatcher import Dispatcher
 
 
 """
@@ -24,8 +33,14 @@ config_manager = ConfigManager().get_instance()
 config_cache = ConfigCache.get_instance()
 cache = MqttCache.get_instance()
 measurements_cache = MeasurementsCache.get_instance()
+maintenance = Maintenance.get_instance()
+dispatcher = Dispatcher.get_instance()
 # required to use init because of constructor parameter!
 node_db_handler = ObjectHolder()
+# newest value of each sensor, shared with web server (it's None if it's not in config)
+latest_values = ObjectHolder()
+# version of each node's data, shared with web server (it's None if it's not in config)
+data_versions = ObjectHolder()
 
 
 def load(cwd):
@@ -44,6 +59,8 @@ def load(cwd):
     # broker_host = ''
     # broker_port = ''
     keepalive = Default.KEEPALIVE
+    partition_index = 0
+    partition_count = 1
 
     # raed client config
     config, message = config_manager.read(cwd, CONFIG_STRUCTURE)
@@ -84,6 +101,22 @@ def load(cwd):
             broker_port = int(config['broker_port'])
             if 'keepalive' in config.keys():
                 keepalive = int(config['keepalive'])
+            if 'partition_count' in config.keys():
+                partition_count = int(config['partition_count'])
+                partition_index = int(config['partition_index'])
+
+                if partition_count < 1 or not 0 <= partition_index < partition_count:
+                    print("{}:\tpartition_index must be between 0 and partition_count - 1".format(CLIENT_NAME))
+                    return False, None
+
+                cache.set_partition(partition_index, partition_count)
+            if 'subscription_mode' in config.keys() and config['subscription_mode'] == 'wildcard':
+                wildcard_topic = Default.WILDCARD_TOPIC
+
+                if 'wildcard_topic' in config.keys():
+                    wildcard_topic = config['wildcard_topic']
+
+                cache.set_wildcard_topic(wildcard_topic)
             # endregion
 
             result['client_id'] = prefix + client_id
@@ -96,9 +129,16 @@ def load(cwd):
             filename = ''
             depends_on = Logger.DEPENDS_ON_NOTHING
             max_file_size = ''
+            time_after = ''
+            time_at = ''
             rotate = False
             max_files = 1
             print_log = Default.PRINT_LOG
+            print_level = Logger.INFO
+            write_level = Logger.INFO
+            has_buffer = False
+            max_buffer_size = ''
+            flush_interval = Logger.DEFAULT_FLUSH_INTERVAL
 
             if 'file_path' in config.keys():
                 filename = config['file_path']
@@ -112,6 +152,10 @@ def load(cwd):
 
                     if 'max_file_size' in config.keys():
                         max_file_size = config['max_file_size']
+                    if 'time_after' in config.keys():
+                        time_after = config['time_after']
+                    if 'time_at' in config.keys():
+                        time_at = config['time_at']
                     if 'rotate' in config.keys():
                         if config['rotate'] == 'true':
                             rotate = True
@@ -119,18 +163,152 @@ def load(cwd):
                             rotate = False
                         # if rotate exists, then max_files should too...
                         max_files = config['max_files']
+                if 'has_buffer' in config.keys() and config['has_buffer'] == 'true':
+                    has_buffer = True
+
+                    if 'max_buffer_size' in config.keys():
+                        max_buffer_size = config['max_buffer_size']
+                    if 'flush_interval' in config.keys():
+                        flush_interval = int(config['flush_interval'])
+                if 'write_level' in config.keys():
+                    write_level = Logger.LEVELS[config['write_level']]
             if 'print_log' in config.keys():
-                print_log = config['print_log']
+                # value is string, so it has to be compared (any non empty string is True)
+                print_log = config['print_log'] == 'true'
+
+                if 'print_level' in config.keys():
+                    print_level = Logger.LEVELS[config['print_level']]
 
-            logger_obj = Logger(CLIENT_NAME, filename, depends_on, max_file_size,
-                                rotate=rotate, max_files=max_files, print_log=print_log)
+            logger_obj = Logger(CLIENT_NAME, filename, depends_on, max_file_size, time_after, time_at,
+                                rotate=rotate, max_files=max_files, has_buffer=has_buffer,
+                                max_buffer_size=max_buffer_size, flush_interval=flush_interval,
+                                print_log=print_log, print_level=print_level, write_level=write_level)
             logger.hold(logger_obj)
             # endregion
 
-            NodeHandler.init(NodeBase, config['node_data_path'])
+            # storage profile (WAL, pragmas, pool) is applied on each database connection
+            storage_profile = StorageProfile.from_config(config)
+            NodeHandler.init(NodeBase, config['node_data_path'], storage_profile)
             node_db_handler_obj = NodeHandler.get_instance()
             node_db_handler.hold(node_db_handler_obj)
 
+            # region LOAD MEASUREMENTS CACHE
+            batch_size = Default.BATCH_SIZE
+            batch_latency = Default.BATCH_LATENCY
+            batch_queue_size = Default.BATCH_QUEUE_SIZE
+
+            if 'batch_size' in config.keys():
+                batch_size = int(config['batch_size'])
+            if 'batch_latency' in config.keys():
+                batch_latency = int(config['batch_latency'])
+            if 'batch_queue_size' in config.keys():
+                batch_queue_size = int(config['batch_queue_size'])
+
+            measurements_cache.setup(node_db_handler_obj.new_data_batch, batch_size, batch_latency, batch_queue_size)
+            # endregion
+
+            # region LOAD DISPATCHER
+            dispatch_workers = Default.DISPATCH_WORKERS
+            dispatch_queue_size = Default.DISPATCH_QUEUE_SIZE
+            dispatch_overflow = Default.DISPATCH_OVERFLOW
+            # by default spilled messages are kept next to node_data database
+            dispatch_spill_path = os.path.splitext(config['node_data_path'])[0] + '_spill.bin'
+
+            if 'dispatch_workers' in config.keys():
+                dispatch_workers = max(1, int(config['dispatch_workers']))
+            if 'dispatch_queue_size' in config.keys():
+                dispatch_queue_size = max(1, int(config['dispatch_queue_size']))
+            if 'dispatch_overflow' in config.keys():
+                dispatch_overflow = config['dispatch_overflow']
+            if 'dispatch_spill_path' in config.keys():
+                dispatch_spill_path = config['dispatch_spill_path']
+
+            # spilled messages of each partition are kept in its own file
+            dispatch_spill_path = get_partition_path(dispatch_spill_path, partition_index, partition_count)
+
+            dispatcher.setup(dispatch_workers, dispatch_queue_size, dispatch_overflow, dispatch_spill_path,
+                             logger_obj)
+            # endregion
+
+            # region LOAD LATEST VALUES
+            if 'latest_values_path' in config.keys():
+                latest_values_capacity = LatestValues.DEFAULT_CAPACITY
+
+                if 'latest_values_capacity' in config.keys():
+                    latest_values_capacity = int(config['latest_values_capacity'])
+
+                # only one process can be writer, so each partition writes its own file (web server
+                # reads files of all partitions)
+                LatestValues.init(get_partition_path(config['latest_values_path'], partition_index, partition_count),
+                                  True, latest_values_capacity)
+                latest_values.hold(LatestValues.get_instance())
+            # endregion
+
+            # region LOAD DATA VERSIONS
+            if 'data_versions_path' in config.keys():
+                data_versions_capacity = DataVersions.DEFAULT_CAPACITY
+
+                if 'data_versions_capacity' in config.keys():
+                    data_versions_capacity = int(config['data_versions_capacity'])
+
+                # same as latest values, each partition bumps versions of its own nodes in its own file
+                DataVersions.init(get_partition_path(config['data_versions_path'], partition_index, partition_count),
+                                  True, data_versions_capacity)
+                data_versions.hold(DataVersions.get_instance())
+            # endregion
+
+            # region LOAD MAINTENANCE
+            maintenance_interval = Default.MAINTENANCE_INTERVAL
+
+            if 'maintenance_interval' in config.keys():
+                maintenance_interval = to_seconds(config['maintenance_interval'])
+
+            maintenance.setup(maintenance_interval, logger_obj)
+
+            # all partitions share database, so only partition 0 compacts, prunes and vacuums it
+            # (other partitions would run same deletes and vacuum at the same time)
+            if 'compact_after' in config.keys() and partition_index == 0:
+                compact_after = to_seconds(config['compact_after'])
+                pack_after = None
+                only_confirmed = True
+
+                if 'pack_after' in config.keys():
+                    pack_after = to_seconds(config['pack_after'])
+                if 'compact_unconfirmed' in config.keys() and config['compact_unconfirmed'] == 'true':
+                    only_confirmed = False
+
+                maintenance.add_job('compaction', lambda: node_db_handler_obj.compact_data(
+                    compact_after, pack_after, only_confirmed))
+
+            retention_keys = ['raw_retention', 'rollup_retention', 'raw_retention_per_type', 'rollup_retention_per_type']
+
+            if any(key in config.keys() for key in retention_keys) and partition_index == 0:
+                raw_retention = None
+                rollup_retention = None
+                raw_retention_per_type = dict()
+                rollup_retention_per_type = dict()
+                prune_only_confirmed = True
+
+                if 'raw_retention' in config.keys():
+                    raw_retention = to_seconds(config['raw_retention'])
+                if 'rollup_retention' in config.keys():
+                    rollup_retention = to_seconds(config['rollup_retention'])
+                if 'raw_retention_per_type' in config.keys():
+                    raw_retention_per_type = to_seconds_per_type(config['raw_retention_per_type'])
+                if 'rollup_retention_per_type' in config.keys():
+                    rollup_retention_per_type = to_seconds_per_type(config['rollup_retention_per_type'])
+                if 'prune_unconfirmed' in config.keys() and config['prune_unconfirmed'] == 'true':
+                    prune_only_confirmed = False
+
+                maintenance.add_job('retention', lambda: node_db_handler_obj.prune_data(
+                    raw_retention, rollup_retention, raw_retention_per_type, rollup_retention_per_type,
+                    prune_only_confirmed))
+
+            # queue metrics are logged with results of other jobs
+            maintenance.add_job('dispatcher stats', lambda: dispatcher.stats)
+            maintenance.add_job('measurements cache stats', lambda: measurements_cache.stats)
+            # endregion
+
             return True, result
         else:
             return False, None
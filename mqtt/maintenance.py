@@ -0,0 +1,81 @@
+import time
+from threading import Event, Thread
+
+
+class Maintenance:
+    """
+    Runs database maintenance jobs (compaction etc.) periodically in background thread, so
+    they never block MQTT network loop.
+    """
+
+    __instance = None
+
+    @staticmethod
+    def init():
+        Maintenance.__instance = Maintenance()
+
+    @staticmethod
+    def get_instance():
+        if Maintenance.__instance is None:
+            Maintenance.__instance = Maintenance()
+
+        return Maintenance.__instance
+
+    def __init__(self):
+        # list of (name, job), job is function without parameters
+        self.__jobs = list()
+        self.__interval = 3600
+        self.__logger = None
+        self.__stopped = Event()
+        self.__worker = None
+
+    def setup(self, interval, logger=None):
+        """
+        :param interval:    seconds between two runs of jobs
+        :param logger:      logger for job results (optional)
+        :return:
+        """
+
+        self.__interval = interval
+        self.__logger = logger
+
+    def add_job(self, name, job):
+        self.__jobs.append((name, job))
+
+    def start(self):
+        if self.__worker is None and len(self.__jobs) > 0:
+            self.__stopped.clear()
+            self.__worker = Thread(target=self.__run, name='maintenance', daemon=True)
+            self.__worker.start()
+
+    def stop(self):
+        # job which is running is finished first
+        if self.__worker is not None:
+            self.__stopped.set()
+            self.__worker.join()
+            self.__worker = None
+
+    def run_jobs(self):
+        for name, job in self.__jobs:
+            if self.__stopped.is_set():
+                break
+
+            started_at = time.perf_counter()
+
+            try:
+                result = job()
+            except Exception as e:
+                # job will be tried again in next run
+                if self.__logger is not None:
+                    self.__logger.error("Maintenance job '{}' failed: {}", name, e)
+                continue
+
+            if self.__logger is not None:
+                self.__logger.info("Maintenance job '{}' done in {:.3f}s, result: {}",
+                                   name, time.perf_counter() - started_at, result)
+
+    def __run(self):
+        # first run is right after start (there could be lot of work left from before)
+        while not self.__stopped.is_set():
+            self.run_jobs()
+            self.__stopped.wait(self.__interval)
@@ -0,0 +1,57 @@
+import sys
+import time
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from shared.utils.converter import to_seconds
+from shared.utils.validator import is_time_after
+
+
+"""
+Converts existing node_data database to compact storage: moves measurements to sample
+table, packs old samples into blocks, computes rollups of values which were written before
+rollups existed and rebuilds database file so freed space is given back. Measurement table
+of older database is rebuilt first (when handler is created), so ids of moved measurements
+are never given to new ones. Stop MQTT client before converting.
+Run from project's root folder:
+    python -m shared.data.converter <node_data_path> [pack_after] [--unconfirmed]
+
+pack_after has time_after format (example: 30d), samples older than it are packed. By
+default only measurements which collector already confirmed are moved (others wouldn't be
+sent to collector anymore), with --unconfirmed all of them are moved.
+"""
+
+
+def convert(db_url, pack_after=None, only_confirmed=True):
+    DBHandler.init(Base, db_url)
+    handler = DBHandler.get_instance()
+
+    compacted, packed = handler.compact_data(0, pack_after, only_confirmed)
+    handler.rebuild_rollups()
+    handler.vacuum()
+
+    return compacted, packed
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--unconfirmed']
+
+    if len(args) == 0:
+        print("Missing node_data database path")
+        sys.exit(1)
+
+    pack_after = None
+
+    if len(args) > 1:
+        ok, message = is_time_after(args[1])
+
+        if not ok:
+            print("Invalid pack_after: {}".format(message))
+            sys.exit(1)
+
+        pack_after = to_seconds(args[1])
+
+    started_at = time.perf_counter()
+    compacted, packed = convert(args[0], pack_after, '--unconfirmed' not in sys.argv)
+    print("{} measurement/s compacted, {} sample/s packed in {:.3f}s"
+          .format(compacted, packed, time.perf_counter() - started_at))
@@ -0,0 +1,144 @@
+import struct
+import time
+
+from shared.data.shared_records import SharedRecords
+from shared.utils.partition import get_partition, get_partition_path
+
+
+class DataVersions(SharedRecords):
+    """
+    Version of all data and of each node's data, bumped by MQTT client (writer) when node's
+    config is registered or its measurements are written to database, and read by web server, which uses
+    them as ETag of pages and API responses (so unchanged ones aren't read from database and
+    rendered again). File is shared same way as LatestValues (see SharedRecords).
+
+    header:     created_at (int64), version (uint64), updated_at (int64)
+    record:     node_id (64 bytes, utf-8), version (uint64), updated_at (int64)
+
+    created_at is part of tag, so versions of new file never match tags of old one.
+    """
+
+    __instance = None
+    MAGIC = b'DV02'
+    EXTRA_HEADER = struct.Struct('<qQq')
+    RECORD = struct.Struct('<64sQq')
+    DEFAULT_CAPACITY = 1024
+    # max size of node_id (utf-8 bytes)
+    NODE_ID_SIZE = RECORD.size - 16
+
+    @staticmethod
+    def init(path, writable=False, capacity=DEFAULT_CAPACITY):
+        DataVersions.__instance = DataVersions(path, writable, capacity)
+
+    @staticmethod
+    def get_instance():
+        return DataVersions.__instance
+
+    def __init__(self, path, writable=False, capacity=DEFAULT_CAPACITY):
+        """
+        :param path:        path to file (writer creates it if it doesn't exist)
+        :param writable:    True for writer (only one process can be writer)
+        :param capacity:    max number of nodes (used only when writer creates file)
+        """
+
+        super().__init__(path, writable, capacity)
+
+    def bump(self, node_ids=None, ts=None):
+        """
+        Increases version of all data and of nodes' data (writer only), as one change. Nodes
+        which don't fit into file (or have too long id) have only version of all data.
+
+        :param node_ids:    node or list of nodes whose data changed (None if it's not nodes'
+                            data)
+        :param ts:          seconds since epoch when data changed (now if None)
+        :return:
+        """
+
+        if ts is None:
+            ts = int(time.time())
+        if node_ids is None:
+            node_ids = list()
+        elif isinstance(node_ids, str):
+            node_ids = [node_ids]
+
+        slots = [(node_id, self._get_slot(node_id)) for node_id in node_ids]
+
+        with self._changing():
+            created_at, version, updated_at = self._read_extra()
+            self._write_extra(created_at, version + 1, ts)
+
+            for node_id, slot in slots:
+                if slot is not None:
+                    node_version = self._read_record(slot)[1]
+                    self._write_record(slot, node_id.encode('utf-8'), node_version + 1, ts)
+
+    def get(self, node_id=None):
+        """
+        :param node_id: node whose version is returned (None for version of all data)
+        :return:        (tag, updated_at) or None if version isn't known (file doesn't exist
+                        yet or node doesn't fit into it), tag is unique for each version
+        """
+
+        versions = self._read()
+
+        if versions is None:
+            return None
+
+        created_at, version, updated_at, nodes = versions
+
+        if node_id is not None:
+            if len(nodes) >= self.capacity or not self._fits(node_id):
+                # node could be one which didn't fit into file
+                if node_id not in nodes:
+                    return None
+
+            # node without record has no data changes since file was created
+            version, updated_at = nodes.get(node_id, (0, created_at))
+
+        return '{}-{}'.format(created_at, version), updated_at
+
+    def _fits(self, node_id):
+        return len(node_id.encode('utf-8')) <= DataVersions.NODE_ID_SIZE
+
+    def _get_key(self, record):
+        return record[0].rstrip(b'\0').decode('utf-8')
+
+    def _initial_extra(self):
+        now = int(time.time())
+
+        return now, 0, now
+
+    def _decode(self, extra, records):
+        created_at, version, updated_at = extra
+        nodes = {self._get_key(record): (record[1], record[2]) for record in records}
+
+        return created_at, version, updated_at, nodes
+
+
+class PartitionedDataVersions:
+    """
+    Reader of data versions of all partitions (each MQTT client which shares nodes writes its
+    own file, see get_partition_path), it's used same as DataVersions reader.
+    """
+
+    def __init__(self, path, partition_count):
+        self.__readers = [DataVersions(get_partition_path(path, index, partition_count))
+                          for index in range(partition_count)]
+
+    def get(self, node_id=None):
+        """
+        :param node_id: node whose version is returned (None for version of all data)
+        :return:        (tag, updated_at) or None if version isn't known
+        """
+
+        if node_id is not None:
+            # node's version is bumped only by partition which owns it
+            return self.__readers[get_partition(node_id, len(self.__readers))].get(node_id)
+
+        # all data changes when data of any partition changes
+        versions = [reader.get() for reader in self.__readers]
+
+        if None in versions:
+            return None
+
+        return '.'.join(tag for tag, updated_at in versions), max(updated_at for tag, updated_at in versions)
@@ -0,0 +1,145 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import NullPool, QueuePool, SingletonThreadPool, StaticPool
+
+from shared.utils.converter import to_bytes
+
+
+class StorageProfile:
+    """
+    SQLite settings which are applied on each new connection of engine. MQTT client writes
+    and web server reads same node_data database from different processes, so by default
+    database is in WAL mode (readers don't block writer and writer doesn't block readers)
+    and connection waits for lock instead of failing with "database is locked".
+    """
+
+    JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+    SYNCHRONOUS_LEVELS = ('off', 'normal', 'full', 'extra')
+    AUTO_VACUUM_MODES = ('none', 'full', 'incremental')
+    POOL_CLASSES = {
+        'default':      None,   # let SQLAlchemy choose (QueuePool for file database)
+        'queue':        QueuePool,
+        'null':         NullPool,
+        'static':       StaticPool,
+        'singleton':    SingletonThreadPool
+    }
+
+    DEFAULT_JOURNAL_MODE = 'wal'
+    # in WAL mode 'normal' is still safe from corruption, only last transactions can be lost
+    # at power loss (which is much faster than 'full' on SD card)
+    DEFAULT_SYNCHRONOUS = 'normal'
+    DEFAULT_BUSY_TIMEOUT = 5000     # miliseconds
+    # free pages are given back to file system in small steps by incremental vacuum (this mode
+    # works only for new databases, or after full vacuum of existing one)
+    DEFAULT_AUTO_VACUUM = 'incremental'
+    DEFAULT_POOL_CLASS = 'default'
+
+    def __init__(self, journal_mode=DEFAULT_JOURNAL_MODE, synchronous=DEFAULT_SYNCHRONOUS, cache_size=None,
+                 mmap_size=None, busy_timeout=DEFAULT_BUSY_TIMEOUT, pool_class=DEFAULT_POOL_CLASS,
+                 auto_vacuum=DEFAULT_AUTO_VACUUM):
+        """
+        :param journal_mode:    one of JOURNAL_MODES
+        :param synchronous:     one of SYNCHRONOUS_LEVELS
+        :param cache_size:      page cache size in bytes per connection (None for SQLite's default)
+        :param mmap_size:       max bytes of database file mapped into memory (None for SQLite's
+                                default, 0 disables it)
+        :param busy_timeout:    miliseconds connection waits for locked database
+        :param pool_class:      one of POOL_CLASSES keys
+        :param auto_vacuum:     one of AUTO_VACUUM_MODES
+        """
+
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.pool_class = pool_class
+        self.auto_vacuum = auto_vacuum
+
+    @staticmethod
+    def from_config(config):
+        """
+        Makes profile from (already validated) config, missing keys keep default values.
+
+        :param config:  dict with config's keys and values
+        :return:        StorageProfile
+        """
+
+        profile = StorageProfile()
+
+        if 'journal_mode' in config.keys():
+            profile.journal_mode = config['journal_mode']
+        if 'synchronous' in config.keys():
+            profile.synchronous = config['synchronous']
+        if 'cache_size' in config.keys():
+            profile.cache_size = to_bytes(config['cache_size'])
+        if 'mmap_size' in config.keys():
+            profile.mmap_size = to_bytes(config['mmap_size'])
+        if 'busy_timeout' in config.keys():
+            profile.busy_timeout = int(config['busy_timeout'])
+        if 'pool_class' in config.keys():
+            profile.pool_class = config['pool_class']
+        if 'auto_vacuum' in config.keys():
+            profile.auto_vacuum = config['auto_vacuum']
+
+        return profile
+
+    def get_pragmas(self):
+        # pragmas in order they're executed on new connection (auto_vacuum must be set before
+        # any table of new database is created)
+        pragmas = [
+            ('auto_vacuum', self.auto_vacuum),
+            ('busy_timeout', self.busy_timeout),
+            ('journal_mode', self.journal_mode),
+            ('synchronous', self.synchronous)
+        ]
+
+        if self.cache_size is not None:
+            # negative value is size in KiB (positive one would be number of pages)
+            pragmas.append(('cache_size', -(self.cache_size // 1024)))
+        if self.mmap_size is not None:
+            pragmas.append(('mmap_size', self.mmap_size))
+
+        return pragmas
+
+
+def create_sqlite_engine(db_url, profile=None, read_only=False, **kwargs):
+    """
+    Creates engine for SQLite database file and applies storage profile on each new
+    connection.
+
+    :param db_url:      path to database file
+    :param profile:     StorageProfile (default one if None)
+    :param read_only:   connections can't change database (query_only pragma)
+    :param kwargs:      other arguments for SQLAlchemy's create_engine
+    :return:            engine
+    """
+
+    if profile is None:
+        profile = StorageProfile()
+
+    pool_class = StorageProfile.POOL_CLASSES[profile.pool_class]
+
+    if pool_class is not None:
+        kwargs['poolclass'] = pool_class
+    if pool_class in (StaticPool, SingletonThreadPool):
+        # connection is shared, so it can be used by other thread than one that created it
+        kwargs.setdefault('connect_args', dict())['check_same_thread'] = False
+
+    engine = create_engine('sqlite:///' + db_url, **kwargs)
+    pragmas = profile.get_pragmas()
+
+    if read_only:
+        # it's set last, profile's pragmas could still have to be written to database header
+        pragmas.append(('query_only', 1))
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+
+        for name, value in pragmas:
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+        cursor.close()
+
+    return engine
+
@@ -1,11 +1,30 @@
+import time
 from datetime import datetime
 
-from sqlalchemy import create_engine, and_
+from sqlalchemy import Integer, and_, cast, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from shared.data.engine import create_sqlite_engine
 from shared.data.models import node_data
 
 
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+# max number of measurements moved to compact storage in one transaction
+COMPACT_BATCH_SIZE = 10000
+# seconds of values read at once while rollups are rebuilt
+REBUILD_WINDOW = 60 * 60 * 24 * 7
+# max number of rows deleted in one transaction while old values are pruned, and pause (in
+# seconds) between two transactions
+PRUNE_BATCH_SIZE = 1000
+PRUNE_BATCH_PAUSE = 0.01
+# max number of pages freed at once by incremental vacuum
+VACUUM_PAGES = 256
+# version of data in database (PRAGMA user_version), data of older versions is migrated once
+DATA_VERSION = 1
+
+
 class DBHandler:
     """
     Handles node_data database requests.
@@ -14,27 +33,128 @@ class DBHandler:
     __instance = None
 
     @staticmethod
-    def init(base, db_url):
-        DBHandler.__instance = DBHandler(base, db_url)
+    def init(base, db_url, profile=None, read_only=False):
+        DBHandler.__instance = DBHandler(base, db_url, profile, read_only)
 
     @staticmethod
     def get_instance():
         return DBHandler.__instance
 
-    def __init__(self, base, db_url):
+    def __init__(self, base, db_url, profile=None, read_only=False):
+        """
+        :param base:        declarative base of node_data models
+        :param db_url:      path to database file
+        :param profile:     StorageProfile
+        :param read_only:   session can only read (web server), only confirm_data writes
+                            through its own session, and tables aren't created or migrated
+                            (MQTT client does it)
+        """
+
         # db_url = get_databases_folder(os.getcwd()) + '\\node_data.db'
-        # self.__engine = create_engine('sqlite:///' + db_url, echo=True)
-        self.__engine = create_engine('sqlite:///' + db_url)
+        # storage profile (WAL, pragmas, pool) is applied on each new connection
+        self.__engine = create_sqlite_engine(db_url, profile, read_only)
         # self.__session = scoped_session(sessionmaker(autocommit=False,
         #                                              autoflush=False,
         #                                              bind=self.__engine))
         self.__session = scoped_session(sessionmaker(bind=self.__engine))
+        self.__write_engine = self.__engine
+        self.__write_session = self.__session
+
+        if read_only:
+            self.__write_engine = create_sqlite_engine(db_url, profile)
+            self.__write_session = scoped_session(sessionmaker(bind=self.__write_engine))
 
         # enable querying database through models
         # base.query = self.__session.query_property()
 
+        # every worker of production web server opens database, so only writer changes schema
+        if read_only:
+            return
+
         # create tables if they don't exist (it handles all itself)
-        base.metadata.create_all(self.__engine)
+        base.metadata.create_all(self.__write_engine)
+
+        # measurement table of older database doesn't have AUTOINCREMENT, so it's rebuilt
+        self.__rebuild_measurement_table()
+
+        # measurements of older database look confirmed by collector, but they weren't
+        self.__reset_delivery_confirmations()
+
+        # create_all skips tables that already exist, so indexes added later to existing
+        # tables must be created separately (this is migration of older databases)
+        self.__create_missing_indexes(base)
+
+    def remove_session(self):
+        # session of current thread is closed (web server calls it at the end of each request)
+        self.__session.remove()
+
+        if self.__write_session is not self.__session:
+            self.__write_session.remove()
+
+    def __rebuild_measurement_table(self):
+        """
+        Without AUTOINCREMENT SQLite gives ids of deleted newest measurements (or of all of
+        them, if table is empty after compaction) to new ones again, so collector which reads
+        measurements after its last id wouldn't get them. Table is copied into new one with
+        AUTOINCREMENT in one transaction (ids stay same).
+        """
+
+        measurement = node_data.Measurement.__table__
+
+        with self.__write_engine.begin() as connection:
+            table_sql = connection.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {'name': measurement.name}).scalar()
+
+            if table_sql is None or 'AUTOINCREMENT' in table_sql.upper():
+                return
+
+            # indexes keep their names when table is renamed, so they're dropped first and
+            # created again with new table
+            for index in measurement.indexes:
+                connection.execute(text('DROP INDEX IF EXISTS {}'.format(index.name)))
+
+            connection.execute(text('ALTER TABLE {0} RENAME TO {0}_old'.format(measurement.name)))
+            measurement.create(connection)
+            columns = ', '.join(column.name for column in measurement.columns)
+            connection.execute(text('INSERT INTO {0} ({1}) SELECT {1} FROM {0}_old'.format(measurement.name, columns)))
+            connection.execute(text('DROP TABLE {}_old'.format(measurement.name)))
+
+        print("Table '{}' is rebuilt with AUTOINCREMENT ids".format(measurement.name))
+
+    def __reset_delivery_confirmations(self):
+        """
+        Before collector confirmed deliveries, collector_delivery_confirmed was True by default
+        and nothing changed it, so collector wouldn't get measurements of older database, and
+        compaction and retention would handle them as delivered ones. They're all set as not
+        confirmed once, user_version of database marks that it's done.
+        """
+
+        measurement = node_data.Measurement.__table__
+
+        with self.__write_engine.begin() as connection:
+            if connection.exec_driver_sql('PRAGMA user_version').scalar() >= DATA_VERSION:
+                return
+
+            result = connection.execute(measurement.update()
+                                        .where(measurement.c.collector_delivery_confirmed == True)
+                                        .values(collector_delivery_confirmed=False))
+            # user_version is changed in same transaction, so reset is never done twice
+            connection.exec_driver_sql('PRAGMA user_version = {}'.format(DATA_VERSION))
+
+        if result.rowcount > 0:
+            print("{} measurement/s are set as not confirmed by collector".format(result.rowcount))
+
+    def __create_missing_indexes(self, base):
+        for table in base.metadata.sorted_tables:
+            for index in table.indexes:
+                try:
+                    index.create(self.__write_engine, checkfirst=True)
+                except IntegrityError:
+                    # older database already has duplicates which unique index doesn't allow, it
+                    # keeps working without that index (duplicates must be removed by hand)
+                    print("Index '{}' can't be created because table '{}' has duplicate rows"
+                          .format(index.name, table.name))
 
     def node_exists(self, node_id):
         # querying database through model
@@ -111,127 +231,857 @@ class DBHandler:
         :return:
         """
 
+        self.new_node_configs([(node_id, parsed_conf)])
+
+    def new_node_configs(self, node_configs):
+        """
+        Registers many nodes in one transaction. Primary keys are assigned by flushing each
+        table level at once (components, then value types, then settings), so rows don't
+        have to be queried back and there's only one commit for all nodes. If anything
+        fails, nothing is saved.
+
+        :param node_configs:    list of tuples (node_id, parsed_conf)
+        :return:
+        """
+
         # sqlite needs explicit date and time because it accepts strings as datetime
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        config_update = node_data.ConfigUpdate(created_at, created_at)
-        self.__session.add(config_update)
-        node = node_data.Node(node_id, created_at, created_at)
-        self.__session.add(node)
-        self.__session.commit()
-        # get config_update's id because it'll be required later (uniqueness by datetime)...
-        # required for component_settings
-        config_update_with_id = self.__session.query(node_data.ConfigUpdate)\
-            .filter(node_data.ConfigUpdate.created_at == created_at).first()
-
-        for component_info in parsed_conf:
-            component_type = component_info['type']
-            id_used = component_info['id_used']
-            name = component_info['name']
-            component = node_data.Component(node_id, id_used, component_type, created_at, created_at, name)
-            self.__session.add(component)
+
+        try:
+            config_update = node_data.ConfigUpdate(created_at, created_at)
+            self.__session.add(config_update)
+            components = list()
+
+            for node_id, parsed_conf in node_configs:
+                self.__session.add(node_data.Node(node_id, created_at, created_at))
+
+                for component_info in parsed_conf:
+                    component = node_data.Component(node_id, component_info['id_used'], component_info['type'],
+                                                    created_at, created_at, component_info['name'])
+                    components.append((component, component_info['value_types']))
+
+            self.__session.add_all([component for component, value_types_info in components])
+            # flush inserts config update, nodes and components and gives them ids
+            self.__session.flush()
+            value_types = list()
+
+            for component, value_types_info in components:
+                for value_type_info in value_types_info:
+                    component_value_type = node_data.ComponentValueType(
+                        component.id, value_type_info['value_type'], created_at, created_at)
+                    value_types.append((component_value_type, value_type_info))
+
+            self.__session.add_all([component_value_type for component_value_type, value_type_info in value_types])
+            self.__session.flush()
+
+            for component_value_type, value_type_info in value_types:
+                self.__session.add(node_data.ComponentSettings(
+                    component_value_type.id, config_update.id, value_type_info['measuring_unit'],
+                    value_type_info['measurement_period'], created_at))
+
             self.__session.commit()
-            # get component id from database (each component is unique by 2 columns)...
-            # it'll be required for component_value_type
-            component_with_id = self.__session.query(node_data.Component) \
-                .filter(and_(node_data.Component.node_id == node_id,
-                             node_data.Component.id_used == id_used)).first()
-
-            for value_type_info in component_info['value_types']:
-                value_type = value_type_info['value_type']
-                measuring_unit = value_type_info['measuring_unit']
-                measurement_period = value_type_info['measurement_period']
-                # now create value type...
-                component_value_type = node_data.ComponentValueType(
-                    component_with_id.id, value_type, created_at, created_at)
-                self.__session.add(component_value_type)
-                self.__session.commit()
+        except SQLAlchemyError:
+            self.__session.rollback()
+            raise
 
-                # now get component_value_type id from database (because it's required for component
-                # setingss) - again, 2 unique columns
-                component_value_type_with_id = self.__session.query(node_data.ComponentValueType)\
-                    .filter(and_(node_data.ComponentValueType.component_id == component_with_id.id,
-                                 node_data.ComponentValueType.value_type == value_type)).first()
-                # now create component settings
-                component_settings = node_data.ComponentSettings(
-                    component_value_type_with_id.id, config_update_with_id.id,
-                    measuring_unit, measurement_period, created_at)
-                self.__session.add(component_settings)
-                self.__session.commit()
+    def get_node_routes(self, node_id):
+        """
+        Finds newest component settings for each node's component value type with one
+        query. It's used for routing incoming measurements to their settings without
+        touching database again.
+        {(id_used_1, C): component_settings_id_1,
+         (id_used_2, %): component_settings_id_2
+         }
+        :param node_id:
+        :return:
+        """
+
+        return self.__get_routes(node_id).get(node_id, dict())
+
+    def get_all_node_routes(self):
+        """
+        Finds newest component settings of all registered nodes with two queries (one for
+        nodes and one for all of their settings), so client can load its routes at startup
+        without query for each node. Nodes without any settings have empty routes.
+        {node_id_1: {(id_used_1, C): component_settings_id_1},
+         node_id_2: {}
+         }
+        :return:
+        """
+
+        routes = self.__get_routes()
+
+        for node_id, in self.__session.query(node_data.Node.id).all():
+            routes.setdefault(node_id, dict())
+
+        return routes
+
+    def __get_routes(self, node_id=None):
+        # node_id -> routes, for one node or for all of them (if node_id is None)
+        newest_settings = {}
+
+        # rows are ordered from oldest to newest config update, so newer settings override
+        # older ones for same value type
+        query = self.__session.query(node_data.ComponentValueType.id, node_data.Component.node_id,
+                                     node_data.Component.id_used, node_data.ComponentSettings.measuring_unit,
+                                     node_data.ComponentSettings.id)\
+            .join(node_data.Component, node_data.Component.id == node_data.ComponentValueType.component_id)\
+            .join(node_data.ComponentSettings,
+                  node_data.ComponentSettings.component_value_type_id == node_data.ComponentValueType.id)\
+            .join(node_data.ConfigUpdate, node_data.ConfigUpdate.id == node_data.ComponentSettings.config_update_id)
+
+        if node_id is not None:
+            query = query.filter(node_data.Component.node_id == node_id)
+
+        rows = query.order_by(node_data.ConfigUpdate.updated_at, node_data.ComponentSettings.id).all()
+
+        for component_value_type_id, row_node_id, id_used, measuring_unit, component_settings_id in rows:
+            newest_settings[component_value_type_id] = (row_node_id, id_used, measuring_unit, component_settings_id)
+
+        routes = {}
+
+        for row_node_id, id_used, measuring_unit, component_settings_id in newest_settings.values():
+            routes.setdefault(row_node_id, dict())[(id_used, measuring_unit)] = component_settings_id
+
+        return routes
 
     def new_data(self, node_id, component_id_used, measuring_unit, data):
         # measured_at will for now be the same
         created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        node = self.__session.query(node_data.Node).filter(node_data.Node.id == node_id).first()
+        component_settings_id = self.get_node_routes(node_id).get((component_id_used, measuring_unit))
 
-        for component in node.components:
-            if component.id_used == component_id_used:
-                for component_value_type in component.component_value_types:
-                    for component_settings in component_value_type.component_settingss:
-                        if component_settings.measuring_unit == measuring_unit:
-                            measurement = node_data.Measurement(
-                                component_settings.id, data, created_at, created_at)
-                            self.__session.add(measurement)
-                            self.__session.commit()
-                            # "exit all loops"
-                            return
-
-    def get_data(self, to_collector=False, only_not_confirmed=True, limit=None):
-        result = {}
-        result2 = []
-        nodes = self.__session.query(node_data.Node).all()
+        if component_settings_id is None:
+            return False
 
-        for node in nodes:
-            if to_collector:
-                for component in node.components:
-                    for component_value_type in component.component_value_types:
-                        # retrieve all config updates (even older one)
-                        for component_settings in component_value_type.component_settingss:
-                            # retrieve measurements
-                            for measurement in component_settings.measurements:
-                                result2.append({
-                                    'node_id': node.id,
-                                    'value': measurement.value,
-                                    'measurement_type': component_value_type.value_type,
-                                    'measuring_unit': component_settings.measuring_unit,
-                                    'measured_at': measurement.measured_at
-                                })
+        return self.new_data_batch([(component_settings_id, data, created_at)])
+
+    def new_data_batch(self, measurements):
+        """
+        Inserts many measurements in one transaction (one commit for whole batch).
+
+        :param measurements:    list of tuples (component_settings_id, value, measured_at)
+        :return:                True if batch is saved, else False
+        """
+
+        created_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        values = list()
+
+        for component_settings_id, value, measured_at in measurements:
+            values.append({
+                'component_settings_id':    component_settings_id,
+                'value':                    value,
+                'measured_at':              measured_at,
+                'created_at':               created_at
+            })
+
+        try:
+            if len(values) > 0:
+                # executemany insert, it doesn't create ORM objects
+                self.__session.execute(node_data.Measurement.__table__.insert(), values)
+                # rollups are updated in same transaction, so they always match measurements
+                self.__update_rollups(measurements)
+            self.__session.commit()
+        except SQLAlchemyError:
+            self.__session.rollback()
+
+            return False
+
+        return True
+
+    def get_data(self, to_collector=False, only_not_confirmed=True, limit=None, since=None, after_id=None):
+        """
+        Generator that yields measurements for collector, one by one, ordered by measurement
+        id. It's read from database in chunks, so whole history is never in memory. Next
+        page can be requested with after_id set to id of last received measurement (keyset
+        pagination).
+
+        :param to_collector:        only collector is supported, else nothing is yielded
+        :param only_not_confirmed:  skip measurements which collector already confirmed
+        :param limit:               max number of measurements
+        :param since:               only measurements measured at or after given datetime
+                                    string ("%Y-%m-%d %H:%M:%S")
+        :param after_id:            only measurements with id bigger than given one
+        :return:
+        """
+
+        if not to_collector:
+            return
+
+        query = self.__session.query(node_data.Measurement.id, node_data.Component.node_id,
+                                     node_data.Measurement.value, node_data.ComponentValueType.value_type,
+                                     node_data.ComponentSettings.measuring_unit, node_data.Measurement.measured_at)\
+            .join(node_data.ComponentSettings,
+                  node_data.ComponentSettings.id == node_data.Measurement.component_settings_id)\
+            .join(node_data.ComponentValueType,
+                  node_data.ComponentValueType.id == node_data.ComponentSettings.component_value_type_id)\
+            .join(node_data.Component, node_data.Component.id == node_data.ComponentValueType.component_id)
+
+        if only_not_confirmed:
+            query = query.filter(node_data.Measurement.collector_delivery_confirmed == False)
+        if since is not None:
+            query = query.filter(node_data.Measurement.measured_at >= since)
+        if after_id is not None:
+            query = query.filter(node_data.Measurement.id > after_id)
+
+        if since is not None and not only_not_confirmed and after_id is None:
+            # SQLite would rather read whole table in id order than search measured_at index and
+            # sort found rows, so ordering by expression (id + 0) makes it use index for since
+            query = query.order_by(node_data.Measurement.id + 0)
+        else:
+            query = query.order_by(node_data.Measurement.id)
+
+        if limit is not None:
+            query = query.limit(limit)
+
+        for measurement_id, node_id, value, value_type, measuring_unit, measured_at in query.yield_per(1000):
+            yield {
+                'id': measurement_id,
+                'node_id': node_id,
+                'value': value,
+                'measurement_type': value_type,
+                'measuring_unit': measuring_unit,
+                'measured_at': measured_at
+            }
+
+    def confirm_data(self, up_to_id, after_id=None):
+        """
+        Marks measurements delivered to collector as confirmed (with one update), so they
+        aren't sent again.
+
+        :param up_to_id:    id of last delivered measurement
+        :param after_id:    if given, only measurements with bigger id are confirmed
+        :return:            number of confirmed measurements
+        """
+
+        measurement = node_data.Measurement.__table__
+        condition = and_(measurement.c.collector_delivery_confirmed == False, measurement.c.id <= up_to_id)
+
+        if after_id is not None:
+            condition = and_(condition, measurement.c.id > after_id)
+
+        # it's only write of web server, so it has its own session if handler is read only
+        result = self.__write_session.execute(
+            measurement.update().where(condition).values(collector_delivery_confirmed=True))
+        self.__write_session.commit()
+
+        return result.rowcount
+
+    def compact_data(self, compact_after, pack_after=None, only_confirmed=True, batch_size=COMPACT_BATCH_SIZE):
+        """
+        Moves measurements older than compact_after seconds from measurement table to compact
+        sample table and packs samples older than pack_after seconds into blocks (whole
+        blocks only). Work is done in batches, each one in its own transaction, so database
+        isn't locked for long and measurements can still be written meanwhile. Measurements
+        moved to samples aren't returned by get_data anymore, so by default only ones that
+        collector already confirmed are moved.
+
+        :param compact_after:   age of measurement (seconds) after which it's compacted
+        :param pack_after:      age of sample (seconds) after which it's packed, None for no packing
+        :param only_confirmed:  compact only measurements confirmed by collector
+        :param batch_size:      max number of measurements moved in one transaction
+        :return:                (number of compacted measurements, number of packed samples)
+        """
+
+        now = time.time()
+        measurement = node_data.Measurement.__table__
+        sample = node_data.Sample.__table__
+        condition = measurement.c.measured_at < datetime.fromtimestamp(now - compact_after).strftime(DATETIME_FORMAT)
+        compacted = 0
+
+        if only_confirmed:
+            condition = and_(condition, measurement.c.collector_delivery_confirmed == True)
+
+        # measured_at string (local time) is converted to epoch seconds by SQLite
+        to_sample = select(measurement.c.component_settings_id,
+                           cast(func.strftime('%s', measurement.c.measured_at, 'utc'), Integer),
+                           measurement.c.value)
+
+        try:
+            while True:
+                # batch ends with measured_at of batch_size-th measurement (found with index)
+                last_measured_at = self.__session.execute(
+                    select(measurement.c.measured_at).where(condition).order_by(measurement.c.measured_at)
+                    .offset(batch_size - 1).limit(1)).scalar()
+                batch_condition = condition
+
+                if last_measured_at is not None:
+                    batch_condition = and_(condition, measurement.c.measured_at <= last_measured_at)
+
+                # samples are unique by sensor and second, so later measurement in same second wins
+                self.__session.execute(
+                    sample.insert().prefix_with('OR REPLACE')
+                    .from_select(['component_settings_id', 'ts', 'value'], to_sample.where(batch_condition)))
+                moved = self.__session.execute(measurement.delete().where(batch_condition)).rowcount
+                self.__session.commit()
+                compacted += moved
+
+                if last_measured_at is None or moved == 0:
+                    break
+
+            packed = 0
+
+            if pack_after is not None:
+                pack_before = node_data.SampleBlock.get_start_ts(int(now - pack_after))
+
+                for component_settings_id, in self.__session.query(node_data.ComponentSettings.id).all():
+                    packed += self.__pack_samples(component_settings_id, pack_before)
+        except SQLAlchemyError:
+            self.__session.rollback()
+            raise
+
+        return compacted, packed
+
+    def __pack_samples(self, component_settings_id, pack_before):
+        # packs sensor's samples block by block (one transaction per block), empty blocks are
+        # skipped by looking for next sample
+        sample = node_data.Sample.__table__
+        packed = 0
+        start_ts = self.__session.execute(
+            select(func.min(sample.c.ts))
+            .where(and_(sample.c.component_settings_id == component_settings_id, sample.c.ts < pack_before))).scalar()
+
+        while start_ts is not None:
+            start_ts = node_data.SampleBlock.get_start_ts(start_ts)
+            end_ts = start_ts + node_data.SampleBlock.BLOCK_SIZE
+            block_condition = and_(sample.c.component_settings_id == component_settings_id,
+                                   sample.c.ts >= start_ts, sample.c.ts < end_ts)
+            samples = dict(self.__session.execute(
+                select(sample.c.ts, sample.c.value).where(block_condition)).all())
+            block = self.__session.get(node_data.SampleBlock, (component_settings_id, start_ts))
+
+            if block is None:
+                block = node_data.SampleBlock(component_settings_id, start_ts, sorted(samples.items()))
+                self.__session.add(block)
+            else:
+                # block already exists (samples came late), so samples are merged into it
+                merged = dict(node_data.SampleBlock.unpack(block.start_ts, block.count, block.data))
+                merged.update(samples)
+                block.count = len(merged)
+                block.data = node_data.SampleBlock.pack(start_ts, sorted(merged.items()))
+
+            self.__session.execute(sample.delete().where(block_condition))
+            self.__session.commit()
+            packed += len(samples)
+            start_ts = self.__session.execute(
+                select(func.min(sample.c.ts))
+                .where(and_(sample.c.component_settings_id == component_settings_id,
+                            sample.c.ts >= end_ts, sample.c.ts < pack_before))).scalar()
+
+        return packed
+
+    def get_samples(self, component_settings_id, from_ts=None, to_ts=None):
+        """
+        Returns sensor's values in time range, from all storages (packed blocks, compact
+        samples and measurements which aren't compacted yet).
+
+        :param component_settings_id:
+        :param from_ts:                 start of range, seconds since epoch (included)
+        :param to_ts:                   end of range, seconds since epoch (excluded)
+        :return:                        list of (ts, value) ordered by ts
+        """
+
+        block = node_data.SampleBlock
+        sample = node_data.Sample
+        measurement = node_data.Measurement
+        block_query = self.__session.query(block.start_ts, block.count, block.data)\
+            .filter(block.component_settings_id == component_settings_id)
+        sample_query = self.__session.query(sample.ts, sample.value)\
+            .filter(sample.component_settings_id == component_settings_id)
+        # measured_at is converted to epoch seconds by SQLite (same as in compact_data)
+        measurement_query = self.__session.query(cast(func.strftime('%s', measurement.measured_at, 'utc'), Integer),
+                                                 measurement.value)\
+            .filter(measurement.component_settings_id == component_settings_id)
+
+        if from_ts is not None:
+            block_query = block_query.filter(block.start_ts > from_ts - block.BLOCK_SIZE)
+            sample_query = sample_query.filter(sample.ts >= from_ts)
+            measurement_query = measurement_query.filter(
+                measurement.measured_at >= datetime.fromtimestamp(from_ts).strftime(DATETIME_FORMAT))
+        if to_ts is not None:
+            block_query = block_query.filter(block.start_ts < to_ts)
+            sample_query = sample_query.filter(sample.ts < to_ts)
+            measurement_query = measurement_query.filter(
+                measurement.measured_at < datetime.fromtimestamp(to_ts).strftime(DATETIME_FORMAT))
+
+        samples = list()
+
+        for start_ts, count, data in block_query.order_by(block.start_ts):
+            for ts, value in block.unpack(start_ts, count, data):
+                if (from_ts is None or ts >= from_ts) and (to_ts is None or ts < to_ts):
+                    samples.append((ts, value))
+
+        samples.extend(sample_query.order_by(sample.ts).all())
+
+        samples.extend(measurement_query.order_by(measurement.measured_at).all())
+
+        # storages can overlap (late measurements, not confirmed ones which aren't compacted)
+        samples.sort(key=lambda ts_value: ts_value[0])
+
+        return samples
+
+    def get_rollups(self, component_settings_id, from_ts, to_ts, max_points):
+        """
+        Returns sensor's values in time range as at most max_points points. Resolution is
+        only as coarse as budget requires: raw values if expected number of them (by sensor's
+        measurement period) fits, else aggregates of finest resolution that fits (day if
+        none of them does).
+
+        :param component_settings_id:
+        :param from_ts:                 start of range, seconds since epoch
+        :param to_ts:                   end of range, seconds since epoch (excluded)
+        :param max_points:              max number of points
+        :return:                        (resolution, points), resolution is 0 for raw values and
+                                        points are list of (ts, min, max, avg, count)
+        """
+
+        rollup = node_data.Rollup
+        span = max(to_ts - from_ts, 1)
+        measurement_period = self.__session.query(node_data.ComponentSettings.measurement_period)\
+            .filter(node_data.ComponentSettings.id == component_settings_id).scalar()
+
+        if measurement_period is not None and int(measurement_period) > 0 and \
+                span / int(measurement_period) <= max_points:
+            return 0, [(ts, value, value, value, 1)
+                       for ts, value in self.get_samples(component_settings_id, from_ts, to_ts)]
+
+        resolution = rollup.RESOLUTIONS[-1]
+
+        for rollup_resolution in rollup.RESOLUTIONS:
+            if span / rollup_resolution <= max_points:
+                resolution = rollup_resolution
+                break
+
+        return resolution, self.__get_rollup_points(component_settings_id, resolution, from_ts, to_ts)
+
+    def __get_rollup_points(self, component_settings_id, resolution, from_ts=None, to_ts=None):
+        # rollups of one resolution as (ts, min, max, avg, count), bucket in which range starts
+        # is included whole
+        rollup = node_data.Rollup
+        query = self.__session.query(rollup.bucket_ts, rollup.count, rollup.sum, rollup.min, rollup.max)\
+            .filter(rollup.component_settings_id == component_settings_id, rollup.resolution == resolution)
+
+        if from_ts is not None:
+            query = query.filter(rollup.bucket_ts >= from_ts - from_ts % resolution)
+        if to_ts is not None:
+            query = query.filter(rollup.bucket_ts < to_ts)
+
+        return [(bucket_ts, min_value, max_value, sum_value / count, count)
+                for bucket_ts, count, sum_value, min_value, max_value in query.order_by(rollup.bucket_ts)]
+
+    def find_series(self, node_id, component_id_used=None, value_type=None, measuring_unit=None):
+        """
+        Finds sensor's series (component settings) which match given filters, with one query
+        (unique indexes of component and value type are used for node, component and value
+        type).
+
+        :param node_id:
+        :param component_id_used:   component's id used on node (optional)
+        :param value_type:          optional
+        :param measuring_unit:      optional
+        :return:                    list of dicts with series' description, ordered by component,
+                                    value type and settings
+        """
+
+        query = self.__session.query(node_data.Component.id_used, node_data.ComponentValueType.value_type,
+                                     node_data.ComponentSettings.id, node_data.ComponentSettings.measuring_unit,
+                                     node_data.ComponentSettings.measurement_period)\
+            .join(node_data.ComponentValueType, node_data.ComponentValueType.component_id == node_data.Component.id)\
+            .join(node_data.ComponentSettings,
+                  node_data.ComponentSettings.component_value_type_id == node_data.ComponentValueType.id)\
+            .filter(node_data.Component.node_id == node_id)
+
+        if component_id_used is not None:
+            query = query.filter(node_data.Component.id_used == component_id_used)
+        if value_type is not None:
+            query = query.filter(node_data.ComponentValueType.value_type == value_type)
+        if measuring_unit is not None:
+            query = query.filter(node_data.ComponentSettings.measuring_unit == measuring_unit)
+
+        query = query.order_by(node_data.Component.id_used, node_data.ComponentValueType.value_type,
+                               node_data.ComponentSettings.id)
+
+        return [
+            {
+                'node_id': node_id,
+                'component_id_used': id_used,
+                'value_type': series_value_type,
+                'measuring_unit': series_measuring_unit,
+                'measurement_period': measurement_period,
+                'component_settings_id': component_settings_id
+            } for id_used, series_value_type, component_settings_id, series_measuring_unit, measurement_period in query
+        ]
+
+    def get_series(self, node_id, component_id_used=None, value_type=None, measuring_unit=None, from_ts=None,
+                   to_ts=None, limit=None, step=None):
+        """
+        Returns values of node's series (one for each component settings which matches
+        filters) in time range, as columnar arrays instead of dict per value. Values are
+        read by range scans of primary keys and indexes of all storages.
+
+        With step, values are averaged in buckets of step seconds (rollups are read if step
+        is one of their resolutions). With limit (and without step), series has at most limit
+        points, resolution is chosen like in get_rollups.
+
+        :param node_id:
+        :param component_id_used:   component's id used on node (optional)
+        :param value_type:          optional
+        :param measuring_unit:      optional
+        :param from_ts:             start of range, seconds since epoch (included)
+        :param to_ts:               end of range, seconds since epoch (excluded)
+        :param limit:               max number of points in each series
+        :param step:                seconds in one bucket
+        :return:                    list of series' dicts, each has 'timestamps' and 'values'
+                                    (and 'min', 'max' and 'count' if values are aggregated)
+        """
+
+        result = list()
+
+        for series in self.find_series(node_id, component_id_used, value_type, measuring_unit):
+            component_settings_id = series['component_settings_id']
+
+            if step is not None:
+                resolution = step
+
+                if step in node_data.Rollup.RESOLUTIONS:
+                    points = self.__get_rollup_points(component_settings_id, step, from_ts, to_ts)
+                else:
+                    points = DBHandler.__decimate(self.get_samples(component_settings_id, from_ts, to_ts), step)
+            elif limit is not None:
+                series_from_ts, series_to_ts = from_ts, to_ts
+
+                if series_from_ts is None or series_to_ts is None:
+                    time_range = self.__get_time_range(component_settings_id)
+
+                    if time_range is None:
+                        time_range = (0, 0)
+                    if series_from_ts is None:
+                        series_from_ts = time_range[0]
+                    if series_to_ts is None:
+                        series_to_ts = time_range[1] + 1
+
+                resolution, points = self.get_rollups(component_settings_id, series_from_ts, series_to_ts, limit)
+
+                if len(points) > limit:
+                    # even day rollups don't fit (or there are more values than period says)
+                    points = points[::-(-len(points) // limit)]
             else:
-                return result2
-
-        return result2
-        #
-        #     result[node.id] = dict()
-        #
-        #     for component in node.components:
-        #         # now it's agreed with Collector site that it retrieves only one measurement
-        #         # type per node, but in reality, node can have multiple sensors with same
-        #         # measurement type...
-        #         if to_collector:
-        #             for component_value_type in component.component_value_types:
-        #                 # if there are more components with same measurement type, append only
-        #                 # first time it appears, ignore other appearances of same measurement
-        #                 # type...
-        #                 if component_value_type.value_type not in result[node.id].keys():
-        #                     result[node.id][component_value_type.value_type] = dict()
-        #                     # retrieve all config updates (even older one)
-        #                     for component_settings in component_value_type.component_settingss:
-        #                         result[node.id][component_value_type.value_type]['measuring_unit'] = \
-        #                             component_settings.measuring_unit
-        #                         result[node.id][component_value_type.value_type]['measurement_period'] = \
-        #                             component_settings.measurement_period
-        #                         result[node.id][component_value_type.value_type]['data'] = list()
-        #
-        #                         # retrieve measurements
-        #                         for measurement in component_settings.measurements:
-        #                             result[node.id][component_value_type.value_type]['data'].append(dict())
-        #                             result[node.id][component_value_type.value_type]['data'][-1]['value'] = \
-        #                                 measurement.value
-        #                             result[node.id][component_value_type.value_type]['data'][-1]['measured_at'] = \
-        #                                 measurement.measured_at
-        #         else:
-        #             pass
-        #
-        # return result
+                resolution = 0
+                points = [(ts, value, value, value, 1)
+                          for ts, value in self.get_samples(component_settings_id, from_ts, to_ts)]
+
+            series['resolution'] = resolution
+            series['timestamps'] = [point[0] for point in points]
+            series['values'] = [point[3] for point in points]
+
+            if resolution > 0:
+                series['min'] = [point[1] for point in points]
+                series['max'] = [point[2] for point in points]
+                series['count'] = [point[4] for point in points]
+
+            result.append(series)
+
+        return result
+
+    @staticmethod
+    def __decimate(samples, step):
+        # samples are (ts, value) ordered by ts, returns (ts, min, max, avg, count) of each bucket
+        points = list()
+
+        for ts, value in samples:
+            bucket_ts = ts - ts % step
+
+            if len(points) > 0 and points[-1][0] == bucket_ts:
+                point = points[-1]
+                point[1] = min(point[1], value)
+                point[2] = max(point[2], value)
+                point[3] += value
+                point[4] += 1
+            else:
+                points.append([bucket_ts, value, value, value, 1])
+
+        # sums are turned to averages
+        return [(bucket_ts, min_value, max_value, sum_value / count, count)
+                for bucket_ts, min_value, max_value, sum_value, count in points]
+
+    def rebuild_rollups(self):
+        """
+        Computes all rollups again from stored values (from all storages), for databases
+        which have values from before rollups existed. Each sensor is rebuilt in its own
+        transaction, reading its values week by week.
+
+        :return:    number of rollup buckets
+        """
+
+        rollup = node_data.Rollup.__table__
+        rebuilt = 0
+
+        try:
+            for component_settings_id, in self.__session.query(node_data.ComponentSettings.id).all():
+                buckets = dict()
+                time_range = self.__get_time_range(component_settings_id)
+
+                if time_range is not None:
+                    from_ts, to_ts = time_range
+
+                    while from_ts <= to_ts:
+                        samples = self.get_samples(component_settings_id, from_ts, from_ts + REBUILD_WINDOW)
+                        DBHandler.__aggregate([(component_settings_id, ts, value) for ts, value in samples], buckets)
+                        from_ts += REBUILD_WINDOW
+
+                self.__session.execute(rollup.delete().where(rollup.c.component_settings_id == component_settings_id))
+                self.__save_rollups(buckets)
+                self.__session.commit()
+                rebuilt += len(buckets)
+        except SQLAlchemyError:
+            self.__session.rollback()
+            raise
+
+        return rebuilt
+
+    def __get_time_range(self, component_settings_id):
+        # (first ts, last ts) of sensor's values in all storages, None if it has no values
+        block = node_data.SampleBlock
+        sample = node_data.Sample
+        measurement = node_data.Measurement
+        timestamps = list()
+
+        first_block_ts, last_block_ts = self.__session.query(func.min(block.start_ts), func.max(block.start_ts))\
+            .filter(block.component_settings_id == component_settings_id).one()
+        first_sample_ts, last_sample_ts = self.__session.query(func.min(sample.ts), func.max(sample.ts))\
+            .filter(sample.component_settings_id == component_settings_id).one()
+        first_measured_at, last_measured_at = self.__session.query(func.min(measurement.measured_at),
+                                                                   func.max(measurement.measured_at))\
+            .filter(measurement.component_settings_id == component_settings_id).one()
+
+        if first_block_ts is not None:
+            timestamps.extend([first_block_ts, last_block_ts + block.BLOCK_SIZE - 1])
+        if first_sample_ts is not None:
+            timestamps.extend([first_sample_ts, last_sample_ts])
+        if first_measured_at is not None:
+            timestamps.extend([int(datetime.strptime(first_measured_at, DATETIME_FORMAT).timestamp()),
+                               int(datetime.strptime(last_measured_at, DATETIME_FORMAT).timestamp())])
+
+        if len(timestamps) == 0:
+            return None
+
+        return min(timestamps), max(timestamps)
+
+    def __update_rollups(self, measurements):
+        # measurements are (component_settings_id, value, measured_at), and lot of them in same
+        # batch are measured in same second, so each measured_at is converted only once
+        timestamps = dict()
+        samples = list()
+
+        for component_settings_id, value, measured_at in measurements:
+            ts = timestamps.get(measured_at)
+
+            if ts is None:
+                ts = int(datetime.strptime(measured_at, DATETIME_FORMAT).timestamp())
+                timestamps[measured_at] = ts
+
+            samples.append((component_settings_id, ts, value))
+
+        self.__save_rollups(DBHandler.__aggregate(samples))
+
+    @staticmethod
+    def __aggregate(samples, buckets=None):
+        """
+        :param samples: list of (component_settings_id, ts, value)
+        :param buckets: dict to which samples are added (new one if None)
+        :return:        dict {(component_settings_id, resolution, bucket_ts): [count, sum, min, max]}
+        """
+
+        if buckets is None:
+            buckets = dict()
+
+        for component_settings_id, ts, value in samples:
+            for resolution in node_data.Rollup.RESOLUTIONS:
+                key = (component_settings_id, resolution, ts - ts % resolution)
+                bucket = buckets.get(key)
+
+                if bucket is None:
+                    buckets[key] = [1, value, value, value]
+                else:
+                    bucket[0] += 1
+                    bucket[1] += value
+                    if value < bucket[2]:
+                        bucket[2] = value
+                    if value > bucket[3]:
+                        bucket[3] = value
+
+        return buckets
+
+    def __save_rollups(self, buckets):
+        # adds buckets to existing ones (upsert), so buckets don't have to be read first
+        if len(buckets) == 0:
+            return
+
+        rollup = node_data.Rollup.__table__
+        statement = sqlite_insert(rollup)
+        statement = statement.on_conflict_do_update(
+            index_elements=[rollup.c.component_settings_id, rollup.c.resolution, rollup.c.bucket_ts],
+            set_={
+                'count':    rollup.c.count + statement.excluded['count'],
+                'sum':      rollup.c.sum + statement.excluded['sum'],
+                'min':      func.min(rollup.c.min, statement.excluded['min']),
+                'max':      func.max(rollup.c.max, statement.excluded['max'])
+            })
+
+        self.__session.execute(statement, [
+            {
+                'component_settings_id':    component_settings_id,
+                'resolution':               resolution,
+                'bucket_ts':                bucket_ts,
+                'count':                    count,
+                'sum':                      sum_value,
+                'min':                      min_value,
+                'max':                      max_value
+            } for (component_settings_id, resolution, bucket_ts), (count, sum_value, min_value, max_value)
+            in buckets.items()])
+
+    def prune_data(self, raw_retention=None, rollup_retention=None, raw_retention_per_type=None,
+                   rollup_retention_per_type=None, only_confirmed=True, batch_size=PRUNE_BATCH_SIZE):
+        """
+        Deletes values older than their retention, sensor by sensor and in small batches
+        (each one in its own transaction, with short pause between them), so MQTT client can
+        write measurements meanwhile. Retention of value type overrides global one, and
+        sensor without retention keeps its values forever.
+
+        :param raw_retention:               seconds raw values are kept (all storages)
+        :param rollup_retention:            seconds rollups are kept
+        :param raw_retention_per_type:      dict {value_type: seconds}
+        :param rollup_retention_per_type:   dict {value_type: seconds}
+        :param only_confirmed:              delete only measurements which collector confirmed
+        :param batch_size:                  max number of rows deleted in one transaction
+        :return:                            (number of deleted raw values, number of deleted rollups)
+        """
+
+        now = time.time()
+        deleted_raw = 0
+        deleted_rollups = 0
+        raw_retention_per_type = raw_retention_per_type or dict()
+        rollup_retention_per_type = rollup_retention_per_type or dict()
+
+        try:
+            rows = self.__session.query(node_data.ComponentSettings.id, node_data.ComponentValueType.value_type)\
+                .join(node_data.ComponentValueType,
+                      node_data.ComponentValueType.id == node_data.ComponentSettings.component_value_type_id).all()
+
+            for component_settings_id, value_type in rows:
+                # config values are lowercase
+                retention = raw_retention_per_type.get(value_type.lower(), raw_retention)
+
+                if retention is not None:
+                    deleted_raw += self.__prune_raw(component_settings_id, int(now - retention), only_confirmed,
+                                                    batch_size)
+
+                retention = rollup_retention_per_type.get(value_type.lower(), rollup_retention)
+
+                if retention is not None:
+                    deleted_rollups += self.__prune_rollups(component_settings_id, int(now - retention), batch_size)
+        except SQLAlchemyError:
+            self.__session.rollback()
+            raise
+
+        self.incremental_vacuum()
+
+        return deleted_raw, deleted_rollups
+
+    def __prune_raw(self, component_settings_id, keep_from_ts, only_confirmed, batch_size):
+        measurement = node_data.Measurement.__table__
+        sample = node_data.Sample.__table__
+        block = node_data.SampleBlock.__table__
+        condition = and_(measurement.c.component_settings_id == component_settings_id,
+                         measurement.c.measured_at < datetime.fromtimestamp(keep_from_ts).strftime(DATETIME_FORMAT))
+
+        if only_confirmed:
+            condition = and_(condition, measurement.c.collector_delivery_confirmed == True)
+
+        deleted = self.__delete_in_batches(
+            measurement, measurement.c.id.in_(select(measurement.c.id).where(condition).limit(batch_size)))
+        deleted += self.__delete_in_batches(sample, and_(
+            sample.c.component_settings_id == component_settings_id,
+            sample.c.ts.in_(select(sample.c.ts).where(and_(sample.c.component_settings_id == component_settings_id,
+                                                           sample.c.ts < keep_from_ts)).limit(batch_size))))
+        # only blocks which are whole older than retention (there are only few of them per sensor)
+        deleted += self.__delete_in_batches(block, and_(
+            block.c.component_settings_id == component_settings_id,
+            block.c.start_ts <= keep_from_ts - node_data.SampleBlock.BLOCK_SIZE))
+
+        return deleted
+
+    def __prune_rollups(self, component_settings_id, keep_from_ts, batch_size):
+        rollup = node_data.Rollup.__table__
+        deleted = 0
+
+        for resolution in node_data.Rollup.RESOLUTIONS:
+            # only buckets which are whole older than retention
+            condition = and_(rollup.c.component_settings_id == component_settings_id, rollup.c.resolution == resolution,
+                             rollup.c.bucket_ts <= keep_from_ts - resolution)
+            deleted += self.__delete_in_batches(rollup, and_(
+                rollup.c.component_settings_id == component_settings_id, rollup.c.resolution == resolution,
+                rollup.c.bucket_ts.in_(select(rollup.c.bucket_ts).where(condition).limit(batch_size))))
+
+        return deleted
+
+    def __delete_in_batches(self, table, batch_condition):
+        # batch_condition selects (limited) batch of rows, it's repeated until nothing is deleted
+        deleted = 0
+
+        while True:
+            batch_deleted = self.__session.execute(table.delete().where(batch_condition)).rowcount
+            self.__session.commit()
+            deleted += batch_deleted
+
+            if batch_deleted == 0:
+                return deleted
+
+            # give other writers (MQTT client) chance to get write lock
+            time.sleep(PRUNE_BATCH_PAUSE)
+
+    def incremental_vacuum(self, pages=VACUUM_PAGES):
+        """
+        Gives free pages (of deleted rows) back to file system, few pages at a time so it never
+        locks database for long. It works only if database's auto_vacuum is incremental.
+
+        :param pages:   max number of pages freed in one step
+        :return:        number of freed pages
+        """
+
+        freed = 0
+
+        with self.__engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            # 2 is incremental
+            if connection.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+                return freed
+
+            free_pages = connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+
+            while free_pages > 0:
+                # pragma frees one page per step, but sqlite3 module's execute makes only one step,
+                # so it's run as script (which is stepped to the end)
+                connection.connection.driver_connection.executescript('PRAGMA incremental_vacuum({})'.format(pages))
+                free_pages_left = connection.exec_driver_sql('PRAGMA freelist_count').scalar()
+
+                if free_pages_left >= free_pages:
+                    break
+
+                freed += free_pages - free_pages_left
+                free_pages = free_pages_left
+                time.sleep(PRUNE_BATCH_PAUSE)
+
+            if freed > 0:
+                # in WAL mode file gets smaller after changes are moved from WAL to database file
+                # (passive checkpoint doesn't wait for readers)
+                connection.exec_driver_sql('PRAGMA wal_checkpoint(PASSIVE)')
+
+        return freed
+
+    def vacuum(self):
+        # rebuilds database file so space of deleted rows is given back to file system (it
+        # can't run in transaction)
+        with self.__engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.exec_driver_sql('VACUUM')
 
     def get_nodes(self):
         result = {
@@ -245,7 +1095,15 @@ class DBHandler:
         return result
 
     def get_node_info(self, node_id, limit_result=None):
-        # lazy load is enabled so it won't download measurements data
+        """
+        Returns node's current config with two queries, one for node and one for all of its
+        components, value types and settings (instead of lazy loading each of them).
+
+        :param node_id:
+        :param limit_result:
+        :return:
+        """
+
         node = self.__session.query(node_data.Node).filter(node_data.Node.id == node_id).first()
 
         # this shouldn't be called if node doesn't exist, but we must check if node exists
@@ -257,41 +1115,51 @@ class DBHandler:
                 'components': list()
             }
 
-            for component in node.components:
-                # append new component to node (new sensor or switch)
-                result['components'].append({
-                    'id_used': component.id_used,
-                    'type': component.type,
-                    'name': component.name,
-                    'alias': component.alias,
-                    'value_types': list()
-                })
-
-                for component_value_type in component.component_value_types:
-                    # save component's value types data to last list item, because it's "fresh"
-                    # component...
-                    result['components'][-1]['value_types'].append({
+            # outer joins keep components without value types (switches etc.), rows are ordered
+            # so that for each value type, settings with newest config come last
+            rows = self.__session.query(node_data.Component, node_data.ComponentValueType,
+                                        node_data.ComponentSettings)\
+                .outerjoin(node_data.ComponentValueType,
+                           node_data.ComponentValueType.component_id == node_data.Component.id)\
+                .outerjoin(node_data.ComponentSettings,
+                           node_data.ComponentSettings.component_value_type_id == node_data.ComponentValueType.id)\
+                .outerjoin(node_data.ConfigUpdate,
+                           node_data.ConfigUpdate.id == node_data.ComponentSettings.config_update_id)\
+                .filter(node_data.Component.node_id == node_id)\
+                .order_by(node_data.Component.id, node_data.ComponentValueType.id,
+                          node_data.ConfigUpdate.created_at, node_data.ComponentSettings.id).all()
+            components = dict()
+            value_types = dict()
+
+            for component, component_value_type, component_settings in rows:
+                if component.id not in components:
+                    # append new component to node (new sensor or switch)
+                    components[component.id] = {
+                        'id_used': component.id_used,
+                        'type': component.type,
+                        'name': component.name,
+                        'alias': component.alias,
+                        'value_types': list()
+                    }
+                    result['components'].append(components[component.id])
+
+                if component_value_type is None:
+                    continue
+
+                if component_value_type.id not in value_types:
+                    value_types[component_value_type.id] = {
                         'value_type': component_value_type.value_type,
                         'alias': component_value_type.alias
-                    })
-                    # get measuring unit and measurement period with newest config
-                    newest_component_settings = None
-
-                    for component_settings in component_value_type.component_settingss:
-                        if newest_component_settings is not None:
-                            if component_settings.config_update.created_at > \
-                                    newest_component_settings.config_update.created_at:
-                                newest_component_settings = component_settings
-                        else:
-                            newest_component_settings = component_settings
+                    }
+                    components[component.id]['value_types'].append(value_types[component_value_type.id])
 
-                    # as we have newest config now, append it to value_types settings...
-                    result['components'][-1]['value_types'][-1]['measuring_unit'] = \
-                        newest_component_settings.measuring_unit
-                    result['components'][-1]['value_types'][-1]['measurement_period'] = \
-                        newest_component_settings.measurement_period
-                    result['components'][-1]['value_types'][-1]['settings_valid_from'] = \
-                        newest_component_settings.created_at
+                if component_settings is not None:
+                    # newer settings override older ones, so it ends up with newest config
+                    value_types[component_value_type.id]['measuring_unit'] = component_settings.measuring_unit
+                    value_types[component_value_type.id]['measurement_period'] = \
+                        component_settings.measurement_period
+                    value_types[component_value_type.id]['settings_valid_from'] = component_settings.created_at
+                    value_types[component_value_type.id]['component_settings_id'] = component_settings.id
 
             return True, result
 
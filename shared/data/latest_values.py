@@ -0,0 +1,92 @@
+import struct
+
+from shared.data.shared_records import SharedRecords
+from shared.utils.partition import get_partition_path
+
+
+class LatestValues(SharedRecords):
+    """
+    Newest value of each sensor (component settings), written by MQTT client and read by web
+    server, so newest values are shared between processes without database (see
+    SharedRecords).
+
+    record:     component_settings_id (int32), ts (int64, seconds since epoch), value (double)
+    """
+
+    __instance = None
+    MAGIC = b'LV01'
+    RECORD = struct.Struct('<iqd')
+    DEFAULT_CAPACITY = 1024
+
+    @staticmethod
+    def init(path, writable=False, capacity=DEFAULT_CAPACITY):
+        LatestValues.__instance = LatestValues(path, writable, capacity)
+
+    @staticmethod
+    def get_instance():
+        return LatestValues.__instance
+
+    def __init__(self, path, writable=False, capacity=DEFAULT_CAPACITY):
+        """
+        :param path:        path to file (writer creates it if it doesn't exist)
+        :param writable:    True for writer (only one process can be writer)
+        :param capacity:    max number of sensors (used only when writer creates file)
+        """
+
+        super().__init__(path, writable, capacity)
+
+    def set(self, component_settings_id, value, ts):
+        """
+        Saves sensor's newest value (writer only). If file is full, new sensors are ignored.
+
+        :return:    True if value is saved
+        """
+
+        slot = self._get_slot(component_settings_id)
+
+        if slot is None:
+            return False
+
+        with self._changing():
+            self._write_record(slot, component_settings_id, ts, value)
+
+        return True
+
+    def get(self, component_settings_id):
+        # returns (value, ts) or None if there's no value for sensor
+        return self.get_all().get(component_settings_id)
+
+    def get_all(self):
+        """
+        :return:    dict {component_settings_id: (value, ts)}, empty if file doesn't exist yet
+        """
+
+        values = self._read()
+
+        return values if values is not None else dict()
+
+    def _decode(self, extra, records):
+        return {component_settings_id: (value, ts) for component_settings_id, ts, value in records}
+
+
+class PartitionedLatestValues:
+    """
+    Reader of newest values of all partitions (each MQTT client which shares nodes writes its
+    own file, see get_partition_path), it's used same as LatestValues reader.
+    """
+
+    def __init__(self, path, partition_count):
+        self.__readers = [LatestValues(get_partition_path(path, index, partition_count))
+                          for index in range(partition_count)]
+
+    def get(self, component_settings_id):
+        return self.get_all().get(component_settings_id)
+
+    def get_all(self):
+        # sensor belongs to one node, so it's only in file of partition which owns node
+        values = dict()
+
+        for reader in self.__readers:
+            values.update(reader.get_all())
+
+        return values
@@ -1,4 +1,7 @@
-from sqlalchemy import Column, Integer, Float, String, Boolean, ForeignKey, UniqueConstraint
+import struct
+import zlib
+
+from sqlalchemy import Column, Integer, Float, String, Boolean, LargeBinary, ForeignKey, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
@@ -36,7 +39,14 @@ class Node(Base):
 
 class Component(Base):
     __tablename__ = 'component'
-    __table_args__ = {'info': {'without_rowid': True}}
+    # unique constraints are made as unique indexes, so they can be created on existing
+    # tables too (SQLite can't add constraint to existing table), and index on (node_id, ...)
+    # is used for finding node's components too
+    # THIS PRINCIPLE IS USED IN OTHER CLASSES TOO
+    __table_args__ = (
+        Index('uq_component_node_id_id_used', 'node_id', 'id_used', unique=True),
+        {'info': {'without_rowid': True}}
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     node_id = Column(String, ForeignKey('node.id'), nullable=False)
@@ -47,8 +57,6 @@ class Component(Base):
     created_at = Column(String, nullable=False)
     updated_at = Column(String, nullable=False)
 
-    UniqueConstraint(node_id, id_used)
-
     node = relationship('Node', back_populates='components')
     component_value_types = relationship('ComponentValueType', back_populates='component', cascade='delete')
 
@@ -64,7 +72,10 @@ class Component(Base):
 
 class ComponentValueType(Base):
     __tablename__ = 'component_value_type'
-    __table_args__ = {'info': {'without_rowid': True}}
+    __table_args__ = (
+        Index('uq_component_value_type_component_id_value_type', 'component_id', 'value_type', unique=True),
+        {'info': {'without_rowid': True}}
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     component_id = Column(Integer, ForeignKey('component.id'), nullable=False)
@@ -73,8 +84,6 @@ class ComponentValueType(Base):
     created_at = Column(String, nullable=False)
     updated_at = Column(String, nullable=False)
 
-    UniqueConstraint(component_id, value_type)
-
     component = relationship('Component', back_populates='component_value_types')
     component_settingss = relationship('ComponentSettings', back_populates='component_value_type', cascade='delete')
 
@@ -105,7 +114,11 @@ class ConfigUpdate(Base):
 
 class ComponentSettings(Base):
     __tablename__ = 'component_settings'
-    __table_args__ = {'info': {'without_rowid': True}}
+    __table_args__ = (
+        Index('uq_component_settings_component_value_type_id_config_update_id',
+              'component_value_type_id', 'config_update_id', unique=True),
+        {'info': {'without_rowid': True}}
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     component_value_type_id = Column(Integer, ForeignKey('component_value_type.id'), nullable=False)
@@ -114,8 +127,6 @@ class ComponentSettings(Base):
     measurement_period = Column(Integer, nullable=False)
     created_at = Column(String, nullable=False)
 
-    UniqueConstraint(component_value_type_id, config_update_id)
-
     component_value_type = relationship('ComponentValueType', back_populates='component_settingss')
     config_update = relationship('ConfigUpdate', back_populates='component_settingss')
     measurements = relationship('Measurement', back_populates='component_settings', cascade='delete')
@@ -130,13 +141,25 @@ class ComponentSettings(Base):
 
 class Measurement(Base):
     __tablename__ = 'measurement'
-    __table_args__ = {'info': {'without_rowid': True}}
+    # partial index holds only measurements that collector didn't confirm yet, so looking for
+    # new data depends on amount of new data, not on size of whole table
+    # index on (component_settings_id, measured_at) is used for measurements of one sensor in
+    # time range, and index on measured_at for time range of all measurements
+    # ids are never used again (AUTOINCREMENT), even after compaction or pruning deletes
+    # newest ones, because collector reads measurements after id it already has
+    __table_args__ = (
+        Index('ix_measurement_not_confirmed', 'id', sqlite_where=text('collector_delivery_confirmed = 0')),
+        Index('ix_measurement_component_settings_id_measured_at', 'component_settings_id', 'measured_at'),
+        Index('ix_measurement_measured_at', 'measured_at'),
+        {'info': {'without_rowid': True}, 'sqlite_autoincrement': True}
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     component_settings_id = Column(Integer, ForeignKey('component_settings.id'), nullable=False)
     value = Column(Float, nullable=False)
     measured_at = Column(String, nullable=False)
-    collector_delivery_confirmed = Column(Boolean, nullable=False, default=True)
+    # new measurements are not delivered to collector yet
+    collector_delivery_confirmed = Column(Boolean, nullable=False, default=False)
     created_at = Column(String, nullable=False)
 
     component_settings = relationship('ComponentSettings', back_populates='measurements')
@@ -146,3 +169,112 @@ class Measurement(Base):
         self.value = value
         self.measured_at = measured_at
         self.created_at = created_at
+
+
+class Sample(Base):
+    """
+    Compact storage for measurements which are moved from measurement table (compacted).
+    Timestamp is integer (seconds since epoch) and table is clustered by (component_settings_id,
+    ts) without rowid, so samples of one sensor in time range are read as one range of
+    primary key and there's no separate index to keep.
+    """
+
+    __tablename__ = 'sample'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    component_settings_id = Column(Integer, ForeignKey('component_settings.id'), primary_key=True,
+                                   autoincrement=False)
+    ts = Column(Integer, primary_key=True, autoincrement=False)
+    value = Column(Float, nullable=False)
+
+    def __init__(self, component_settings_id, ts, value):
+        self.component_settings_id = component_settings_id
+        self.ts = ts
+        self.value = value
+
+
+class SampleBlock(Base):
+    """
+    Cold samples of one sensor for one block of time (day by default), packed into one
+    row: timestamps as offsets from block start and values, compressed together.
+    """
+
+    __tablename__ = 'sample_block'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    # length of block in seconds
+    BLOCK_SIZE = 60 * 60 * 24
+
+    component_settings_id = Column(Integer, ForeignKey('component_settings.id'), primary_key=True,
+                                   autoincrement=False)
+    # start of block (aligned to BLOCK_SIZE), all block's samples are in [start_ts, start_ts + BLOCK_SIZE)
+    start_ts = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+    def __init__(self, component_settings_id, start_ts, samples):
+        self.component_settings_id = component_settings_id
+        self.start_ts = start_ts
+        self.count = len(samples)
+        self.data = SampleBlock.pack(start_ts, samples)
+
+    @staticmethod
+    def get_start_ts(ts):
+        return ts - ts % SampleBlock.BLOCK_SIZE
+
+    @staticmethod
+    def pack(start_ts, samples):
+        """
+        :param start_ts:    start of block
+        :param samples:     list of (ts, value) ordered by ts
+        :return:            bytes
+        """
+
+        # all offsets first and then all values, so similar bytes are next to each other
+        # (offsets of periodic measurements compress very well)
+        offsets = [ts - start_ts for ts, value in samples]
+        values = [value for ts, value in samples]
+
+        return zlib.compress(struct.pack('<{0}I{0}d'.format(len(samples)), *(offsets + values)))
+
+    @staticmethod
+    def unpack(start_ts, count, data):
+        # returns list of (ts, value) ordered by ts
+        unpacked = struct.unpack('<{0}I{0}d'.format(count), zlib.decompress(data))
+
+        return [(start_ts + offset, value) for offset, value in zip(unpacked[:count], unpacked[count:])]
+
+
+class Rollup(Base):
+    """
+    Aggregates (count, sum, min, max) of sensor's values for each bucket of time at several
+    resolutions. It's updated with each batch of new measurements, so long time ranges can
+    be read without reading all values.
+    """
+
+    __tablename__ = 'rollup'
+    __table_args__ = {'sqlite_with_rowid': False}
+
+    # bucket lengths in seconds (minute, hour, day)
+    RESOLUTIONS = (60, 60 * 60, 60 * 60 * 24)
+
+    component_settings_id = Column(Integer, ForeignKey('component_settings.id'), primary_key=True,
+                                   autoincrement=False)
+    resolution = Column(Integer, primary_key=True, autoincrement=False)
+    # start of bucket (aligned to resolution), seconds since epoch
+    bucket_ts = Column(Integer, primary_key=True, autoincrement=False)
+    count = Column(Integer, nullable=False)
+    # sum is kept instead of average, so buckets can be updated without reading them first
+    sum = Column(Float, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+
+    def __init__(self, component_settings_id, resolution, bucket_ts, count, sum, min, max):
+        self.component_settings_id = component_settings_id
+        self.resolution = resolution
+        self.bucket_ts = bucket_ts
+        self.count = count
+        self.sum = sum
+        self.min = min
+        self.max = max
+
@@ -0,0 +1,198 @@
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from threading import Lock
+
+
+class SharedRecords:
+    """
+    Records in small file which is mapped into memory by one writer process (MQTT client) and
+    by any number of reader processes (web server), so data is shared between processes
+    without database. Subclasses define magic, record and their own header fields.
+
+    File has fixed size (capacity is set by writer), it's never replaced or resized, so it
+    can stay mapped while it's changed (on Windows too). Header has sequence number which
+    writer makes odd while it's changing records and even when it's done, so reader knows
+    when it has to read again (sequence lock).
+
+    header:     magic (4 bytes), sequence (uint64), count (uint32), capacity (uint32) and then
+                subclass's header fields (EXTRA_HEADER)
+    record:     RECORD, its first field is key of record
+    """
+
+    MAGIC = b'\0\0\0\0'
+    HEADER = struct.Struct('<4sQII')
+    EXTRA_HEADER = struct.Struct('<')
+    RECORD = None
+    DEFAULT_CAPACITY = 1024
+    # reader tries again this many times if writer changes records while they're read
+    READ_RETRIES = 10
+
+    def __init__(self, path, writable=False, capacity=None):
+        """
+        :param path:        path to file (writer creates it if it doesn't exist)
+        :param writable:    True for writer (only one process can be writer)
+        :param capacity:    max number of records (used only when writer creates file)
+        """
+
+        self.__path = path
+        self.__writable = writable
+        self.__capacity = capacity if capacity is not None else self.DEFAULT_CAPACITY
+        self.__map = None
+        # key -> index of record (writer only)
+        self.__slots = dict()
+        self.__lock = Lock()
+        # reader keeps data of last read sequence, so it reads records only if they changed
+        self.__sequence = None
+        self.__data = None
+
+        if writable:
+            self.__open_writer()
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+
+    def _fits(self, key):
+        # subclass can refuse keys which can't be saved in record
+        return True
+
+    def _get_key(self, record):
+        # key of unpacked record
+        return record[0]
+
+    def _initial_extra(self):
+        # subclass's header fields of new file
+        return tuple()
+
+    def _decode(self, extra, records):
+        # data which reader returns (and keeps until records change)
+        return extra, records
+
+    def _get_slot(self, key):
+        # index of key's record (writer only), None if file is full or key doesn't fit
+        slot = self.__slots.get(key)
+
+        if slot is None:
+            if len(self.__slots) >= self.__capacity or not self._fits(key):
+                return None
+
+            slot = len(self.__slots)
+            self.__slots[key] = slot
+
+        return slot
+
+    @contextmanager
+    def _changing(self):
+        # records and header fields are changed inside this block (writer only), readers never
+        # use records while they're changed
+        with self.__lock:
+            sequence = self.__read_header()[1]
+            self.__write_header(sequence + 1)
+
+            try:
+                yield
+            finally:
+                self.__write_header(sequence + 2)
+
+    def _read_extra(self):
+        return self.EXTRA_HEADER.unpack_from(self.__map, self.HEADER.size)
+
+    def _write_extra(self, *values):
+        self.EXTRA_HEADER.pack_into(self.__map, self.HEADER.size, *values)
+
+    def _read_record(self, slot):
+        return self.RECORD.unpack_from(self.__map, self.__get_offset(slot))
+
+    def _write_record(self, slot, *values):
+        self.RECORD.pack_into(self.__map, self.__get_offset(slot), *values)
+
+    def _read(self):
+        """
+        :return:    decoded data (see _decode) or None if file doesn't exist yet
+        """
+
+        if self.__map is None and not self.__open_reader():
+            return None
+
+        for i in range(self.READ_RETRIES):
+            magic, sequence, count, capacity = self.__read_header()
+
+            if sequence == self.__sequence:
+                return self.__data
+            if sequence % 2 == 1:
+                # writer is changing records right now
+                continue
+
+            extra = self._read_extra()
+            records = [self._read_record(slot) for slot in range(min(count, capacity))]
+
+            # if sequence is same as before reading, records weren't changed meanwhile
+            if self.__read_header()[1] == sequence:
+                self.__sequence = sequence
+                self.__capacity = capacity
+                self.__data = self._decode(extra, records)
+                break
+
+        return self.__data
+
+    def __get_offset(self, slot):
+        return self.HEADER.size + self.EXTRA_HEADER.size + slot * self.RECORD.size
+
+    def __open_writer(self):
+        size = self.HEADER.size + self.EXTRA_HEADER.size + self.__capacity * self.RECORD.size
+
+        if os.path.exists(self.__path) and os.path.getsize(self.__path) >= self.HEADER.size:
+            with open(self.__path, 'r+b') as f:
+                self.__map = mmap.mmap(f.fileno(), 0)
+
+            magic, sequence, count, capacity = self.__read_header()
+
+            if magic == self.MAGIC:
+                # keep records from last run, so they're available right after restart
+                self.__capacity = capacity
+
+                for slot in range(min(count, capacity)):
+                    self.__slots[self._get_key(self._read_record(slot))] = slot
+
+                if sequence % 2 == 1:
+                    # writer stopped while it was changing records
+                    self.__write_header(sequence + 1)
+
+                return
+
+            self.__map.close()
+
+        with open(self.__path, 'w+b') as f:
+            f.write(b'\0' * size)
+            f.flush()
+            self.__map = mmap.mmap(f.fileno(), 0)
+
+        self._write_extra(*self._initial_extra())
+        self.__write_header(0)
+
+    def __open_reader(self):
+        if not os.path.exists(self.__path) or os.path.getsize(self.__path) < self.HEADER.size:
+            return False
+
+        with open(self.__path, 'rb') as f:
+            self.__map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.__read_header()[0] != self.MAGIC:
+            self.close()
+
+            return False
+
+        return True
+
+    def __read_header(self):
+        return self.HEADER.unpack_from(self.__map, 0)
+
+    def __write_header(self, sequence):
+        self.HEADER.pack_into(self.__map, 0, self.MAGIC, sequence, len(self.__slots), self.__capacity)
@@ -0,0 +1,43 @@
+# converts already validated config values (see validator) to numbers
+
+
+# seconds of each unit of time format (is_time_after)
+TIME_UNITS = {'w': 60 * 60 * 24 * 7, 'd': 60 * 60 * 24, 'h': 60 * 60, 'm': 60, 's': 1}
+
+
+def to_bytes(size):
+    # size format is <integer><unit>, where unit is b, kb or mb (is_file_size)
+    size = size.lower()
+
+    if size.endswith('kb'):
+        return int(size[:-2]) * 1024
+    elif size.endswith('mb'):
+        return int(size[:-2]) * 1024 * 1024
+
+    return int(size[:-1])
+
+
+def to_seconds(time_after):
+    # time format is one or more <integer><unit>, where unit is w, d, h, m or s (is_time_after)
+    seconds = 0
+    time_value = ''
+
+    for char in time_after.lower():
+        if '0' <= char <= '9':
+            time_value += char
+        else:
+            seconds += int(time_value) * TIME_UNITS[char]
+            time_value = ''
+
+    return seconds
+
+
+def to_seconds_per_type(time_after_per_type):
+    # format is <value_type>:<time>[, <value_type>:<time>...] (is_time_after_per_type)
+    seconds_per_type = dict()
+
+    for item in time_after_per_type.split(','):
+        value_type, time_after = item.split(':')
+        seconds_per_type[value_type.strip()] = to_seconds(time_after.strip())
+
+    return seconds_per_type
@@ -1,6 +1,11 @@
-from datetime import datetime
-from os.path import exists, getsize
-from os import remove
+import atexit
+import re
+from datetime import datetime, timedelta
+from os.path import exists, join, split, splitext
+from os import listdir, remove
+from threading import Condition, Lock, Thread, Timer
+
+from shared.utils.converter import to_bytes, to_seconds
 
 
 class Logger:
@@ -8,6 +13,13 @@ class Logger:
     DEPENDS_ON_NOTHING = 0
     DEPENDS_ON_SIZE = 1
     DEPENDS_ON_TIME = 2
+    DEFAULT_MAX_BUFFER_SIZE = '64kb'
+    DEFAULT_FLUSH_INTERVAL = 1     # seconds
+    # levels (records with lower level than sink's level are not printed/written)
+    INFO = 1
+    WARNING = 2
+    ERROR = 3
+    LEVELS = {'info': INFO, 'warning': WARNING, 'error': ERROR}
 
     @staticmethod
     def get_instance():
@@ -15,8 +27,8 @@ class Logger:
 
     def __init__(self, name, filename='', depends_on=DEPENDS_ON_NOTHING,
                  max_file_size='', time_after='', time_at='', max_files=1, rotate=False,
-                 has_buffer=False, max_buffer_size='',
-                 parent=None, print_log=False):
+                 has_buffer=False, max_buffer_size='', flush_interval=DEFAULT_FLUSH_INTERVAL,
+                 parent=None, print_log=False, print_level=INFO, write_level=INFO):
         self.__name = name
 
         if filename != '':
@@ -27,102 +39,119 @@ class Logger:
             self.__depends_on = depends_on
 
             if depends_on == Logger.DEPENDS_ON_SIZE:
-                self.__max_file_size = Logger.__convert_to_bytes(max_file_size)
+                self.__max_file_size = to_bytes(max_file_size)
             else:
-                # else it depends on time...
-                self.__time_after = Logger.__convert_to_seconds(time_after)
-                self.__time_at = time_at
+                # else it depends on time (time passed since file is created or time of day,
+                # which is kept as seconds after midnight)...
+                self.__time_after = to_seconds(time_after)
+                self.__time_at = to_seconds(time_at) if time_at != '' else None
 
-            self.__max_files = max_files
+            self.__max_files = int(max_files)
             self.__rotate = rotate
-            if rotate:
-                self.__files = list()
+            # logger's files, from oldest to newest
+            self.__files = list()
+
+            # file stays open between records and its size is tracked in memory, so there's
+            # no need to check file on disk for each record
+            self.__file = None
+            self.__file_size = 0
+            self.__file_created_at = None
+            self.__file_lock = Lock()
+            # timer only raises flag when it's time for new file, so records don't have to
+            # check time
+            self.__rotation_timer = None
+            self.__rotation_due = False
+            self.__find_existing_files()
         else:
             self.__to_file = False
 
         self.__print_log = print_log
-
-        if has_buffer:
+        self.__print_level = print_level
+        self.__write_level = write_level
+        # buffer is used only for writing to file
+        self.__has_buffer = has_buffer and self.__to_file
+
+        if self.__has_buffer:
+            # records are written to file by background thread, in batches, when buffer is
+            # full, when flush interval passes or when logger is closed
             self.__buffer = list()
+            self.__buffer_size = 0
+            self.__max_buffer_size = to_bytes(
+                max_buffer_size if max_buffer_size != '' else Logger.DEFAULT_MAX_BUFFER_SIZE)
+            self.__flush_interval = flush_interval
+            self.__buffer_condition = Condition()
+            self.__closed = False
+            self.__writer = Thread(target=self.__run_writer, name='logger-writer', daemon=True)
+            self.__writer.start()
+
+        if self.__to_file:
+            atexit.register(self.close)
 
         # create only one instance
         Logger.__instance = self
 
-    @staticmethod
-    def __convert_to_bytes(size):
-        # get last 2 chars...
-        size_value_str = ''
-        size_unit = ''
-
-        for char in size:
-            if '0' <= char <= '9':
-                size_value_str += char
-            else:
-                char = char.upper()
-
-                size_unit += char
-
-        size_value = int(size_value_str)
+    def info(self, message, *args):
+        # message can be given with arguments (message.format(*args)), so it's formatted only
+        # if record is printed or written somewhere
+        self.__log(Logger.INFO, 'INFO', message, args)
 
-        if size_unit == 'B':
-            return size_value
-        elif size_unit == 'KB':
-            return size_value * 1024
+    def warning(self, message, *args):
+        self.__log(Logger.WARNING, 'WARNING', message, args)
 
-        # else it's in MB
-        return size_value * 1024 * 1024
+    def error(self, message, *args):
+        self.__log(Logger.ERROR, 'ERROR', message, args)
 
-    @staticmethod
-    def __convert_to_seconds(countdown_time):
-        seconds = 0
-        time_value = ''
-
-        for char in countdown_time:
-            if '0' <= char <= '9':
-                time_value += char
-            else:
-                char = char.upper()
-
-                if char == 'W':
-                    seconds += int(time_value) * 60 * 60 * 24 * 7
-                elif char == 'D':
-                    seconds += int(time_value) * 60 * 60 * 24
-                elif char == 'H':
-                    seconds += int(time_value) * 60 * 60
-                elif char == 'M':
-                    seconds += int(time_value) * 60
-                else:
-                    # else it's in seconds
-                    seconds += int(time_value)
+    def __log(self, level, message_type, message, args):
+        to_print = self.__print_log and level >= self.__print_level
+        to_file = self.__to_file and level >= self.__write_level
 
-                time_value = ''
+        # suppressed records aren't formatted at all (no format or strftime calls)
+        if not to_print and not to_file:
+            return
 
-        return seconds
-
-    def info(self, message):
+        if len(args) > 0:
+            message = message.format(*args)
         # build short messages for print...
-        record = self.__build_record('INFO', message)
+        record = self.__build_record(message_type, message)
 
-        if self.__print_log:
+        if to_print:
             print(record)
-        if self.__to_file:
+        if to_file:
             self.__write_to_file(record)
 
-    def warning(self, message):
-        record = self.__build_record('WARNING', message)
+    def flush(self):
+        # write buffered records to file now (buffer is taken while holding file lock so
+        # batches are written in order they were taken)
+        if self.__has_buffer:
+            with self.__file_lock:
+                with self.__buffer_condition:
+                    records = self.__take_buffer()
 
-        if self.__print_log:
-            print(record)
-        if self.__to_file:
-            self.__write_to_file(record)
+                self.__write_records(records)
 
-    def error(self, message):
-        record = self.__build_record('ERROR', message)
+    def close(self):
+        """
+        Writes everything that's left in buffer and closes log file. It's called at exit
+        of application too.
+
+        :return:
+        """
+
+        if self.__has_buffer and not self.__closed:
+            with self.__buffer_condition:
+                self.__closed = True
+                self.__buffer_condition.notify()
+
+            self.__writer.join()
 
-        if self.__print_log:
-            print(record)
         if self.__to_file:
-            self.__write_to_file(record)
+            with self.__file_lock:
+                if self.__rotation_timer is not None:
+                    self.__rotation_timer.cancel()
+                    self.__rotation_timer = None
+                if self.__file is not None:
+                    self.__file.close()
+                    self.__file = None
 
     def __build_record(self, message_type, message):
         return '{}\t\t{}\t\t{}{}'.format(
@@ -164,79 +193,211 @@ class Logger:
         return name_n_space
 
     def __write_to_file(self, record):
-        if not exists(self.__temp_filename):
-            # add datetime to filename
-            self.__temp_filename = self.__new_filename()
-
-            if self.__depends_on == Logger.DEPENDS_ON_SIZE and self.__rotate:
-                self.__files.append(self.__temp_filename)
-        record += '\n'
-        write_to_file = True
-
-        if self.__depends_on == Logger.DEPENDS_ON_SIZE:
-            if exists(self.__temp_filename):
-                if getsize(self.__temp_filename) + Logger.__get_byte_size(record) > self.__max_file_size:
-                    # make temp for temp because it can happen it adds new record in same
-                    # file only because of same filename (logger logs messages too fast)...
-                    temp_filename = self.__new_filename()
-
-                    if self.__temp_filename == temp_filename:
-                        self.__temp_filename = self.__new_filename2(self.__temp_filename)
-                    else:
-                        self.__temp_filename = temp_filename
-
-                    if self.__rotate:
-                        # if max number of filex exceed -> rotate by using oldest one
-                        if self.__max_files == len(self.__files):
-                            oldest_file = self.__find_oldest_in_files()
-                            self.__files.remove(oldest_file)
-                            if exists(oldest_file):
-                                remove(oldest_file)
-                        self.__files.append(self.__temp_filename)
-            elif Logger.__get_byte_size(record) > self.__max_file_size:
-                # if file doesn't exist, it'll try to add new record but we must check if
-                # it has valid size too (this can occur if max file size is too small or
-                # record is too big)
-                write_to_file = False
-
-        if write_to_file:
-            file = open(self.__temp_filename, 'a')
-            file.write(record)
-            file.close()
+        if self.__has_buffer:
+            with self.__buffer_condition:
+                if self.__closed:
+                    return
 
-    def __new_filename(self):
-        path = self.__filename.split('/')
-        file = path[-1].split('.')
+                self.__buffer.append(record)
+                self.__buffer_size += Logger.__get_byte_size(record)
 
-        return '{}_{}.{}'.format(file[0], Logger.__get_str_formatted_datetime2(), file[1])
+                if self.__buffer_size >= self.__max_buffer_size:
+                    self.__buffer_condition.notify()
+        else:
+            with self.__file_lock:
+                self.__write_records([record])
+
+    def __take_buffer(self):
+        # must be called with buffer condition acquired
+        records = self.__buffer
+        self.__buffer = list()
+        self.__buffer_size = 0
+
+        return records
+
+    def __run_writer(self):
+        while True:
+            with self.__buffer_condition:
+                self.__buffer_condition.wait_for(
+                    lambda: self.__closed or self.__buffer_size >= self.__max_buffer_size,
+                    timeout=self.__flush_interval)
+                closed = self.__closed
+
+            self.flush()
+
+            if closed:
+                break
+
+    def __write_records(self, records):
+        # must be called with file lock acquired
+        if len(records) == 0:
+            return
+
+        for record in records:
+            record += '\n'
+            record_size = Logger.__get_byte_size(record)
+
+            if self.__file is None:
+                self.__open_file()
+            elif self.__rotation_due:
+                self.__next_file()
+
+            if self.__depends_on == Logger.DEPENDS_ON_SIZE:
+                if self.__file_size > 0 and self.__file_size + record_size > self.__max_file_size:
+                    self.__next_file()
+                if record_size > self.__max_file_size:
+                    # record can't fit into any file (this can occur if max file size is
+                    # too small or record is too big)
+                    continue
+
+            self.__file.write(record)
+            self.__file_size += record_size
+
+        self.__file.flush()
+
+    def __find_existing_files(self):
+        """
+        Finds files left by previous runs of logger, so after restart it continues writing
+        to newest one (instead of creating new file each time) and old files still count
+        for rotation.
 
-    def __new_filename2(self, old_filename):
-        # create new copy of file with same name...
-        path = old_filename.split('/')
-        file = path[-1].split('.')
-        copy_number_str = '1'
+        :return:
+        """
+
+        directory, filename = split(self.__filename)
+        file, extension = splitext(filename)
+        # files are named <file>_<datetime>.<extension> or <file>_<datetime>(<copy>).<extension>
+        pattern = re.compile(r'^{}_(\d{{4}}-\d{{2}}-\d{{2}}_\d{{2}}-\d{{2}}-\d{{2}})(?:\((\d+)\))?{}$'
+                             .format(re.escape(file), re.escape(extension)))
+        found = list()
+
+        try:
+            filenames = listdir(directory if directory != '' else '.')
+        except OSError:
+            return
 
-        if file[0][-1] == ')':
-            start_index = file[0].find('(')
-            copy_number = int(file[0][start_index + 1:-1])
-            copy_number_str = str(copy_number + 1)
+        for existing_filename in filenames:
+            match = pattern.match(existing_filename)
+
+            if match is not None:
+                copy_number = int(match.group(2)) if match.group(2) is not None else 0
+                found.append((match.group(1), copy_number, join(directory, existing_filename)))
 
-        original_old_filename_part = old_filename[:old_filename.find('.')]
+        # sort by datetime and copy number, so the oldest file is first
+        found.sort()
+        self.__files = [existing_file for created_at, copy_number, existing_file in found]
 
-        return '{}({}).{}'.format(original_old_filename_part, copy_number_str, file[1])
+        if len(found) > 0:
+            self.__temp_filename = found[-1][2]
+            self.__file_created_at = datetime.strptime(found[-1][0], "%Y-%m-%d_%H-%M-%S")
+
+        if self.__rotate:
+            self.__remove_old_files()
+
+    def __open_file(self):
+        # continue with newest existing file if it's not expired (full file is changed by
+        # size check, same as while running)
+        if self.__file_created_at is not None and exists(self.__temp_filename):
+            rotate_at = self.__get_rotation_time(self.__file_created_at)
+
+            if rotate_at is None or rotate_at > datetime.now():
+                self.__file = open(self.__temp_filename, 'a')
+                # position in file opened for appending is at its end
+                self.__file_size = self.__file.tell()
+                self.__schedule_rotation()
+
+                return
+
+        self.__next_file()
+
+    def __next_file(self):
+        if self.__file is not None:
+            self.__file.close()
+
+        # make temp for temp because it can happen it adds new record in same
+        # file only because of same filename (logger logs messages too fast)...
+        temp_filename = self.__new_filename()
+
+        if self.__temp_filename.startswith(splitext(temp_filename)[0]):
+            # current file is created in same second, so new one is its next copy (copies must
+            # keep their order even when older copies are already removed by rotation)
+            temp_filename = self.__new_filename2(self.__temp_filename)
+        while exists(temp_filename):
+            temp_filename = self.__new_filename2(temp_filename)
+
+        self.__temp_filename = temp_filename
+        self.__file_created_at = datetime.now()
+        self.__files.append(self.__temp_filename)
+
+        if self.__rotate:
+            self.__remove_old_files()
+
+        self.__file = open(self.__temp_filename, 'a')
+        self.__file_size = 0
+        self.__schedule_rotation()
+
+    def __remove_old_files(self):
+        # if max number of files exceed -> rotate by removing oldest ones
+        while len(self.__files) > self.__max_files:
+            oldest_file = self.__files.pop(0)
+
+            if exists(oldest_file):
+                remove(oldest_file)
+
+    def __get_rotation_time(self, created_at):
+        # returns datetime when file created at given datetime expires (None if it doesn't)
+        if self.__depends_on != Logger.DEPENDS_ON_TIME:
+            return None
+
+        if self.__time_after > 0:
+            return created_at + timedelta(seconds=self.__time_after)
+        elif self.__time_at is not None:
+            rotate_at = created_at.replace(hour=0, minute=0, second=0, microsecond=0) + \
+                timedelta(seconds=self.__time_at)
+
+            if rotate_at <= created_at:
+                rotate_at += timedelta(days=1)
+
+            return rotate_at
+
+        return None
+
+    def __schedule_rotation(self):
+        if self.__rotation_timer is not None:
+            self.__rotation_timer.cancel()
+            self.__rotation_timer = None
+
+        self.__rotation_due = False
+        rotate_at = self.__get_rotation_time(self.__file_created_at)
+
+        if rotate_at is not None:
+            self.__rotation_timer = Timer(max(0, (rotate_at - datetime.now()).total_seconds()),
+                                          self.__set_rotation_due)
+            self.__rotation_timer.daemon = True
+            self.__rotation_timer.start()
+
+    def __set_rotation_due(self):
+        # new file is created with next record, so there are no empty files
+        self.__rotation_due = True
+
+    def __new_filename(self):
+        file, extension = splitext(self.__filename)
+
+        return '{}_{}{}'.format(file, Logger.__get_str_formatted_datetime2(), extension)
 
     @staticmethod
-    def __get_byte_size(record):
-        return len(record)
+    def __new_filename2(old_filename):
+        # create new copy of file with same name...
+        file, extension = splitext(old_filename)
+        copy_number = 1
 
-    def __find_oldest_in_files(self):
-        # first file is the oldest, now compare
-        oldest = self.__files[0]
+        if file[-1] == ')':
+            start_index = file.rfind('(')
+            copy_number = int(file[start_index + 1:-1]) + 1
+            file = file[:start_index]
 
-        # this will work if there are at least 2 files (it's called when using rotation
-        # mode, but user should know rotation mode is useless with max_files = 1...)
-        for i in range(1, len(self.__files)):
-            if oldest > self.__files[i]:
-                oldest = self.__files[i]
+        return '{}({}){}'.format(file, copy_number, extension)
 
-        return oldest
+    @staticmethod
+    def __get_byte_size(record):
+        return len(record)
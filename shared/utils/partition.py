@@ -0,0 +1,38 @@
+import os
+import zlib
+
+
+"""
+Nodes can be shared between several MQTT clients (partitions), each node is handled only by
+client which owns it. Web server uses same functions to find files written by each client.
+"""
+
+
+def get_partition(node, count):
+    # node belongs to partition with highest hash of (partition, node) - rendezvous hashing, so
+    # only nodes of removed/added partition move when number of partitions changes
+    if count == 1:
+        return 0
+
+    hashes = [zlib.crc32('{}:{}'.format(index, node).encode('utf-8')) for index in range(count)]
+
+    return hashes.index(max(hashes))
+
+
+def get_partition_path(path, index, count):
+    """
+    File which is written by only one process (latest values, data versions, spilled messages)
+    can't be shared between partitions, so each partition has its own file next to given one.
+
+    :param path:    path from config
+    :param index:   partition (0 to count - 1)
+    :param count:   number of partitions
+    :return:        path with partition before extension (unchanged path if there's only one)
+    """
+
+    if count == 1:
+        return path
+
+    root, extension = os.path.splitext(path)
+
+    return '{}_{}{}'.format(root, index, extension)
@@ -1,5 +1,7 @@
 from os.path import exists, isfile
 
+from shared.utils.converter import TIME_UNITS
+
 
 # all values are validated as case_sensitive = False, except directory/file path
 def is_not_empty(value):
@@ -176,6 +178,35 @@ def is_log(value):
     return False, message
 
 
+def is_bin(value):
+    # same as is_db, but for binary data files (file doesn't have to exist, only its directory)
+    value_to_dir = '\\'.join(value.split('\\')[:-1])
+
+    if value_to_dir == '':
+        value_to_dir = value
+
+    ok, message = is_directory(value_to_dir)
+
+    if ok:
+        dot_sides = value.split('.')
+
+        if len(dot_sides) > 1:
+            if dot_sides[-2][-1] == '\\':
+                return False, "Filename required"
+        else:
+            if dot_sides[-1] == '\\':
+                return False, "Filename required"
+
+        # check if it's file with extension 'bin' (binary data file)
+        ext = dot_sides[-1].lower()
+
+        if ext == 'bin':
+            return True, None
+        return False, "Must be binary data file of type BIN (*.bin)"
+
+    return False, message
+
+
 def is_one_of_values(value, valid_values):
     ok, message = is_not_empty(value)
     value = value.lower()
@@ -240,8 +271,70 @@ def is_file_size(value):
 
 
 def is_time_after(value):
-    return True
+    # time after which new log file is created, format is one or more <integer><unit> where
+    # unit can be in weeks, days, hours, minutes or seconds (w, d, h, m, s), example: 2d12h5m
+    ok, message = is_not_empty(value)
+
+    if ok:
+        time_value = ''
+        seconds = 0
+
+        for v in value.lower():
+            if '0' <= v <= '9':
+                time_value += v
+            elif v in TIME_UNITS.keys() and time_value != '':
+                seconds += int(time_value) * TIME_UNITS[v]
+                time_value = ''
+            else:
+                return False, "Must be value with format <integer><unit>[<integer><unit>...] where unit " \
+                              "can be in weeks, days, hours, minutes or seconds (w, d, h, m, s)"
+        if time_value != '':
+            return False, "Missing unit declaration (w, d, h, m, s)"
+        if seconds == 0:
+            return False, "Time must be longer than 0 seconds"
+        return True, None
+
+    return False, message
 
 
 def is_time_at(value):
-    return True
+    # time of day when new log file is created, format is <integer>h[<integer>m], example: 12h30m
+    ok, message = is_not_empty(value)
+
+    if ok:
+        message_false = "Must be time of day with format <integer>h[<integer>m] (example: 12h30m)"
+        parts = value.lower().split('h')
+
+        if len(parts) != 2 or not parts[0].isdigit() or int(parts[0]) > 23:
+            return False, message_false
+        if parts[1] != '':
+            if parts[1][-1] != 'm' or not parts[1][:-1].isdigit() or int(parts[1][:-1]) > 59:
+                return False, message_false
+        return True, None
+
+    return False, message
+
+
+def is_time_after_per_type(value):
+    # list of value types with their times (format of time is same as in is_time_after), example:
+    # temperatura:30d, vlaga:7d
+    ok, message = is_not_empty(value)
+
+    if ok:
+        message_false = "Must be list with format <value_type>:<time>[, <value_type>:<time>...] " \
+                        "(example: temperatura:30d, vlaga:7d)"
+
+        for item in value.split(','):
+            parts = item.strip().split(':')
+
+            if len(parts) != 2 or parts[0].strip() == '':
+                return False, message_false
+
+            ok, message = is_time_after(parts[1].strip())
+
+            if not ok:
+                return False, "Invalid time for value type '{}' ({})".format(parts[0].strip(), message)
+        return True, None
+
+    return False, message
+
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from shared.data.converter import convert
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.helpers import build_node_config
+
+
+"""
+Writes D days of measurements (one every 30 seconds) for 4 sensors as measurement rows,
+converts copies of database to compact samples and to packed blocks, and prints database
+size and time needed to read one day of one sensor for each storage.
+Run from project's root folder:
+    python -m test.compact_storage_benchmark [D]
+"""
+
+
+PERIOD = 30         # seconds between two measurements
+READS = 20
+
+
+def build_database(db_url, days):
+    DBHandler.init(Base, db_url)
+    handler = DBHandler.get_instance()
+    handler.new_node_config('node-1', build_node_config(2, PERIOD, False))
+    routes = handler.get_node_routes('node-1')
+    first_measured_at = datetime.now().replace(microsecond=0) - timedelta(days=days)
+
+    for day in range(days):
+        measurements = list()
+
+        for i in range(24 * 60 * 60 // PERIOD):
+            measured_at = (first_measured_at + timedelta(days=day, seconds=i * PERIOD)).strftime("%Y-%m-%d %H:%M:%S")
+
+            for component_settings_id in routes.values():
+                measurements.append((component_settings_id, 20 + (i % 100) / 10, measured_at))
+
+        handler.new_data_batch(measurements)
+
+    # everything is already delivered to collector
+    handler.confirm_data(sys.maxsize)
+    handler.vacuum()
+
+    return min(routes.values()), int(first_measured_at.timestamp())
+
+
+def read_day(db_url, component_settings_id, from_ts):
+    DBHandler.init(Base, db_url)
+    handler = DBHandler.get_instance()
+    started_at = time.perf_counter()
+
+    for i in range(READS):
+        samples = handler.get_samples(component_settings_id, from_ts, from_ts + 24 * 60 * 60)
+
+    return len(samples), (time.perf_counter() - started_at) / READS
+
+
+if __name__ == '__main__':
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    db_dir = tempfile.mkdtemp()
+    rows_url = os.path.join(db_dir, 'rows.db')
+    samples_url = os.path.join(db_dir, 'samples.db')
+    blocks_url = os.path.join(db_dir, 'blocks.db')
+
+    component_settings_id, first_ts = build_database(rows_url, days)
+    shutil.copy(rows_url, samples_url)
+    shutil.copy(rows_url, blocks_url)
+    convert(samples_url)
+    convert(blocks_url, pack_after=0)
+    # day in the middle of history
+    from_ts = first_ts + days // 2 * 24 * 60 * 60
+
+    for name, db_url in [('measurement rows', rows_url), ('compact samples', samples_url),
+                         ('packed blocks', blocks_url)]:
+        count, elapsed = read_day(db_url, component_settings_id, from_ts)
+        print("{}:\t{:.2f} MB, one day of one sensor ({} values) read in {:.2f}ms"
+              .format(name, os.path.getsize(db_url) / 1024 / 1024, count, elapsed * 1000))
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.helpers import build_node_config
+
+
+"""
+Checks that measurements of older database (which look confirmed by collector, because
+column's default was True) are set as not confirmed when handler is created, and that it's
+done only once (confirmations of collector are kept when handler is created again).
+Run from project's root folder:
+    python -m test.delivery_confirmation_test [N]
+"""
+
+
+def make_old_database(db_url):
+    # same data as older version of handler left (all measurements confirmed, user_version 0)
+    connection = sqlite3.connect(db_url)
+    connection.execute('UPDATE measurement SET collector_delivery_confirmed = 1')
+    connection.execute('PRAGMA user_version = 0')
+    connection.commit()
+    connection.close()
+
+
+def not_confirmed(db_url):
+    DBHandler.init(Base, db_url)
+
+    return [item['id'] for item in DBHandler.get_instance().get_data(True)]
+
+
+if __name__ == '__main__':
+    measurements = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+    DBHandler.init(Base, db_url)
+    handler = DBHandler.get_instance()
+    handler.new_node_config('node-1', build_node_config(1))
+    component_settings_id = list(handler.get_node_routes('node-1').values())[0]
+    assert handler.new_data_batch([(component_settings_id, 20.0 + i, '2020-01-01 00:00:{:02d}'.format(i % 60))
+                                   for i in range(measurements)])
+    make_old_database(db_url)
+
+    ids = not_confirmed(db_url)
+    print("older database: {} of {} measurement/s not confirmed".format(len(ids), measurements))
+    assert len(ids) == measurements, "measurements of older database stayed confirmed"
+
+    DBHandler.get_instance().confirm_data(ids[len(ids) // 2])
+    ids_after = not_confirmed(db_url)
+    print("after confirmation and restart: {} measurement/s not confirmed".format(len(ids_after)))
+    assert ids_after == ids[len(ids) // 2 + 1:], "confirmations were reset again"
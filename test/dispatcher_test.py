@@ -0,0 +1,79 @@
+import os
+import sys
+import tempfile
+import time
+
+from mqtt.dispatcher import Dispatcher
+
+
+"""
+Sends N messages to dispatcher (as network loop does) while handler is slow (like database
+on SD card), for each overflow policy, checks that nothing is lost with block and spill (and
+that order is kept with one worker) and prints how long network loop was busy with
+dispatching. With more workers and nodes it checks that messages of each node are still
+handled in order they came.
+Run from project's root folder:
+    python -m test.dispatcher_test [N]
+"""
+
+
+QUEUE_SIZE = 100
+HANDLE_TIME = 0.0005    # seconds
+
+
+def run(policy, count, workers=1, nodes=1):
+    handled = list()
+    spill_path = os.path.join(tempfile.mkdtemp(), 'spill.bin')
+
+    def handle(topic, payload, received_at):
+        time.sleep(HANDLE_TIME)
+        handled.append((topic.split('/')[0], int(payload)))
+
+    dispatcher = Dispatcher()
+    dispatcher.setup(workers, QUEUE_SIZE, policy, spill_path)
+    dispatcher.start(handle, get_key=lambda topic, payload: topic.split('/')[0])
+    started_at = time.perf_counter()
+
+    for i in range(count):
+        dispatcher.dispatch('node-{}/1/C'.format(i % nodes), str(i).encode())
+
+    dispatch_time = time.perf_counter() - started_at
+    depth = dispatcher.depth
+    dispatcher.stop()
+
+    return handled, dispatch_time, depth, dispatcher.stats
+
+
+def is_ordered_per_node(handled):
+    last = dict()
+
+    for node_id, i in handled:
+        if i < last.get(node_id, -1):
+            return False
+        last[node_id] = i
+
+    return True
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    for policy in Dispatcher.POLICIES:
+        handled, dispatch_time, depth, stats = run(policy, count)
+
+        if policy == 'drop_oldest':
+            assert len(handled) + stats['dropped'] == count
+        else:
+            # one worker handles messages in order they came
+            assert [i for node_id, i in handled] == list(range(count)), policy
+
+        print("{}:\tdispatching took {:.3f}s, depth after dispatching {}, handled {}, dropped {}, spilled {}, "
+              "max lag {:.3f}s".format(policy, dispatch_time, depth, stats['handled'], stats['dropped'],
+                                       stats['total_spilled'], stats['max_lag']))
+
+    for policy in ('block', 'spill'):
+        handled, dispatch_time, depth, stats = run(policy, count, 4, 20)
+        assert sorted(i for node_id, i in handled) == list(range(count)), policy
+        assert is_ordered_per_node(handled), "messages of node are handled out of order ({})".format(policy)
+        print("{}, 4 workers, 20 nodes:\tdispatching took {:.3f}s, max lag {:.3f}s".format(policy, dispatch_time,
+                                                                                      stats['max_lag']))
@@ -0,0 +1,65 @@
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from web.server import encoding
+
+
+"""
+Encodes N measurements of 4 sensors (as DBHandler.get_data yields them) in each export
+format, with and without compression, and prints size and time of each encoding.
+Run from project's root folder:
+    python -m test.export_encoding_benchmark [N]
+"""
+
+
+SENSORS = [('node-1', 'temperatura', 'C'), ('node-1', 'vlaga', '%'), ('node-2', 'temperatura', 'C'),
+           ('node-2', 'vlaga', '%')]
+
+
+def build_data(count):
+    first_measured_at = datetime(2018, 1, 1)
+    data = list()
+
+    for i in range(count):
+        node_id, measurement_type, measuring_unit = SENSORS[i % len(SENSORS)]
+        data.append({
+            'id': i + 1,
+            'node_id': node_id,
+            'value': 20 + (i % 100) / 10,
+            'measurement_type': measurement_type,
+            'measuring_unit': measuring_unit,
+            'measured_at': (first_measured_at + timedelta(seconds=i // len(SENSORS) * 30))
+                .strftime("%Y-%m-%d %H:%M:%S")
+        })
+
+    return data
+
+
+def join(chunks):
+    return b''.join(chunk.encode('utf-8') if isinstance(chunk, str) else chunk for chunk in chunks)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = build_data(count)
+
+    for format_name in encoding.FORMATS.keys():
+        for compression in (None,) + encoding.COMPRESSIONS:
+            started_at = time.perf_counter()
+            chunks = encoding.encode(iter(data), format_name)
+
+            if compression is not None:
+                chunks = encoding.compress(chunks, compression)
+
+            body = join(chunks)
+            elapsed = time.perf_counter() - started_at
+
+            if compression is not None:
+                # decompressed body must be same as plain one
+                wbits = 16 + zlib.MAX_WBITS if compression == 'gzip' else zlib.MAX_WBITS
+                assert zlib.decompress(body, wbits) == join(encoding.encode(iter(data), format_name))
+
+            print("{} {}:\t{:.2f} MB in {:.3f}s".format(format_name, compression or 'plain',
+                                                      len(body) / 1024 / 1024, elapsed))
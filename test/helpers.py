@@ -0,0 +1,63 @@
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+"""
+Helpers shared by node_data tests and benchmarks: node config in parsed form (as client
+registers it) and recording of SQL statements which database work executes.
+"""
+
+
+# (statement, parameters) of statements executed while recording
+statements = list()
+recording = [False]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    if recording[0]:
+        statements.append((statement, parameters))
+
+
+def record_statements(function):
+    """
+    :param function:    function without parameters
+    :return:            (result of function, list of (statement, parameters) it executed, seconds
+                        it took)
+    """
+
+    del statements[:]
+    recording[0] = True
+    started_at = time.perf_counter()
+
+    try:
+        result = function()
+    finally:
+        elapsed = time.perf_counter() - started_at
+        recording[0] = False
+
+    return result, list(statements), elapsed
+
+
+def build_node_config(sensors=1, measurement_period=5, with_switch=True):
+    # sensors (id_used 1..sensors) measure temperature (C) and humidity (%), switch is last
+    # component and has no value types
+    parsed_conf = list()
+
+    for i in range(1, sensors + 1):
+        parsed_conf.append({
+            'type':         'senzor',
+            'id_used':      str(i),
+            'name':         'BME280',
+            'value_types':  [
+                {'value_type': 'temperatura', 'measuring_unit': 'C', 'measurement_period': str(measurement_period)},
+                {'value_type': 'vlaga', 'measuring_unit': '%', 'measurement_period': str(measurement_period)}
+            ]
+        })
+
+    if with_switch:
+        parsed_conf.append({'type': 'prekidac', 'id_used': str(sensors + 1), 'name': 'relej', 'value_types': []})
+
+    return parsed_conf
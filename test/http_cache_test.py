@@ -0,0 +1,94 @@
+import os
+import tempfile
+import time
+
+from flask import Flask
+
+from shared.data.data_versions import DataVersions
+from web.loader import data_versions
+from web.server import caching
+from web.server.caching import cached_response
+
+
+"""
+Checks that page is rendered only when node's data version changes, that client with
+current ETag gets 304 Not Modified and prints time of cached and rendered requests (render
+takes RENDER_TIME seconds, like node page with database queries). Also checks that cached
+bodies are limited (least recently used ones are removed).
+Run from project's root folder:
+    python -m test.http_cache_test
+"""
+
+
+RENDER_TIME = 0.005
+REQUESTS = 200
+
+renders = list()
+app = Flask(__name__)
+
+
+def render(node_id):
+    time.sleep(RENDER_TIME)
+    renders.append(node_id)
+
+    return 'node {}, render {}'.format(node_id, len(renders))
+
+
+@app.route('/nodes/<string:id>')
+def node_info(id):
+    return cached_response(('node', id), id, lambda: render(id))
+
+
+def timed(client, headers=None):
+    started_at = time.perf_counter()
+
+    for i in range(REQUESTS):
+        resp = client.get('/nodes/node-1', headers=headers)
+
+    return resp, (time.perf_counter() - started_at) / REQUESTS
+
+
+if __name__ == '__main__':
+    path = os.path.join(tempfile.mkdtemp(), 'data_versions.bin')
+    # MQTT client is writer, web server is reader
+    writer = DataVersions(path, True)
+    data_versions.hold(DataVersions(path))
+    client = app.test_client()
+
+    resp = client.get('/nodes/node-1')
+    tag = resp.headers['ETag']
+    assert resp.status_code == 200 and len(renders) == 1
+
+    resp, conditional_time = timed(client, {'If-None-Match': tag})
+    assert resp.status_code == 304 and len(renders) == 1
+
+    resp, cached_time = timed(client)
+    assert resp.status_code == 200 and len(renders) == 1
+
+    # other node's data doesn't change this node's page
+    writer.bump('node-2')
+    assert client.get('/nodes/node-1', headers={'If-None-Match': tag}).status_code == 304
+
+    writer.bump('node-1')
+    resp = client.get('/nodes/node-1', headers={'If-None-Match': tag})
+    assert resp.status_code == 200 and resp.headers['ETag'] != tag and len(renders) == 2
+
+    # only MAX_FRAGMENTS bodies are kept, node-1 is used most recently so it stays
+    for i in range(caching.MAX_FRAGMENTS + 10):
+        client.get('/nodes/other-{}'.format(i))
+        client.get('/nodes/node-1')
+
+    rendered = len(renders)
+    client.get('/nodes/node-1')
+    client.get('/nodes/other-0')
+    assert len(renders) == rendered + 1, "least recently used body wasn't removed"
+
+    # without versions every request is rendered
+    rendered = len(renders)
+    data_versions.hold(None)
+    resp, render_time = timed(client)
+    assert len(renders) == rendered + REQUESTS
+
+    print("304 Not Modified:\t{:.3f}ms per request".format(conditional_time * 1000))
+    print("cached body:\t\t{:.3f}ms per request".format(cached_time * 1000))
+    print("rendered:\t\t{:.3f}ms per request".format(render_time * 1000))
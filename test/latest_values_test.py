@@ -0,0 +1,59 @@
+import os
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+from shared.data.latest_values import LatestValues
+
+
+"""
+Writer process saves N values for 8 sensors (as MQTT client does) while this process reads
+them like web server, checks that every read record is whole (value and ts always come from
+same write) and prints average time of one read of all newest values.
+Run from project's root folder:
+    python -m test.latest_values_test [N]
+"""
+
+
+SENSORS = 8
+
+
+def write(path, count):
+    writer = LatestValues(path, True)
+
+    for i in range(count):
+        for component_settings_id in range(1, SENSORS + 1):
+            # value and ts are written together, so reader can check them
+            writer.set(component_settings_id, float(i), i)
+
+    writer.close()
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    path = os.path.join(tempfile.mkdtemp(), 'latest_values.bin')
+    # file is created before reader starts (web server could also start first)
+    LatestValues(path, True).close()
+
+    writer = Process(target=write, args=(path, count))
+    writer.start()
+    reader = LatestValues(path)
+    reads = 0
+    torn = 0
+    started_at = time.perf_counter()
+
+    while writer.is_alive():
+        for value, ts in reader.get_all().values():
+            if value != float(ts):
+                torn += 1
+        reads += 1
+
+    elapsed = time.perf_counter() - started_at
+    writer.join()
+    values = reader.get_all()
+    print("{} reads while writing, {} torn record/s, {:.2f}us per read"
+          .format(reads, torn, elapsed / reads * 1000000))
+    print("last values: {}".format(sorted(values.items())))
+    assert torn == 0
+    assert all(ts == count - 1 for value, ts in values.values())
@@ -0,0 +1,61 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.helpers import build_node_config
+
+
+"""
+Checks that measurement ids are never given again after compaction moves newest (or all)
+measurements out of measurement table, for new database and for older one whose table
+doesn't have AUTOINCREMENT (it's rebuilt when handler is created).
+Run from project's root folder:
+    python -m test.measurement_id_test [N]
+"""
+
+
+def make_old_table(db_url):
+    # same table as older version of models created (without AUTOINCREMENT)
+    connection = sqlite3.connect(db_url)
+    table_sql = connection.execute("SELECT sql FROM sqlite_master WHERE name = 'measurement'").fetchone()[0]
+    connection.execute('DROP TABLE measurement')
+    connection.execute(table_sql.replace('AUTOINCREMENT', ''))
+    connection.commit()
+    connection.close()
+
+
+def check(db_url, measurements):
+    DBHandler.init(Base, db_url)
+    handler = DBHandler.get_instance()
+    component_settings_id = list(handler.get_node_routes('node-1').values())[0]
+
+    # measurements must already be measured, so all of them are compacted
+    assert handler.new_data_batch([(component_settings_id, 20.0 + i, '2020-01-01 00:00:{:02d}'.format(i % 60))
+                                   for i in range(measurements)])
+    last_id = max(item['id'] for item in handler.get_data(True))
+    handler.confirm_data(last_id)
+    compacted, packed = handler.compact_data(0)
+    assert compacted == measurements, "{} of {} measurements compacted".format(compacted, measurements)
+
+    assert handler.new_data_batch([(component_settings_id, 30.0, '2020-01-02 00:00:00')])
+    new_ids = [item['id'] for item in handler.get_data(True, after_id=last_id)]
+    print("last id {}, id after compaction {}".format(last_id, new_ids))
+    assert new_ids == [last_id + 1], "measurement after compaction got id which was already used"
+
+
+if __name__ == '__main__':
+    measurements = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    for old_table in (False, True):
+        db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+        DBHandler.init(Base, db_url)
+        DBHandler.get_instance().new_node_config('node-1', build_node_config(1))
+
+        if old_table:
+            make_old_table(db_url)
+
+        print("{} table:".format('older' if old_table else 'new'), end=' ')
+        check(db_url, measurements)
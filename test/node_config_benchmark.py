@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import time
+
+from mqtt import client
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+
+
+"""
+Registers N synthetic nodes (like after power cut, when whole fleet reboots) one by one
+and all at once in one transaction, and prints how long it took.
+Run from project's root folder:
+    python -m test.node_config_benchmark [N]
+"""
+
+
+# node config is parsed same way as client parses 'start' message
+parse_config = getattr(client, '__parse_config')
+
+
+def build_node_configs(count):
+    node_configs = list()
+
+    for i in range(count):
+        node_msg = 'node-{};2;senzor|5|DHT22|temperatura|C|5;senzor|6|BME280|temperatura|C|6|vlaga|%|6|' \
+                   'tlak|Pa|6;prekidac|7|relej'.format(i).split(';')
+        node_configs.append((node_msg[0], parse_config(node_msg[2:])))
+
+    return node_configs
+
+
+def run(register, node_configs):
+    db_dir = tempfile.mkdtemp()
+    DBHandler.init(Base, os.path.join(db_dir, 'node_data.db'))
+    handler = DBHandler.get_instance()
+
+    started_at = time.perf_counter()
+    register(handler, node_configs)
+    elapsed = time.perf_counter() - started_at
+
+    # check that everything is registered
+    for node_id, parsed_conf in node_configs:
+        assert len(handler.get_node_routes(node_id)) == 4
+
+    return elapsed
+
+
+def register_one_by_one(handler, node_configs):
+    for node_id, parsed_conf in node_configs:
+        handler.new_node_config(node_id, parsed_conf)
+
+
+def register_in_bulk(handler, node_configs):
+    handler.new_node_configs(node_configs)
+
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    configs = build_node_configs(count)
+
+    print("{} nodes one by one:\t{:.3f}s".format(count, run(register_one_by_one, configs)))
+    print("{} nodes in bulk:\t\t{:.3f}s".format(count, run(register_in_bulk, configs)))
@@ -0,0 +1,38 @@
+import os
+import sys
+import tempfile
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.helpers import build_node_config, record_statements
+
+
+"""
+Counts SQL statements and time that DBHandler.get_node_info needs for node with N
+sensors (node page in web server calls it on every view).
+Run from project's root folder:
+    python -m test.node_info_benchmark [N]
+"""
+
+
+# node info must be fetched with node query and one query for its whole config
+MAX_STATEMENTS = 2
+
+
+if __name__ == '__main__':
+    sensors = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+
+    DBHandler.init(Base, db_url)
+    DBHandler.get_instance().new_node_config('node-1', build_node_config(sensors))
+    # new handler (and session) so nothing is already loaded in session
+    DBHandler.init(Base, db_url)
+    handler = DBHandler.get_instance()
+
+    (ok, info), statements, elapsed = record_statements(lambda: handler.get_node_info('node-1'))
+
+    assert ok
+    assert len(info['components']) == sensors + 1
+    assert info['components'][0]['value_types'][0]['measuring_unit'] == 'C'
+    print("get_node_info for {} sensors: {} statement/s, {:.2f}ms".format(sensors, len(statements), elapsed * 1000))
+    assert len(statements) <= MAX_STATEMENTS, "too many statements: {}".format(len(statements))
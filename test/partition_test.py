@@ -0,0 +1,166 @@
+import os
+import signal
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+from threading import Event
+
+from paho.mqtt import client as mqttc
+from sqlalchemy import create_engine, text
+
+from shared.data.latest_values import LatestValues, PartitionedLatestValues
+from shared.data.data_versions import DataVersions, PartitionedDataVersions
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.stand_in_broker import StandInBroker
+
+
+"""
+Runs C MQTT client processes (each with its own partition) against stand-in broker, with N
+simulated nodes which register and send M measurements each. Checks that each node is
+registered once, that each measurement is written once, that web server's readers find
+newest values and data versions of all nodes in clients' files and prints how nodes are
+split between clients.
+Run from project's root folder:
+    python -m test.partition_test [C] [N] [M]
+"""
+
+
+CONFIG = 'senzor|1|BME280|temperatura|C|5|vlaga|%|5'
+TIMEOUT = 30    # seconds
+
+
+def run_client(db_url, port, index, count, wildcard_topic=None):
+    # client is set up same as loader does it, only without config files
+    from shared.utils.log import Logger
+    from shared.utils.partition import get_partition_path
+    from mqtt import client
+    from mqtt.loader import logger, config_cache, cache, measurements_cache, dispatcher, node_db_handler,\
+        latest_values, data_versions
+
+    logger.hold(Logger('MQTT_CLIENT_{}'.format(index)))
+    config_cache.load(dict(), dict())
+    DBHandler.init(Base, db_url)
+    node_db_handler.hold(DBHandler.get_instance())
+    # each partition writes its own files next to database
+    folder = os.path.dirname(db_url)
+    LatestValues.init(get_partition_path(os.path.join(folder, 'latest_values.bin'), index, count), True)
+    latest_values.hold(LatestValues.get_instance())
+    DataVersions.init(get_partition_path(os.path.join(folder, 'data_versions.bin'), index, count), True)
+    data_versions.hold(DataVersions.get_instance())
+    measurements_cache.setup(node_db_handler.access().new_data_batch, 100, 1)
+    dispatcher.setup(2, 1000, 'block', logger=logger.access())
+    cache.set_partition(index, count)
+    cache.set_wildcard_topic(wildcard_topic)
+
+    try:
+        client.run({'client_id': 'ingest-{}'.format(index), 'clean_session': True, 'broker_host': '127.0.0.1',
+                    'broker_port': port, 'keepalive': 60})
+    except KeyboardInterrupt:
+        pass
+
+
+def run_fleet(port, nodes, measurements):
+    registered = set()
+    all_registered = Event()
+    fleet = mqttc.Client(client_id='fleet', clean_session=True)
+
+    def on_message(mqtt_client, userdata, message):
+        node_id = message.topic
+        code = message.payload.decode()
+
+        if code == '2':
+            # client asks for config
+            mqtt_client.publish('start', '{};2;{}'.format(node_id, CONFIG), qos=1)
+        elif code == '1':
+            registered.add(node_id)
+
+            if len(registered) == nodes:
+                all_registered.set()
+
+    fleet.on_message = on_message
+    fleet.connect('127.0.0.1', port)
+    fleet.loop_start()
+    fleet.subscribe([('node-{}'.format(i), 1) for i in range(nodes)])
+    time.sleep(0.5)
+
+    for i in range(nodes):
+        fleet.publish('start', 'node-{}'.format(i), qos=1)
+
+    assert all_registered.wait(TIMEOUT), "only {} of {} nodes registered".format(len(registered), nodes)
+
+    last_message = None
+
+    for j in range(measurements):
+        for i in range(nodes):
+            last_message = fleet.publish('node-{}/1/C'.format(i), str(20 + j / 10), qos=1)
+
+    # messages which aren't sent yet would be lost on disconnect (they're sent in order)
+    if last_message is not None:
+        last_message.wait_for_publish(TIMEOUT)
+
+    fleet.loop_stop()
+    fleet.disconnect()
+
+
+if __name__ == '__main__':
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    measurements = int(sys.argv[3]) if len(sys.argv) > 3 else 50
+
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+    # tables are created before clients start
+    DBHandler.init(Base, db_url)
+    broker = StandInBroker().start()
+    processes = [Process(target=run_client, args=(db_url, broker.port, index, clients)) for index in range(clients)]
+
+    for process in processes:
+        process.start()
+
+    time.sleep(1)
+    started_at = time.perf_counter()
+    run_fleet(broker.port, nodes, measurements)
+    # measurements are written by clients' batches
+    time.sleep(2)
+
+    for process in processes:
+        os.kill(process.pid, signal.SIGINT)
+    for process in processes:
+        process.join(TIMEOUT)
+
+    elapsed = time.perf_counter() - started_at
+    broker.stop()
+
+    with create_engine('sqlite:///' + db_url).connect() as connection:
+        node_count = connection.execute(text('SELECT count(*) FROM node')).scalar()
+        config_count = connection.execute(text('SELECT count(*) FROM config_update')).scalar()
+        measurement_count = connection.execute(text('SELECT count(*) FROM measurement')).scalar()
+
+    from mqtt.cache import MqttCache
+
+    partitions = [0] * clients
+
+    for i in range(nodes):
+        for index in range(clients):
+            cache = MqttCache()
+            cache.set_partition(index, clients)
+
+            if cache.owns('node-{}'.format(i)):
+                partitions[index] += 1
+
+    print("{} client/s, nodes per client: {}".format(clients, partitions))
+    print("{} node/s, {} config/s, {} measurement/s written in {:.2f}s".format(node_count, config_count,
+                                                                            measurement_count, elapsed))
+    assert node_count == nodes and config_count == nodes, "nodes registered more than once"
+    assert measurement_count == nodes * measurements, "measurements lost or written more than once"
+
+    # web server reads files of all partitions
+    folder = os.path.dirname(db_url)
+    values = PartitionedLatestValues(os.path.join(folder, 'latest_values.bin'), clients).get_all()
+    versions = PartitionedDataVersions(os.path.join(folder, 'data_versions.bin'), clients)
+    print("{} newest value/s, version of all data: {}".format(len(values), versions.get()))
+    assert len(values) == nodes, "newest values of some nodes are missing"
+    assert versions.get() is not None
+    assert all(not versions.get('node-{}'.format(i))[0].endswith('-0') for i in range(nodes)),\
+        "versions of some nodes weren't bumped"
@@ -0,0 +1,90 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+from shared.data.models import node_data
+from shared.data.handlers.node_data import DBHandler
+from test.helpers import build_node_config, record_statements
+
+
+"""
+Checks query plans (EXPLAIN QUERY PLAN) of hot node_data queries and fails if any of them
+reads whole table instead of using index.
+Run from project's root folder:
+    python -m test.query_plan_test
+"""
+
+
+NODES = 20
+MEASUREMENTS = 2000
+
+def get_full_scans(connection, statement, parameters):
+    # plan rows which read whole table ('SCAN table', but not 'SCAN table USING INDEX ...', which
+    # reads index only)
+    full_scans = list()
+
+    for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters):
+        detail = row[-1]
+
+        if detail.startswith('SCAN') and 'INDEX' not in detail:
+            full_scans.append(detail)
+
+    return full_scans
+
+
+def record(name, function):
+    # only SELECT statements have query plan which is checked
+    result, statements, elapsed = record_statements(function)
+
+    return name, result, [(statement, parameters) for statement, parameters in statements
+                          if statement.lstrip().upper().startswith('SELECT')]
+
+
+if __name__ == '__main__':
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+    DBHandler.init(node_data.Base, db_url)
+    handler = DBHandler.get_instance()
+
+    handler.new_node_configs([('node-{}'.format(i), build_node_config()) for i in range(NODES)])
+    routes = handler.get_node_routes('node-1')
+    first_measured_at = datetime(2018, 1, 1)
+    handler.new_data_batch([
+        (routes[(1, 'C')], float(i), (first_measured_at + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M:%S"))
+        for i in range(MEASUREMENTS)])
+    since = (first_measured_at + timedelta(minutes=MEASUREMENTS - 10)).strftime("%Y-%m-%d %H:%M:%S")
+
+    # new handler (and session), so relationships aren't already loaded
+    DBHandler.init(node_data.Base, db_url)
+    handler = DBHandler.get_instance()
+    hot_queries = [
+        record('get_node_routes', lambda: handler.get_node_routes('node-1')),
+        record('get_node_info', lambda: handler.get_node_info('node-1')),
+        record('get_node_config', lambda: handler.get_node_config('node-1')),
+        record('get_data', lambda: list(handler.get_data(True, limit=100))),
+        record('get_data since', lambda: list(handler.get_data(True, only_not_confirmed=False, since=since))),
+        record('get_samples', lambda: handler.get_samples(routes[(1, 'C')], int(first_measured_at.timestamp()),
+                                                          int(first_measured_at.timestamp()) + 3600)),
+        record('get_series', lambda: handler.get_series('node-1', 1, 'temperatura', 'C',
+                                                        int(first_measured_at.timestamp()),
+                                                        int(first_measured_at.timestamp()) + 3600)),
+        record('get_series step', lambda: handler.get_series('node-1', 1, 'temperatura', step=3600)),
+        record('get_series limit', lambda: handler.get_series('node-1', value_type='temperatura', limit=100))
+    ]
+    failed = False
+
+    with create_engine('sqlite:///' + db_url).connect() as connection:
+        for name, result, recorded_statements in hot_queries:
+            assert len(recorded_statements) > 0, "no statements recorded for {}".format(name)
+
+            for statement, parameters in recorded_statements:
+                full_scans = get_full_scans(connection, statement, parameters)
+
+                if len(full_scans) > 0:
+                    failed = True
+                    print("{}:\tFULL SCAN ({})\n\t{}".format(name, ', '.join(full_scans), ' '.join(statement.split())))
+                else:
+                    print("{}:\tOK".format(name))
+
+    assert not failed, "some hot queries read whole table"
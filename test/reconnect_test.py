@@ -0,0 +1,114 @@
+import os
+import signal
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+from paho.mqtt import client as mqttc
+from sqlalchemy import create_engine, text
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.partition_test import run_client, run_fleet, TIMEOUT
+from test.stand_in_broker import StandInBroker
+
+
+"""
+Registers N simulated nodes, then restarts stand-in broker (which forgets all subscriptions)
+and checks that client subscribes nodes' themes again, so measurements sent after restart
+are written. Then restarts client and checks that nodes get OK without sending config again
+(routes are loaded from database at startup).
+Run from project's root folder:
+    python -m test.reconnect_test [N]
+"""
+
+
+def send_measurements(port, nodes):
+    fleet = mqttc.Client(client_id='fleet-measurements', clean_session=True)
+    fleet.connect('127.0.0.1', port)
+    fleet.loop_start()
+
+    for i in range(nodes):
+        fleet.publish('node-{}/1/C'.format(i), '21.5', qos=1).wait_for_publish(TIMEOUT)
+
+    fleet.loop_stop()
+    fleet.disconnect()
+
+
+def count_config_requests(port, nodes):
+    # nodes send 'start' again, returns number of config requests and time until all got answer
+    answers = dict()
+    fleet = mqttc.Client(client_id='fleet-restart', clean_session=True)
+    fleet.on_message = lambda mqtt_client, userdata, message: answers.__setitem__(message.topic,
+                                                                                  message.payload.decode())
+    fleet.connect('127.0.0.1', port)
+    fleet.loop_start()
+    fleet.subscribe([('node-{}'.format(i), 1) for i in range(nodes)])
+    time.sleep(0.5)
+    started_at = time.perf_counter()
+
+    for i in range(nodes):
+        fleet.publish('start', 'node-{}'.format(i), qos=1)
+
+    while len(answers) < nodes and time.perf_counter() - started_at < TIMEOUT:
+        time.sleep(0.01)
+
+    elapsed = time.perf_counter() - started_at
+    fleet.loop_stop()
+    fleet.disconnect()
+
+    return list(answers.values()).count('2'), len(answers), elapsed
+
+
+def stop_client(process):
+    os.kill(process.pid, signal.SIGINT)
+    process.join(TIMEOUT)
+
+
+def count_measurements(db_url):
+    with create_engine('sqlite:///' + db_url).connect() as connection:
+        return connection.execute(text('SELECT count(*) FROM measurement')).scalar()
+
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+    DBHandler.init(Base, db_url)
+    broker = StandInBroker().start()
+    port = broker.port
+    process = Process(target=run_client, args=(db_url, port, 0, 1))
+    process.start()
+    time.sleep(1)
+    run_fleet(port, nodes, 1)
+
+    # broker restart, client reconnects (after Default.RECONNECT_AFTER) and subscribes again
+    broker.stop()
+    time.sleep(1)
+    broker = StandInBroker(port).start()
+    started_at = time.perf_counter()
+
+    while broker.subscription_count < nodes * 2 + 1 and time.perf_counter() - started_at < TIMEOUT:
+        time.sleep(0.05)
+
+    print("broker restart:\t{} subscription/s restored in {:.2f}s".format(broker.subscription_count,
+                                                                         time.perf_counter() - started_at))
+    send_measurements(port, nodes)
+    time.sleep(2)
+    stop_client(process)
+    assert count_measurements(db_url) == nodes * 2, "measurements after broker restart are lost"
+
+    # client restart, routes are loaded from database
+    process = Process(target=run_client, args=(db_url, port, 0, 1))
+    process.start()
+    time.sleep(1)
+    config_requests, answers, elapsed = count_config_requests(port, nodes)
+    send_measurements(port, nodes)
+    time.sleep(2)
+    stop_client(process)
+    broker.stop()
+
+    print("client restart:\t{} node/s answered in {:.2f}s, {} config request/s".format(answers, elapsed,
+                                                                                    config_requests))
+    assert answers == nodes and config_requests == 0
+    assert count_measurements(db_url) == nodes * 3, "measurements after client restart are lost"
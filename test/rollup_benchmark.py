@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+
+
+"""
+Writes D days of 5 second temperature readings (batches of 100, like MQTT client does) and
+compares reading whole range as raw values and as rollups with point budget (like chart
+of node page would).
+Run from project's root folder:
+    python -m test.rollup_benchmark [D] [max_points]
+"""
+
+
+PERIOD = 5
+BATCH_SIZE = 100
+
+
+if __name__ == '__main__':
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    max_points = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    DBHandler.init(Base, os.path.join(tempfile.mkdtemp(), 'node_data.db'))
+    handler = DBHandler.get_instance()
+    handler.new_node_config('node-1', [{
+        'type':         'senzor',
+        'id_used':      '1',
+        'name':         'DHT22',
+        'value_types':  [{'value_type': 'temperatura', 'measuring_unit': 'C', 'measurement_period': str(PERIOD)}]
+    }])
+    component_settings_id = handler.get_node_routes('node-1')[(1, 'C')]
+    first_measured_at = datetime(2018, 1, 1)
+    count = days * 24 * 60 * 60 // PERIOD
+
+    started_at = time.perf_counter()
+
+    for i in range(0, count, BATCH_SIZE):
+        handler.new_data_batch([
+            (component_settings_id, 20 + (j % 100) / 10,
+             (first_measured_at + timedelta(seconds=j * PERIOD)).strftime("%Y-%m-%d %H:%M:%S"))
+            for j in range(i, min(i + BATCH_SIZE, count))])
+
+    print("{} values written in {:.2f}s (with rollups)".format(count, time.perf_counter() - started_at))
+
+    from_ts = int(first_measured_at.timestamp())
+    to_ts = from_ts + days * 24 * 60 * 60
+
+    started_at = time.perf_counter()
+    samples = handler.get_samples(component_settings_id, from_ts, to_ts)
+    print("raw values:\t{} point/s in {:.2f}ms".format(len(samples), (time.perf_counter() - started_at) * 1000))
+
+    started_at = time.perf_counter()
+    resolution, points = handler.get_rollups(component_settings_id, from_ts, to_ts, max_points)
+    print("rollups:\t{} point/s ({}s resolution) in {:.2f}ms"
+          .format(len(points), resolution, (time.perf_counter() - started_at) * 1000))
+
+    assert len(points) <= max_points or resolution == 60 * 60 * 24
+    assert sum(point[4] for point in points) == len(samples)
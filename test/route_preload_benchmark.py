@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.helpers import build_node_config, record_statements
+
+
+"""
+Compares loading routes of N registered nodes (what MQTT client does at startup) node by
+node with DBHandler.get_node_routes and with DBHandler.get_all_node_routes, counting SQL
+statements and time of both.
+Run from project's root folder:
+    python -m test.route_preload_benchmark [N]
+"""
+
+
+# routes of all nodes must be fetched with node query and one query for all settings
+MAX_STATEMENTS = 2
+
+
+def measure(name, function):
+    result, statements, elapsed = record_statements(function)
+    print("{}:\t{} statement/s, {:.2f}ms".format(name, len(statements), elapsed * 1000))
+
+    return result, len(statements)
+
+
+def load_node_by_node(handler):
+    return {node_id: handler.get_node_routes(node_id) for node_id in handler.get_nodes()['nodes']}
+
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+
+    DBHandler.init(Base, db_url)
+
+    for i in range(nodes):
+        DBHandler.get_instance().new_node_config('node-{}'.format(i), build_node_config(5))
+
+    # new handler (and session) so nothing is already loaded in session
+    DBHandler.init(Base, db_url)
+    handler = DBHandler.get_instance()
+
+    expected, node_by_node_statements = measure('node by node', lambda: load_node_by_node(handler))
+    routes, bulk_statements = measure('bulk', handler.get_all_node_routes)
+
+    assert routes == expected
+    assert len(routes) == nodes
+    assert len(routes['node-1']) == 10
+    assert bulk_statements <= MAX_STATEMENTS, "too many statements: {}".format(bulk_statements)
@@ -0,0 +1,317 @@
+import socket
+import struct
+import sys
+from threading import Lock, Thread
+
+
+"""
+Minimal MQTT 3.1.1 broker for local tests (instead of Mosquitto): CONNECT, SUBSCRIBE,
+UNSUBSCRIBE, PUBLISH (QoS 0 and 1), PINGREQ and DISCONNECT. Topic filters can have '+' and
+'#' wildcards, and shared subscriptions ($share/<group>/<filter>) deliver each message to
+one member of group (round robin). There are no sessions, retained messages or wills.
+Run from project's root folder:
+    python -m test.stand_in_broker [port]
+"""
+
+
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+
+def matches(topic_filter, topic):
+    filter_levels = topic_filter.split('/')
+    topic_levels = topic.split('/')
+
+    for i, level in enumerate(filter_levels):
+        if level == '#':
+            return True
+        if i >= len(topic_levels) or (level != '+' and level != topic_levels[i]):
+            return False
+
+    return len(filter_levels) == len(topic_levels)
+
+
+class Connection:
+    def __init__(self, broker, sock):
+        self.broker = broker
+        self.sock = sock
+        self.client_id = ''
+        self.__write_lock = Lock()
+        self.__packet_id = 0
+
+    def send(self, packet_type, flags, body):
+        header = bytes([packet_type << 4 | flags]) + Connection.encode_length(len(body))
+
+        with self.__write_lock:
+            try:
+                self.sock.sendall(header + body)
+            except OSError:
+                pass
+
+    def publish(self, topic, payload, qos):
+        encoded_topic = topic.encode('utf-8')
+        body = struct.pack('!H', len(encoded_topic)) + encoded_topic
+
+        if qos > 0:
+            with self.__write_lock:
+                self.__packet_id = self.__packet_id % 65535 + 1
+                packet_id = self.__packet_id
+            body += struct.pack('!H', packet_id)
+
+        self.send(PUBLISH, qos << 1, body + payload)
+
+    def serve(self):
+        try:
+            while True:
+                packet = self.__read_packet()
+
+                if packet is None or not self.__handle(*packet):
+                    break
+        finally:
+            self.broker.remove(self)
+            self.sock.close()
+
+    def __handle(self, packet_type, flags, body):
+        if packet_type == CONNECT:
+            protocol_size = struct.unpack_from('!H', body, 0)[0]
+            client_id_offset = 2 + protocol_size + 4
+            client_id_size = struct.unpack_from('!H', body, client_id_offset)[0]
+            self.client_id = body[client_id_offset + 2:client_id_offset + 2 + client_id_size].decode('utf-8')
+            self.send(CONNACK, 0, b'\x00\x00')
+        elif packet_type == PUBLISH:
+            qos = (flags >> 1) & 3
+            topic_size = struct.unpack_from('!H', body, 0)[0]
+            topic = body[2:2 + topic_size].decode('utf-8')
+            offset = 2 + topic_size
+
+            if qos > 0:
+                packet_id = body[offset:offset + 2]
+                offset += 2
+                self.send(PUBACK, 0, packet_id)
+
+            self.broker.route(topic, body[offset:], qos)
+        elif packet_type == SUBSCRIBE:
+            packet_id = body[:2]
+            offset = 2
+            granted = list()
+
+            while offset < len(body):
+                filter_size = struct.unpack_from('!H', body, offset)[0]
+                topic_filter = body[offset + 2:offset + 2 + filter_size].decode('utf-8')
+                qos = min(body[offset + 2 + filter_size], 1)
+                offset += 3 + filter_size
+                self.broker.subscribe(self, topic_filter, qos)
+                granted.append(qos)
+
+            self.send(SUBACK, 0, packet_id + bytes(granted))
+        elif packet_type == UNSUBSCRIBE:
+            offset = 2
+
+            while offset < len(body):
+                filter_size = struct.unpack_from('!H', body, offset)[0]
+                self.broker.unsubscribe(self, body[offset + 2:offset + 2 + filter_size].decode('utf-8'))
+                offset += 2 + filter_size
+
+            self.send(UNSUBACK, 0, body[:2])
+        elif packet_type == PINGREQ:
+            self.send(PINGRESP, 0, b'')
+        elif packet_type == DISCONNECT:
+            return False
+
+        # PUBACK from clients is ignored (messages aren't sent again)
+        return True
+
+    def __read_packet(self):
+        first = self.__read(1)
+
+        if first is None:
+            return None
+
+        length = 0
+        multiplier = 1
+
+        while True:
+            byte = self.__read(1)
+
+            if byte is None:
+                return None
+
+            length += (byte[0] & 127) * multiplier
+            multiplier *= 128
+
+            if byte[0] & 128 == 0:
+                break
+
+        body = self.__read(length) if length > 0 else b''
+
+        if body is None:
+            return None
+
+        return first[0] >> 4, first[0] & 15, body
+
+    def __read(self, size):
+        data = b''
+
+        while len(data) < size:
+            try:
+                chunk = self.sock.recv(size - len(data))
+            except OSError:
+                return None
+
+            if len(chunk) == 0:
+                return None
+
+            data += chunk
+
+        return data
+
+    @staticmethod
+    def encode_length(length):
+        encoded = b''
+
+        while True:
+            byte = length % 128
+            length //= 128
+
+            if length > 0:
+                byte |= 128
+
+            encoded += bytes([byte])
+
+            if length == 0:
+                return encoded
+
+
+class StandInBroker:
+    def __init__(self, port=0):
+        """
+        :param port:    0 for any free port (see port property)
+        """
+
+        self.__server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__server.bind(('127.0.0.1', port))
+        self.__server.listen(64)
+        self.__lock = Lock()
+        # list of (connection, topic_filter, qos)
+        self.__subscriptions = list()
+        # group -> list of (connection, topic_filter, qos), and index of next member
+        self.__shared = dict()
+        self.__next_member = dict()
+        self.__connections = list()
+        self.published = 0
+
+    @property
+    def port(self):
+        return self.__server.getsockname()[1]
+
+    def start(self):
+        Thread(target=self.__accept, name='stand-in-broker', daemon=True).start()
+
+        return self
+
+    def stop(self):
+        # shutdown wakes up thread which waits in accept (close alone doesn't)
+        try:
+            self.__server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        self.__server.close()
+
+        with self.__lock:
+            connections = list(self.__connections)
+
+        for connection in connections:
+            try:
+                connection.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    @property
+    def subscription_count(self):
+        with self.__lock:
+            return len(self.__subscriptions) + sum(len(members) for members in self.__shared.values())
+
+    def subscribe(self, connection, topic_filter, qos):
+        with self.__lock:
+            if topic_filter.startswith('$share/'):
+                group, shared_filter = topic_filter[len('$share/'):].split('/', 1)
+                members = self.__shared.setdefault((group, shared_filter), list())
+                members[:] = [member for member in members if member[0] is not connection]
+                members.append((connection, shared_filter, qos))
+            else:
+                self.__subscriptions = [subscription for subscription in self.__subscriptions
+                                        if subscription[0] is not connection or subscription[1] != topic_filter]
+                self.__subscriptions.append((connection, topic_filter, qos))
+
+    def unsubscribe(self, connection, topic_filter):
+        with self.__lock:
+            self.__subscriptions = [subscription for subscription in self.__subscriptions
+                                    if subscription[0] is not connection or subscription[1] != topic_filter]
+
+    def remove(self, connection):
+        with self.__lock:
+            self.__subscriptions = [subscription for subscription in self.__subscriptions
+                                    if subscription[0] is not connection]
+
+            for key in self.__shared.keys():
+                self.__shared[key] = [member for member in self.__shared[key] if member[0] is not connection]
+
+            if connection in self.__connections:
+                self.__connections.remove(connection)
+
+    def route(self, topic, payload, qos):
+        # each connection gets message once, even if more of its filters match
+        receivers = dict()
+
+        with self.__lock:
+            self.published += 1
+
+            for connection, topic_filter, subscription_qos in self.__subscriptions:
+                if matches(topic_filter, topic):
+                    receivers[connection] = max(receivers.get(connection, 0), min(qos, subscription_qos))
+
+            for key, members in self.__shared.items():
+                if len(members) > 0 and matches(key[1], topic):
+                    index = self.__next_member.get(key, 0) % len(members)
+                    self.__next_member[key] = index + 1
+                    connection, topic_filter, subscription_qos = members[index]
+                    receivers[connection] = max(receivers.get(connection, 0), min(qos, subscription_qos))
+
+        for connection, receiver_qos in receivers.items():
+            connection.publish(topic, payload, receiver_qos)
+
+    def __accept(self):
+        while True:
+            try:
+                sock, address = self.__server.accept()
+            except OSError:
+                return
+
+            connection = Connection(self, sock)
+
+            with self.__lock:
+                self.__connections.append(connection)
+
+            Thread(target=connection.serve, daemon=True).start()
+
+
+if __name__ == '__main__':
+    broker = StandInBroker(int(sys.argv[1]) if len(sys.argv) > 1 else 1883).start()
+    print("Stand-in broker running at 127.0.0.1:{}".format(broker.port))
+
+    try:
+        while True:
+            input()
+    except (KeyboardInterrupt, EOFError):
+        broker.stop()
@@ -0,0 +1,130 @@
+import os
+import queue
+import sys
+import tempfile
+import time
+from datetime import datetime
+from multiprocessing import Event, Process, Queue
+from threading import Thread
+
+from sqlalchemy.exc import OperationalError
+
+from shared.data.engine import StorageProfile
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.helpers import build_node_config
+
+
+"""
+One writer process (like MQTT client) writes measurements in batches while N reader
+threads (like web server) read them from same node_data database, first with SQLite's
+defaults (rollback journal) and then with default storage profile (WAL). Prints written
+batches, reads and "database is locked" errors for each profile.
+Run from project's root folder:
+    python -m test.storage_profile_benchmark [N] [seconds]
+"""
+
+
+BATCH_SIZE = 100
+READ_LIMIT = 500
+# seconds to wait for writer process besides benchmark's own time
+TIMEOUT = 30
+
+PROFILES = [
+    ('rollback journal', StorageProfile(journal_mode='delete', synchronous='full', busy_timeout=0)),
+    ('default profile', StorageProfile())
+]
+
+
+def write(db_url, profile, component_settings_id, seconds, ready, results):
+    written = 0
+    failed = 0
+
+    try:
+        # schema is created by parent, but handler still checks it, so readers start only
+        # after it's opened (with busy_timeout=0 check would fail while they read)
+        DBHandler.init(Base, db_url, profile)
+        handler = DBHandler.get_instance()
+        ready.set()
+        stop_at = time.monotonic() + seconds
+
+        while time.monotonic() < stop_at:
+            measured_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            batch = [(component_settings_id, float(i), measured_at) for i in range(BATCH_SIZE)]
+
+            if handler.new_data_batch(batch):
+                written += 1
+            else:
+                failed += 1
+    except Exception as e:
+        print("writer stopped: {}".format(e))
+        failed += 1
+    finally:
+        # parent always gets result, even if writer failed
+        ready.set()
+        results.put((written, failed))
+
+
+def read(handler, stop_at, results):
+    reads = 0
+    failed = 0
+
+    while time.monotonic() < stop_at:
+        try:
+            list(handler.get_data(True, only_not_confirmed=False, limit=READ_LIMIT))
+            handler.get_node_info('node-1')
+            reads += 1
+        except OperationalError:
+            failed += 1
+
+    results.append((reads, failed))
+
+
+def run(profile, readers, seconds):
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+    # schema is created before writer and readers start
+    DBHandler.init(Base, db_url, profile)
+    handler = DBHandler.get_instance()
+    handler.new_node_config('node-1', build_node_config())
+    component_settings_id = handler.get_node_routes('node-1')[(1, 'C')]
+
+    writer_ready = Event()
+    writer_results = Queue()
+    writer = Process(target=write, args=(db_url, profile, component_settings_id, seconds, writer_ready,
+                                         writer_results))
+    writer.start()
+    writer_ready.wait(TIMEOUT)
+
+    reader_results = list()
+    reader_threads = [Thread(target=read, args=(handler, time.monotonic() + seconds, reader_results))
+                      for i in range(readers)]
+
+    for reader_thread in reader_threads:
+        reader_thread.start()
+    for reader_thread in reader_threads:
+        reader_thread.join()
+
+    try:
+        written, write_failed = writer_results.get(timeout=TIMEOUT)
+    except queue.Empty:
+        written, write_failed = 0, 0
+
+    writer.join(TIMEOUT)
+
+    if writer.exitcode != 0:
+        print("writer process crashed (exit code {})".format(writer.exitcode))
+
+    reads = sum(result[0] for result in reader_results)
+    read_failed = sum(result[1] for result in reader_results)
+
+    return written, write_failed, reads, read_failed
+
+
+if __name__ == '__main__':
+    readers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    for name, profile in PROFILES:
+        written, write_failed, reads, read_failed = run(profile, readers, seconds)
+        print("{}:\t{} batch/es written ({} locked), {} read/s by {} reader thread/s ({} locked)"
+              .format(name, written, write_failed, reads, readers, read_failed))
@@ -0,0 +1,60 @@
+import os
+import signal
+import sys
+import tempfile
+import time
+from multiprocessing import Process
+
+from sqlalchemy import create_engine, text
+
+from shared.data.models.node_data import Base
+from shared.data.handlers.node_data import DBHandler
+from test.partition_test import run_client, run_fleet, TIMEOUT
+from test.stand_in_broker import StandInBroker
+
+
+"""
+Registers N simulated nodes (each sends M measurements) with client in 'theme' and in
+'wildcard' subscription mode, checks that all measurements are written in both modes and
+prints number of subscriptions broker has to keep and time needed for registration.
+Run from project's root folder:
+    python -m test.subscription_mode_test [N] [M]
+"""
+
+
+def run(mode, nodes, measurements):
+    db_url = os.path.join(tempfile.mkdtemp(), 'node_data.db')
+    DBHandler.init(Base, db_url)
+    broker = StandInBroker().start()
+    wildcard_topic = '+/+/+' if mode == 'wildcard' else None
+    process = Process(target=run_client, args=(db_url, broker.port, 0, 1, wildcard_topic))
+    process.start()
+    time.sleep(1)
+
+    started_at = time.perf_counter()
+    run_fleet(broker.port, nodes, measurements)
+    elapsed = time.perf_counter() - started_at
+    time.sleep(2)
+    # fleet is disconnected, so only client's subscriptions are left
+    subscriptions = broker.subscription_count
+
+    os.kill(process.pid, signal.SIGINT)
+    process.join(TIMEOUT)
+    broker.stop()
+
+    with create_engine('sqlite:///' + db_url).connect() as connection:
+        measurement_count = connection.execute(text('SELECT count(*) FROM measurement')).scalar()
+
+    assert measurement_count == nodes * measurements, "{}: {} measurement/s written".format(mode, measurement_count)
+
+    return subscriptions, elapsed
+
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    measurements = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    for mode in ('theme', 'wildcard'):
+        subscriptions, elapsed = run(mode, nodes, measurements)
+        print("{}:\t{} subscription/s on broker, {} node/s registered and measured in {:.2f}s"
+              .format(mode, subscriptions, nodes, elapsed))
@@ -0,0 +1,87 @@
+import sys
+import time
+from threading import Thread
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import urlopen
+
+
+"""
+Sends requests to running web server (app.py or wsgi.py) from C threads for S seconds to
+each of '/', '/nodes/<node_id>' and '/api/get_node_data', and prints requests per second
+and latency percentiles of each path.
+Run from project's root folder:
+    python -m test.web_load_test <base_url> <api_key> <node_id> [C] [S]
+example:
+    python -m test.web_load_test http://localhost:5000 <api_key> node-1 8 10
+"""
+
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DURATION = 10
+# measurements per get_node_data request
+DATA_LIMIT = 500
+
+
+def worker(url, stop_at, latencies, errors):
+    while time.perf_counter() < stop_at:
+        started_at = time.perf_counter()
+
+        try:
+            with urlopen(url) as resp:
+                resp.read()
+        except HTTPError as e:
+            errors.append(e.code)
+            continue
+        except OSError as e:
+            errors.append(str(e))
+            continue
+
+        latencies.append(time.perf_counter() - started_at)
+
+
+def percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run(url, concurrency, duration):
+    latencies = list()
+    errors = list()
+    stop_at = time.perf_counter() + duration
+    threads = [Thread(target=worker, args=(url, stop_at, latencies, errors)) for i in range(concurrency)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+
+    return latencies, errors
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 4:
+        print("Missing arguments: <base_url> <api_key> <node_id> [concurrency] [seconds]")
+        sys.exit(1)
+
+    base_url = sys.argv[1].rstrip('/')
+    concurrency = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_CONCURRENCY
+    duration = int(sys.argv[5]) if len(sys.argv) > 5 else DEFAULT_DURATION
+    paths = [
+        '/',
+        '/nodes/' + quote(sys.argv[3]),
+        # collector's download, confirmed measurements too so there's always something to send
+        '/api/get_node_data?api_key={}&only_not_confirmed=false&limit={}'.format(quote(sys.argv[2]), DATA_LIMIT)
+    ]
+
+    for path in paths:
+        latencies, errors = run(base_url + path, concurrency, duration)
+
+        if len(latencies) == 0:
+            print("{}:\tno successful requests, errors: {}".format(path.split('?')[0], set(errors)))
+            continue
+
+        print("{}:\t{:.1f} req/s, p50 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms, errors: {}"
+              .format(path.split('?')[0], len(latencies) / duration, percentile(latencies, 50) * 1000,
+                      percentile(latencies, 99) * 1000, latencies[-1] * 1000, len(errors)))
@@ -1,5 +1,5 @@
 from shared.utils.config import ConfigRestriction
-from shared.utils.validator import is_not_empty, is_boolean, is_integer, is_db,\
+from shared.utils.validator import is_boolean, is_integer, is_db, is_bin,\
     is_log, is_one_of_values, is_file_size, is_time_after, is_time_at
 
 
@@ -25,13 +25,29 @@ __rotate = ConfigRestriction(False, is_boolean)\
 __max_files = ConfigRestriction(False, is_integer)\
     .add_dependence('rotate', 'true')
 __print_log = ConfigRestriction(False, is_boolean)
-__print_level = ConfigRestriction(False, is_not_empty)\
+__print_level = ConfigRestriction(False, is_one_of_values, 'info', 'warning', 'error')\
     .add_dependence('print_log', 'true')
-__write_level = ConfigRestriction(False, is_not_empty)\
+__write_level = ConfigRestriction(False, is_one_of_values, 'info', 'warning', 'error')\
     .add_dependence('file_path')
+__has_buffer = ConfigRestriction(False, is_boolean)\
+    .add_dependence('file_path')
+__max_buffer_size = ConfigRestriction(False, is_file_size)\
+    .add_dependence('has_buffer', 'true')
+__flush_interval = ConfigRestriction(False, is_integer)\
+    .add_dependence('has_buffer', 'true')
 # section Database
 __node_data_path = ConfigRestriction(True, is_db)
 __accounts_path = ConfigRestriction(True, is_db)
+__journal_mode = ConfigRestriction(False, is_one_of_values, 'delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+__synchronous = ConfigRestriction(False, is_one_of_values, 'off', 'normal', 'full', 'extra')
+__cache_size = ConfigRestriction(False, is_file_size)
+__mmap_size = ConfigRestriction(False, is_file_size)
+__busy_timeout = ConfigRestriction(False, is_integer)
+__pool_class = ConfigRestriction(False, is_one_of_values, 'default', 'queue', 'null', 'static', 'singleton')
+__auto_vacuum = ConfigRestriction(False, is_one_of_values, 'none', 'full', 'incremental')
+__latest_values_path = ConfigRestriction(False, is_bin)
+__data_versions_path = ConfigRestriction(False, is_bin)
+__partition_count = ConfigRestriction(False, is_integer)
 # endregion
 
 CONFIG_STRUCTURE = {
@@ -45,10 +61,23 @@ CONFIG_STRUCTURE = {
         'max_files':            __max_files,
         'print_log':            __print_log,
         'print_level':          __print_level,
-        'write_level':          __write_level
+        'write_level':          __write_level,
+        'has_buffer':           __has_buffer,
+        'max_buffer_size':      __max_buffer_size,
+        'flush_interval':       __flush_interval
     },
     'Database': {
         'node_data_path': __node_data_path,
-        'accounts_path': __accounts_path
+        'accounts_path': __accounts_path,
+        'journal_mode': __journal_mode,
+        'synchronous': __synchronous,
+        'cache_size': __cache_size,
+        'mmap_size': __mmap_size,
+        'busy_timeout': __busy_timeout,
+        'pool_class': __pool_class,
+        'auto_vacuum': __auto_vacuum,
+        'latest_values_path': __latest_values_path,
+        'data_versions_path': __data_versions_path,
+        'partition_count': __partition_count
     }
 }
@@ -1,11 +1,17 @@
 from datetime import datetime
+from hashlib import sha256
+from hmac import compare_digest
 from string import ascii_letters, digits
+from threading import Lock
 import random
+import time
 
-from sqlalchemy import Column, Integer, String, create_engine
+from sqlalchemy import Column, Integer, String
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from shared.data.engine import create_sqlite_engine
+
 
 Base = declarative_base()
 
@@ -32,21 +38,33 @@ class Account(Base):
 
 class DBHandler:
     __instance = None
+    # seconds after which cached API keys are read from database again (accounts can be
+    # changed by admin app, which runs in other process)
+    API_KEY_TTL = 60
 
     @staticmethod
-    def init(base, db_url):
-        DBHandler.__instance = DBHandler(base, db_url)
+    def init(base, db_url, profile=None):
+        DBHandler.__instance = DBHandler(base, db_url, profile)
 
     @staticmethod
     def get_instance():
         return DBHandler.__instance
 
-    def __init__(self, base, db_url):
-        self.__engine = create_engine('sqlite:///' + db_url)
+    def __init__(self, base, db_url, profile=None):
+        self.__engine = create_sqlite_engine(db_url, profile)
         self.__session = scoped_session(sessionmaker(bind=self.__engine))
 
         base.metadata.create_all(self.__engine)
 
+        # sha256(api_key) -> (api_key, username), only collectors have API keys
+        self.__api_keys = None
+        self.__api_keys_loaded_at = 0
+        self.__api_keys_lock = Lock()
+
+    def remove_session(self):
+        # session of current thread is closed (web server calls it at the end of each request)
+        self.__session.remove()
+
     def get_accounts(self):
         accounts = self.__session.query(Account).all()
 
@@ -67,6 +85,7 @@ class DBHandler:
 
             self.__session.add(account)
             self.__session.commit()
+            self.invalidate_api_keys()
 
             return True, "User '{}' with role '{}' is successfully added to database{}".format(username, role, message)
 
@@ -80,6 +99,7 @@ class DBHandler:
                 account.api_key = DBHandler.__generate_api_key(size)
                 account.updated_at = DBHandler.__get_str_formatted_datetime()
                 self.__session.commit()
+                self.invalidate_api_keys()
 
                 return True, "API key is assigned to '{}'".format(username)
             elif account.role == 'admin':
@@ -106,6 +126,9 @@ class DBHandler:
                 else:
                     account.api_key = None
 
+                self.__session.commit()
+                self.invalidate_api_keys()
+
                 return True, "User '{}' now has role '{}'{}".format(username, role, message)
 
         return False, "Account with username '{}' doesn't exist".format(username)
@@ -116,21 +139,48 @@ class DBHandler:
         if account is not None:
             self.__session.delete(account)
             self.__session.commit()
+            self.invalidate_api_keys()
 
             return True, "User '{}' is successfully deleted".format(username)
 
         return False, "Account with username '{}' doesn't exist".format(username)
 
     def is_valid_api_key(self, api_key):
-        # only collector can have api key
-        accounts = self.__session.query(Account).filter(Account.role == 'collector').all()
+        # keys are looked up by their hash and then compared in constant time, so response
+        # time doesn't tell how much of the key is right
+        api_keys = self.__get_api_keys()
+        found = api_keys.get(DBHandler.__hash_api_key(api_key))
 
-        for account in accounts:
-            if account.api_key == api_key:
-                return True, "'{}'\'s API key found".format(account.username)
+        if found is not None and compare_digest(found[0].encode(), api_key.encode()):
+            return True, "'{}'\'s API key found".format(found[1])
 
         return False, "Given API key doesn't exist"
 
+    def invalidate_api_keys(self):
+        # API keys will be read from database on next check
+        with self.__api_keys_lock:
+            self.__api_keys = None
+
+    def __get_api_keys(self):
+        with self.__api_keys_lock:
+            if self.__api_keys is None or time.monotonic() - self.__api_keys_loaded_at > DBHandler.API_KEY_TTL:
+                api_keys = dict()
+                # only collector can have api key
+                accounts = self.__session.query(Account.username, Account.api_key)\
+                    .filter(Account.role == 'collector', Account.api_key.isnot(None)).all()
+
+                for username, account_api_key in accounts:
+                    api_keys[DBHandler.__hash_api_key(account_api_key)] = (account_api_key, username)
+
+                self.__api_keys = api_keys
+                self.__api_keys_loaded_at = time.monotonic()
+
+            return self.__api_keys
+
+    @staticmethod
+    def __hash_api_key(api_key):
+        return sha256(api_key.encode()).hexdigest()
+
     @staticmethod
     def __get_str_formatted_datetime():
         return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -1,6 +1,9 @@
 from shared.utils.log import Logger
 from shared.utils.object_holder import ObjectHolder
 from shared.utils.config import ConfigManager, ConfigCache
+from shared.data.engine import StorageProfile
+from shared.data.latest_values import LatestValues, PartitionedLatestValues
+from shared.data.data_versions import DataVersions, PartitionedDataVersions
 from shared.data.models.node_data import Base as NodeBase
 from shared.data.handlers.node_data import DBHandler as NodeHandler
 
@@ -12,9 +15,18 @@ from web.data.accounts import DBHandler as AccountHandler
 logger = ObjectHolder()
 node_db_handler = ObjectHolder()
 account_db_handler = ObjectHolder()
+latest_values = ObjectHolder()
+data_versions = ObjectHolder()
 
 
-def load(cwd):
+def load(cwd, read_only=False):
+    """
+    :param cwd:         folder with web config (or path of config file)
+    :param read_only:   node_data database is opened read only (only confirming data writes
+                        to it), for production server
+    :return:
+    """
+
     config_manager = ConfigManager().get_instance()
     config_cache = ConfigCache.get_instance()
     result = dict()
@@ -30,9 +42,16 @@ def load(cwd):
         filename = ''
         depends_on = Logger.DEPENDS_ON_NOTHING
         max_file_size = ''
+        time_after = ''
+        time_at = ''
         rotate = False
         max_files = 1
         print_log = False   # set False as default
+        print_level = Logger.INFO
+        write_level = Logger.INFO
+        has_buffer = False
+        max_buffer_size = ''
+        flush_interval = Logger.DEFAULT_FLUSH_INTERVAL
 
         if 'file_path' in config.keys():
             filename = config['file_path']
@@ -44,31 +63,72 @@ def load(cwd):
                     depends_on = Logger.DEPENDS_ON_TIME
                 if 'max_file_size' in config.keys():
                     max_file_size = config['max_file_size']
+                if 'time_after' in config.keys():
+                    time_after = config['time_after']
+                if 'time_at' in config.keys():
+                    time_at = config['time_at']
                 if 'rotate' in config.keys():
                     if config['rotate'] == 'true':
                         rotate = True
                     else:
                         rotate = False
                     max_files = config['max_files']
+            if 'has_buffer' in config.keys() and config['has_buffer'] == 'true':
+                has_buffer = True
+
+                if 'max_buffer_size' in config.keys():
+                    max_buffer_size = config['max_buffer_size']
+                if 'flush_interval' in config.keys():
+                    flush_interval = int(config['flush_interval'])
+            if 'write_level' in config.keys():
+                write_level = Logger.LEVELS[config['write_level']]
         if 'print_log' in config.keys():
             if config['print_log'] == 'true':
                 print_log = True
             else:
                 print_log = False
 
-        logger_obj = Logger(WEB_NAME, filename, depends_on, max_file_size,
-                            rotate=rotate, max_files=max_files, print_log=print_log)
+            if 'print_level' in config.keys():
+                print_level = Logger.LEVELS[config['print_level']]
+
+        logger_obj = Logger(WEB_NAME, filename, depends_on, max_file_size, time_after, time_at,
+                            rotate=rotate, max_files=max_files, has_buffer=has_buffer,
+                            max_buffer_size=max_buffer_size, flush_interval=flush_interval,
+                            print_log=print_log, print_level=print_level, write_level=write_level)
         logger.hold(logger_obj)
         # endregion
 
-        NodeHandler.init(NodeBase, config['node_data_path'])
+        # same storage profile (WAL, pragmas, pool) is used for all databases
+        storage_profile = StorageProfile.from_config(config)
+        NodeHandler.init(NodeBase, config['node_data_path'], storage_profile, read_only)
         node_db_handler_obj = NodeHandler.get_instance()
         node_db_handler.hold(node_db_handler_obj)
 
-        AccountHandler.init(AccountBase, config['accounts_path'])
+        AccountHandler.init(AccountBase, config['accounts_path'], storage_profile)
         account_db_handler_obj = AccountHandler.get_instance()
         account_db_handler.hold(account_db_handler_obj)
 
+        # each MQTT client which shares nodes (partition) writes its own files
+        partition_count = 1
+
+        if 'partition_count' in config.keys():
+            partition_count = max(1, int(config['partition_count']))
+
+        # newest values are written by MQTT client, web server only reads them
+        if 'latest_values_path' in config.keys():
+            if partition_count > 1:
+                latest_values.hold(PartitionedLatestValues(config['latest_values_path'], partition_count))
+            else:
+                LatestValues.init(config['latest_values_path'])
+                latest_values.hold(LatestValues.get_instance())
+        # versions of data are bumped by MQTT client too, they're used for HTTP caching
+        if 'data_versions_path' in config.keys():
+            if partition_count > 1:
+                data_versions.hold(PartitionedDataVersions(config['data_versions_path'], partition_count))
+            else:
+                DataVersions.init(config['data_versions_path'])
+                data_versions.hold(DataVersions.get_instance())
+
         return True, result
     else:
         return False, None
@@ -1,15 +1,19 @@
 import os
+from datetime import datetime
 
 from flask import Flask, render_template, request
 
-from web.loader import load, logger, node_db_handler, account_db_handler
+from web.loader import load, logger, node_db_handler, account_db_handler, latest_values
 from web.server.blueprints.service import api
+from web.server.caching import cached_response
 
 
-__config_path = os.getcwd().split('\\')
-__config_path = __config_path[:__config_path.index('web') + 1]
-__config_location = '\\'.join(__config_path)
-__ok, __info = load(__config_location)
+# production server (wsgi.py) loads config itself, before it imports app
+if node_db_handler.access() is None:
+    __config_path = os.getcwd().split('\\')
+    __config_path = __config_path[:__config_path.index('web') + 1]
+    __config_location = '\\'.join(__config_path)
+    __ok, __info = load(__config_location)
 
 
 app = Flask(__name__)
@@ -17,12 +21,19 @@ app.register_blueprint(api, url_prefix='/api')
 app.secret_key = os.urandom(12)
 
 
+@app.teardown_appcontext
+def remove_sessions(exception=None):
+    # each request (thread) gets new database session, so nothing is shared between requests
+    node_db_handler.access().remove_session()
+    account_db_handler.access().remove_session()
+
+
 @app.route('/', methods=['GET', 'POST'])
 def main():
     if request.method == 'GET':
-        data = node_db_handler.access().get_nodes()
-
-        return render_template('index.html', **data)
+        # list of nodes is rendered again only when data changed
+        return cached_response(('index',), None,
+                               lambda: render_template('index.html', **node_db_handler.access().get_nodes()))
     else:
         node_id = request.form['node_id']
 
@@ -45,11 +56,40 @@ def main():
 
 @app.route('/nodes/<string:id>', methods=['GET'])
 def node_info(id):
-    logger.access().warning("'{}' is trying to access information about node '{}'".format(request.remote_addr, id))
+    logger.access().warning("'{}' is trying to access information about node '{}'", request.remote_addr, id)
+
+    return cached_response(('node', id), id, lambda: __render_node_info(id))
+
+
+def __render_node_info(id):
     ok, data = node_db_handler.access().get_node_info(id)
+
+    if ok:
+        __add_latest_values(data)
+
     return render_template('node.html', **data)
 
 
+def __add_latest_values(data):
+    # newest values are read from shared file (MQTT client writes them), not from database
+    values = dict()
+
+    if latest_values.access() is not None:
+        values = latest_values.access().get_all()
+
+    for component in data['components']:
+        for value_type in component['value_types']:
+            # value type without settings has no component_settings_id (and no values)
+            latest = values.get(value_type.get('component_settings_id'))
+
+            if latest is None:
+                value_type['latest_value'] = '-'
+                value_type['latest_at'] = '-'
+            else:
+                value_type['latest_value'] = latest[0]
+                value_type['latest_at'] = datetime.fromtimestamp(latest[1]).strftime("%Y-%m-%d %H:%M:%S")
+
+
 if __name__ == '__main__':
     # port 8181 default
     app.debug = False
@@ -1,6 +1,12 @@
-from flask import Blueprint, render_template, request, json, Response
+from datetime import datetime
 
-from web.loader import logger, node_db_handler, account_db_handler
+from flask import Blueprint, render_template, request, json, Response, stream_with_context
+
+from shared.utils.converter import to_seconds
+from shared.utils.validator import is_integer, is_boolean, is_time_after
+from web.loader import logger, node_db_handler, account_db_handler, latest_values
+from web.server import encoding
+from web.server.caching import cached_response
 
 
 api = Blueprint('api', __name__)
@@ -13,23 +19,245 @@ def show_calls():
 
 @api.route('/get_node_data')
 def get_node_data():
-    logger.access().warning("'{}' is trying to access node data".format(request.remote_addr))
-    api_key = request.args.get('api_key', '')
+    logger.access().warning("'{}' is trying to access node data", request.remote_addr)
+    ok, resp = __verify_api_key()
+
+    if ok:
+        ok, params = __read_data_params()
+
+        if not ok:
+            return Response(params, status=400)
+
+        # format is chosen by 'format' parameter or Accept header, compression by Accept-Encoding
+        format_name = encoding.choose_format(request.args.get('format'), request.accept_mimetypes)
+
+        if format_name is None:
+            return Response("Parameter 'format' must be one of: {}".format(', '.join(encoding.FORMATS.keys())),
+                            status=400)
+
+        compression = encoding.choose_compression(request.accept_encodings)
+        data = node_db_handler.access().get_data(True, **params)
+        # measurements are serialized while they're read from database
+        chunks = encoding.encode(data, format_name)
+
+        if compression is not None:
+            chunks = encoding.compress(chunks, compression)
+
+        resp = Response(stream_with_context(chunks), status=200, mimetype=encoding.FORMATS[format_name])
+        resp.headers['Vary'] = 'Accept, Accept-Encoding'
+
+        if compression is not None:
+            resp.headers['Content-Encoding'] = compression
+
+    return resp
+
+
+@api.route('/confirm_node_data', methods=['POST'])
+def confirm_node_data():
+    """
+    Collector confirms that it received measurements up to (and including) 'up_to_id'
+    (optionally only those after 'after_id'), so they won't be sent to it again.
+    """
+
+    logger.access().warning("'{}' is trying to confirm node data", request.remote_addr)
+    ok, resp = __verify_api_key()
+
+    if ok:
+        params = dict()
+
+        for name in ['up_to_id', 'after_id']:
+            if name in request.values:
+                ok, message = is_integer(request.values[name])
+
+                if not ok:
+                    return Response("{} for parameter '{}'".format(message, name), status=400)
+                params[name] = int(request.values[name])
+
+        if 'up_to_id' not in params:
+            return Response("Parameter 'up_to_id' required", status=400)
+
+        confirmed = node_db_handler.access().confirm_data(**params)
+        logger.access().info("{} measurement/s confirmed", confirmed)
+        resp = Response(json.dumps({'confirmed': confirmed}), status=200, mimetype='application/json')
+
+    return resp
+
+
+@api.route('/get_series')
+def get_series():
+    """
+    Values of node's series (filtered by component, value type and measuring unit) in time
+    range, as arrays of timestamps and values.
+    """
+
+    logger.access().warning("'{}' is trying to access series", request.remote_addr)
+    ok, resp = __verify_api_key()
+
+    if ok:
+        ok, params = __read_series_params()
+
+        if not ok:
+            return Response(params, status=400)
+
+        if 'last' in request.args:
+            # range moves with time, so response changes even if data doesn't
+            data = node_db_handler.access().get_series(**params)
+            resp = Response(json.dumps(data), status=200, mimetype='application/json')
+        else:
+            # parsed parameters (without api_key) are key, so same series is cached once
+            resp = cached_response(('get_series',) + tuple(sorted(params.items())), params['node_id'],
+                                   lambda: json.dumps(node_db_handler.access().get_series(**params)),
+                                   'application/json')
+
+    return resp
+
+
+@api.route('/get_latest_values')
+def get_latest_values():
+    """
+    Newest value of each sensor (by component settings id), read from file which MQTT client
+    shares, so database isn't used.
+    """
+
+    logger.access().warning("'{}' is trying to access latest values", request.remote_addr)
+    ok, resp = __verify_api_key()
+
+    if ok:
+        if latest_values.access() is None:
+            return Response("Latest values aren't shared (missing latest_values_path)", status=404)
+
+        component_settings_id = None
+
+        if 'component_settings_id' in request.args:
+            ok, message = is_integer(request.args['component_settings_id'])
+
+            if not ok:
+                return Response("{} for parameter 'component_settings_id'".format(message), status=400)
+
+            component_settings_id = int(request.args['component_settings_id'])
+
+        resp = cached_response(('get_latest_values', component_settings_id), None,
+                               lambda: __latest_values_json(component_settings_id), 'application/json')
+
+    return resp
+
+
+def __latest_values_json(component_settings_id=None):
+    values = latest_values.access().get_all()
+
+    if component_settings_id is not None:
+        values = {key: value for key, value in values.items() if key == component_settings_id}
+
+    return json.dumps([{'component_settings_id': key, 'value': value, 'measured_at': ts}
+                       for key, (value, ts) in values.items()])
+
+
+def __verify_api_key():
+    """
+    Checks API key from request (query string or form).
+
+    :return:    True and None if key is valid, else False and response for caller
+    """
+
+    api_key = request.values.get('api_key', '')
 
     if api_key == '':
         # unauthorized!
-        return Response("API key required", status=400)
+        return False, Response("API key required", status=400)
 
     # else there is some API key...
     ok, message = account_db_handler.access().is_valid_api_key(api_key)
 
     if ok:
         logger.access().info(message)
-        data = node_db_handler.access().get_data(True)
-        js = json.dumps(data)
 
-        resp = Response(js, status=200, mimetype='application/json', content_type='application/json')
-    else:
-        resp = Response(message, status=400)
+        return True, None
 
-    return resp
+    return False, Response(message, status=400)
+
+
+def __read_data_params():
+    """
+    Reads pagination and filter parameters of data request (since, after_id, limit,
+    only_not_confirmed).
+
+    :return:    True and parameters for DBHandler.get_data or False and error message
+    """
+
+    # by default, only measurements that collector didn't confirm are sent (incremental sync)
+    params = {
+        'only_not_confirmed': True
+    }
+
+    if 'since' in request.args:
+        try:
+            datetime.strptime(request.args['since'], "%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            return False, "Parameter 'since' must have format YYYY-MM-DD hh:mm:ss"
+        params['since'] = request.args['since']
+
+    for name in ['after_id', 'limit']:
+        if name in request.args:
+            ok, message = is_integer(request.args[name])
+
+            if not ok:
+                return False, "{} for parameter '{}'".format(message, name)
+            params[name] = int(request.args[name])
+
+    if 'only_not_confirmed' in request.args:
+        ok, message = is_boolean(request.args['only_not_confirmed'])
+
+        if not ok:
+            return False, "{} for parameter 'only_not_confirmed'".format(message)
+        params['only_not_confirmed'] = request.args['only_not_confirmed'].lower() == 'true'
+
+    return True, params
+
+
+def __read_series_params():
+    """
+    Reads filter, time range and decimation parameters of series request (node_id,
+    component, value_type, unit, from, to, last, limit, step).
+
+    :return:    True and parameters for DBHandler.get_series or False and error message
+    """
+
+    if request.args.get('node_id', '') == '':
+        return False, "Parameter 'node_id' required"
+
+    params = {
+        'node_id': request.args['node_id']
+    }
+
+    for name, param in [('value_type', 'value_type'), ('unit', 'measuring_unit')]:
+        if name in request.args:
+            params[param] = request.args[name]
+
+    for name, param in [('component', 'component_id_used'), ('limit', 'limit'), ('step', 'step')]:
+        if name in request.args:
+            ok, message = is_integer(request.args[name])
+
+            if not ok:
+                return False, "{} for parameter '{}'".format(message, name)
+            params[param] = int(request.args[name])
+
+    for name in ['limit', 'step']:
+        if name in params and params[name] <= 0:
+            return False, "Parameter '{}' must be positive".format(name)
+
+    for name, param in [('from', 'from_ts'), ('to', 'to_ts')]:
+        if name in request.args:
+            try:
+                params[param] = int(datetime.strptime(request.args[name], "%Y-%m-%d %H:%M:%S").timestamp())
+            except ValueError:
+                return False, "Parameter '{}' must have format YYYY-MM-DD hh:mm:ss".format(name)
+
+    if 'last' in request.args:
+        # last is time before now (example: 24h), it's used instead of 'from'
+        ok, message = is_time_after(request.args['last'])
+
+        if not ok:
+            return False, "{} for parameter 'last'".format(message)
+        params['from_ts'] = int(datetime.now().timestamp()) - to_seconds(request.args['last'])
+
+    return True, params
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+from threading import Lock
+
+from flask import request, Response
+
+from web.loader import data_versions
+
+
+"""
+HTTP caching of pages and API responses by version of data (see DataVersions). Response has
+ETag (version) and Last-Modified (time of last data change), so browser or collector which
+already has it gets 304 Not Modified without database query or rendering. Rendered bodies are
+cached too (only newest version of each one), for clients which don't send validators. Bodies
+which weren't used for longest time are removed when there are too many of them or when they
+are too big together (least recently used).
+"""
+
+
+# max number of cached bodies and max size of all of them together (in characters/bytes),
+# bigger bodies aren't cached at all
+MAX_FRAGMENTS = 128
+MAX_FRAGMENTS_SIZE = 16 * 1024 * 1024
+
+# key -> (tag, body), from least to most recently used
+__fragments = OrderedDict()
+__fragments_size = [0]
+__fragments_lock = Lock()
+
+
+def cached_response(key, node_id, render, mimetype='text/html'):
+    """
+    :param key:         key of cached body (view and its parameters, without api_key and
+                        other parameters which don't change body)
+    :param node_id:     node whose data body shows (None if it shows data of all nodes)
+    :param render:      function without parameters which returns body
+    :param mimetype:
+    :return:            response
+    """
+
+    version = None
+
+    if data_versions.access() is not None:
+        version = data_versions.access().get(node_id)
+
+    if version is None:
+        # without version it's not known when data changes, so nothing is cached
+        return Response(render(), status=200, mimetype=mimetype)
+
+    tag, updated_at = version
+    last_modified = datetime.fromtimestamp(updated_at, timezone.utc)
+
+    # If-Modified-Since is checked only if there's no If-None-Match (ETag is more precise)
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(tag)
+    else:
+        not_modified = request.if_modified_since is not None and request.if_modified_since >= last_modified
+
+    if not_modified:
+        resp = Response(status=304)
+    else:
+        body = __get_fragment(key, tag)
+
+        if body is None:
+            body = render()
+            __put_fragment(key, tag, body)
+
+        resp = Response(body, status=200, mimetype=mimetype)
+
+    resp.set_etag(tag)
+    resp.last_modified = last_modified
+    # client must always ask if its copy is still valid
+    resp.headers['Cache-Control'] = 'no-cache'
+
+    return resp
+
+
+def __get_fragment(key, tag):
+    # body of given version or None
+    with __fragments_lock:
+        cached = __fragments.get(key)
+
+        if cached is None or cached[0] != tag:
+            return None
+
+        __fragments.move_to_end(key)
+
+        return cached[1]
+
+
+def __put_fragment(key, tag, body):
+    with __fragments_lock:
+        old = __fragments.pop(key, None)
+
+        if old is not None:
+            __fragments_size[0] -= len(old[1])
+        if len(body) > MAX_FRAGMENTS_SIZE:
+            return
+
+        __fragments[key] = (tag, body)
+        __fragments_size[0] += len(body)
+
+        while len(__fragments) > MAX_FRAGMENTS or __fragments_size[0] > MAX_FRAGMENTS_SIZE:
+            oldest_key, oldest = __fragments.popitem(last=False)
+            __fragments_size[0] -= len(oldest[1])
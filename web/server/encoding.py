@@ -0,0 +1,202 @@
+import struct
+import zlib
+from datetime import datetime
+
+from flask import json
+
+
+"""
+Encodings of measurements sent to collector. Measurements come one by one from
+DBHandler.get_data and are encoded in chunks, so response is streamed while it's read from
+database.
+
+json        list of measurement dicts (default)
+columnar    list of series, each with node_id, measurement_type and measuring_unit only once and
+            arrays of ids, values and measured_at (series can appear more than once, once for
+            each chunk, collector joins them by those 3 keys)
+binary      'ND01' and then series blocks, each block is:
+                node_id, measurement_type, measuring_unit    (each as uint16 length + utf-8 bytes)
+                count                                       (uint32)
+                ids                                         (count * int64)
+                measured_at                                 (count * int64, seconds since epoch)
+                values                                      (count * float64)
+            all numbers are little endian
+"""
+
+
+FORMATS = {
+    'json':     'application/json',
+    'columnar': 'application/vnd.area45.columnar+json',
+    'binary':   'application/vnd.area45.binary'
+}
+COMPRESSIONS = ('gzip', 'deflate')
+BINARY_MAGIC = b'ND01'
+# number of measurements encoded before they're sent as one chunk of response
+CHUNK_SIZE = 500
+# compression level for slow CPU of Raspberry Pi (it's still much smaller than plain data)
+COMPRESSION_LEVEL = 6
+
+
+def choose_format(format_param, accept):
+    """
+    :param format_param:    value of 'format' parameter (None if it's missing), it overrides
+                            Accept header
+    :param accept:          request.accept_mimetypes
+    :return:                format name or None if parameter is invalid
+    """
+
+    if format_param is not None:
+        format_param = format_param.lower()
+
+        return format_param if format_param in FORMATS.keys() else None
+
+    # best match of Accept header (json if there's no match)
+    mimetype = accept.best_match([FORMATS['json'], FORMATS['columnar'], FORMATS['binary']], FORMATS['json'])
+
+    for name, format_mimetype in FORMATS.items():
+        if format_mimetype == mimetype:
+            return name
+
+    return 'json'
+
+
+def choose_compression(accept_encoding):
+    # accept_encoding is request.accept_encodings, returns None if response isn't compressed
+    for compression in COMPRESSIONS:
+        if accept_encoding[compression] > 0:
+            return compression
+
+    return None
+
+
+def encode(data, format_name):
+    # returns generator of encoded chunks
+    if format_name == 'columnar':
+        return stream_columnar(data)
+    elif format_name == 'binary':
+        return stream_binary(data)
+
+    return stream_json(data)
+
+
+def stream_json(data):
+    # builds JSON list piece by piece
+    chunk = list()
+    separator = ''
+
+    yield '['
+
+    for item in data:
+        chunk.append(separator + json.dumps(item))
+        separator = ','
+
+        if len(chunk) == CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = list()
+
+    yield ''.join(chunk) + ']'
+
+
+def stream_columnar(data):
+    separator = ''
+
+    yield '['
+
+    for series in __group_chunks(data):
+        for (node_id, measurement_type, measuring_unit), (ids, values, measured_at) in series.items():
+            yield separator + json.dumps({
+                'node_id': node_id,
+                'measurement_type': measurement_type,
+                'measuring_unit': measuring_unit,
+                'ids': ids,
+                'values': values,
+                'measured_at': measured_at
+            })
+            separator = ','
+
+    yield ']'
+
+
+def stream_binary(data):
+    # measured_at strings repeat a lot (same second for all sensors of node), so each one is
+    # converted only once per chunk
+    yield BINARY_MAGIC
+
+    for series in __group_chunks(data):
+        timestamps = dict()
+        blocks = list()
+
+        for (node_id, measurement_type, measuring_unit), (ids, values, measured_at) in series.items():
+            for text in (node_id, measurement_type, measuring_unit):
+                encoded = text.encode('utf-8')
+                blocks.append(struct.pack('<H', len(encoded)))
+                blocks.append(encoded)
+
+            ts = list()
+
+            for item in measured_at:
+                item_ts = timestamps.get(item)
+
+                if item_ts is None:
+                    item_ts = int(datetime.strptime(item, "%Y-%m-%d %H:%M:%S").timestamp())
+                    timestamps[item] = item_ts
+
+                ts.append(item_ts)
+
+            count = len(ids)
+            blocks.append(struct.pack('<I{0}q{0}q{0}d'.format(count), count, *ids, *ts, *values))
+
+        yield b''.join(blocks)
+
+
+def compress(chunks, compression):
+    """
+    Compresses streamed chunks (each chunk is flushed, so collector gets data while it's
+    read from database).
+
+    :param chunks:      generator of str or bytes
+    :param compression: 'gzip' or 'deflate' (zlib stream, as HTTP's deflate means)
+    :return:            generator of compressed bytes
+    """
+
+    wbits = 16 + zlib.MAX_WBITS if compression == 'gzip' else zlib.MAX_WBITS
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, wbits)
+
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+
+        compressed = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+        if len(compressed) > 0:
+            yield compressed
+
+    yield compressor.flush()
+
+
+def __group_chunks(data):
+    # yields dict {(node_id, measurement_type, measuring_unit): (ids, values, measured_at)} for
+    # each CHUNK_SIZE measurements
+    series = dict()
+    count = 0
+
+    for item in data:
+        key = (item['node_id'], item['measurement_type'], item['measuring_unit'])
+        columns = series.get(key)
+
+        if columns is None:
+            columns = (list(), list(), list())
+            series[key] = columns
+
+        columns[0].append(item['id'])
+        columns[1].append(item['value'])
+        columns[2].append(item['measured_at'])
+        count += 1
+
+        if count == CHUNK_SIZE:
+            yield series
+            series = dict()
+            count = 0
+
+    if count > 0:
+        yield series
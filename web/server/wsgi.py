@@ -0,0 +1,55 @@
+import os
+import sys
+
+from web.loader import load, logger
+
+
+"""
+Production entry point of web server. Database is opened read only (only confirming data
+writes to it) and app is served by multi-threaded WSGI server: waitress if it's installed
+(pip install waitress), else Werkzeug's threaded server. Each request has its own database
+session, which is removed at the end of request (see app.py).
+Config is web/config.ini (found from location of this file, so server can be started from
+any folder). Run from project's root folder:
+    python -m web.server.wsgi [threads] [port]
+or with other WSGI server, which imports 'app' from this module (each worker process loads
+config for itself), example:
+    gunicorn -w 4 web.server.wsgi:app
+"""
+
+
+DEFAULT_THREADS = 8
+DEFAULT_PORT = 5000
+
+
+# path of config file (not folder), so it doesn't depend on path separator
+__config_location = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.ini')
+__ok, __info = load(__config_location, read_only=True)
+
+if not __ok:
+    sys.exit(1)
+
+# app is imported after config is loaded, so it doesn't load it again (with writable database)
+from web.server.app import app
+
+
+def serve(threads=DEFAULT_THREADS, port=DEFAULT_PORT):
+    try:
+        from waitress import serve as waitress_serve
+    except ImportError:
+        waitress_serve = None
+
+    logger.access().info("Server running at 0.0.0.0:{} with {} thread/s ({})", port, threads,
+                         'waitress' if waitress_serve is not None else 'werkzeug')
+
+    if waitress_serve is not None:
+        waitress_serve(app, host='0.0.0.0', port=port, threads=threads)
+    else:
+        # Werkzeug starts new thread for each request (threads are not limited)
+        from werkzeug.serving import run_simple
+        run_simple('0.0.0.0', port, app, threaded=True)
+
+
+if __name__ == '__main__':
+    serve(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THREADS,
+          int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_PORT)